@@ -3,6 +3,7 @@
 """Builds a 3-node LangGraph pipeline: preprocess → prompt → execute."""
 from typing import TypedDict, Any, Dict
 from langgraph.graph import StateGraph, END
+from langchain_core.runnables import RunnableLambda
 
 from RAG_node_0_preprocessing import PreprocessingNode
 from RAG_node_router          import RouterNode
@@ -37,6 +38,11 @@ class PipelineState(TypedDict): # TypedDict用于给 dict 加上「键必须存
     route:              str # <─ new  by Router
     llm_json:           str
     execution_output:   Any # DataFrame / scalar / file path / str
+    # 请求级选项（daemon 模式可随请求传入）
+    refit:              bool
+    stream:             bool | None
+    export_excel:       bool
+    exec_ctx:           Any # 请求级 ExecutionContext（rag_context）：工具会话状态不再是模块全局
 # 调用 StateGraph(PipelineState) 时，LangGraph 会用这份类型信息来做静态检查：每个节点对 state 的读写都应该遵守这个 schema。这样能在开发期提前暴露字段拼写或类型错误。
 # -------- ReAct 新增 --------
     scratchpad: str              # 记录 Thought / Action / Observation
@@ -62,13 +68,17 @@ def _route(state:Dict[str,Any])->Dict[str,Any]:
     state.update(_Router.run(state["processed_input"]))
     return state
 
+async def _aroute(state:Dict[str,Any])->Dict[str,Any]:
+    state.update(await _Router.arun(state["processed_input"]))
+    return state
+
 # ---------- build graph ---------------------------------------------------
 def build_graph():
     sg = StateGraph(PipelineState)
 
     # root line
     sg.add_node("pre",      _pre) # "pre" 是节点名；_preprocess 为执行函数。运行时 Graph 把 state 交给该函数
-    sg.add_node("router",   _route)
+    sg.add_node("router",   RunnableLambda(_route, afunc=_aroute, name="router"))   # ainvoke 时 LLM 路由可 await
 
     sg.add_edge("pre", "router")
 
@@ -108,7 +118,7 @@ def build_graph():
         if state.get("eval_summary") is not None:
             print("*** Benchmark on ensemble pseudo‑labels ***")
             print(state["eval_summary"].to_string(index=False))
-            print(f"\n⚡ 详细结果已保存至 {state['execution_output']}")
+            print(f"\n⚡ 详细结果已保存至 {state.get('artifact_path')}")
             return state
 
         # ---------- Anomaly Benchmark 输出 ----------
@@ -118,7 +128,9 @@ def build_graph():
             print(f"Picked model: {best}")
             print(f"Latency: {bench.loc[bench.algo == best, 'seconds'].iloc[0]:.2f}s")
             print(f"Self PR‑AUC: {bench.loc[bench.algo == best, 'pr_auc'].iloc[0]:.4f}")
-            print(f"Excel saved → {state['excel_path']}")
+            print(f"Scores saved → {state.get('artifact_path')}")
+            if state.get("excel_path"):             # 可选的后台 Excel 导出
+                print(f"Excel export → {state['excel_path']}")
             print("\nTop‑5 suspicious timestamps:")
             for ts, sc in state["execution_output"][["time_stamp",
                                                      "anomaly_score"]].head().values:
@@ -1,8 +1,6 @@
 # RAG_main.py
 
 """Entry point — builds and runs the LangGraph StateGraph pipeline."""
-from RAG_graph_config import build_graph
-from RAG_subgraph_tabular_react import build_tabular_react_subgraph
 from dotenv import load_dotenv, find_dotenv
 import logging, warnings, sys, pathlib, os, datetime as dt
 
@@ -26,7 +24,20 @@ load_dotenv(find_dotenv(), override= True)
 load_dotenv(find_dotenv(), override=True, verbose=True) # find_dotenv()	递归向上寻找最近的 .env 文件并返回完整路径。override 允许 .env 中的键值覆盖进程里已有的同名环境变量 （默认是不覆盖的）。 verbose=True 允许打印加载的 .env 文件路径
 
 def main() -> None:
+    import argparse
+    ap = argparse.ArgumentParser(description="RAG pipeline")
+    ap.add_argument("--serve", action="store_true",
+                    help="常驻服务模式：图与模型只加载一次，按 JSON-lines 处理请求")
+    ap.add_argument("--socket", metavar="ADDR",
+                    help="配合 --serve：host:port 或 Unix socket 路径；缺省读 stdin")
+    args = ap.parse_args()
+    if args.serve:
+        from RAG_server import serve
+        serve(args.socket)
+        return
+
     print("[LOG] Program started (LangGraph version).")
+    from RAG_graph_config import build_graph   # --serve 模式需先接管 stdout 再导入
     graph = build_graph()   # 得到 CompiledStateGraph
     user_input = input("Please enter your request: ")
     result_state = graph.invoke({"user_input": user_input}) # 接收一份 初始状态字典，键名必须符合 PipelineState 里定义的字段名
@@ -8,17 +8,32 @@
 4. 返回纠正后的英文查询（供 Router 与下游使用）。
 """
 from __future__ import annotations
-import re, os, contextlib
-from typing import List
+import re, os, threading, contextlib
+from collections import OrderedDict
+from typing import Dict, List, Tuple
 import pandas as pd
 from rapidfuzz import process, fuzz          # pip install rapidfuzz
-from sentence_transformers import SentenceTransformer, util  # pip install sentence-transformers
-from RAG_tool_functions import load_data
+from rag_catalog import columns as catalog_columns, schema_key
 from pathlib import Path
+from rag_lazy import lazy, lazy_import
+
+# sentence-transformers 会连带导入 torch，放到第一次真正需要语义比对时再加载
+_st = lazy_import("sentence_transformers")          # pip install sentence-transformers
 
 # SentenceTransformer 是 Hugging-Face 上的句向量库，可把字符串映射到 384 维向量，做语义相似度计算。
 # all-MiniLM-L6-v2 是官方提供的轻量 22 M 参数模型，速度是 mpnet-base 的 5 倍而保留 ~90 % 质量，非常适合实时纠错任务。
-_MODEL = SentenceTransformer("all-MiniLM-L6-v2")   # 体积小、加载快
+# 只有 RapidFuzz 筛出候选列时才会用到；没有近似列名的请求完全不加载。
+get_encoder = lazy(lambda: _st.SentenceTransformer("all-MiniLM-L6-v2"), name="MiniLM encoder")
+
+# ---------- 纠错缓存 ----------
+_TOKEN_RE   = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_FUZZ_MIN   = 80                                            # WRatio 必须 > 80 才算候选
+_FUZZ_TOP   = 3                                             # 每个 token 最多 3 个候选列
+_MATCH_SLOTS = int(os.getenv("RAG_COLFIX_CACHE", "4096"))   # (schema, token) → 列名 的 LRU 容量
+_EMB_SLOTS   = 8                                            # 最多缓存几份 schema 的列向量
+_MATCHES: "OrderedDict[Tuple[str, str], str | None]" = OrderedDict()
+_COL_EMB: "OrderedDict[str, object]" = OrderedDict()
+_LOCK = threading.Lock()
 
 def _find_csv(candidate: str | None) -> Path | None:
     """
@@ -60,17 +75,12 @@ class PreprocessingNode:
             # 完全找不到 → 抛错误，交由上层捕获
             raise FileNotFoundError("❌ 找不到任何 CSV 文件，请检查文件名/路径")
 
-        df = load_data(str(csv_path))            # ← 一定能成功
-        columns = df.columns.tolist()
-
-        # 2. 列名纠错（同原逻辑，略）
-        def _replace(match):
-            word = match.group(0)
-            real = _best_match(word, columns)
-            return real or word
+        # 只要列名：查数据集目录（表头 + 少量行 sniff，按 mtime/size 缓存），不解析整张表
+        columns = catalog_columns(csv_path)
 
-        pattern = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
-        corrected = pattern.sub(_replace, user_input)
+        # 2. 列名纠错：整句的 token 一次批量解析（一次 encoder 前向），再统一替换
+        resolved = resolve_columns(_TOKEN_RE.findall(user_input), columns)
+        corrected = _TOKEN_RE.sub(lambda m: resolved.get(m.group(0)) or m.group(0), user_input)
         corrected = re.sub(r"\s+", " ", corrected).strip()
 
         print("[BEFORE]", user_input)
@@ -82,21 +92,73 @@ class PreprocessingNode:
             "csv_path": str(csv_path)  # 让后续子图能直接拿到路径
         }
 
+def _column_embeddings(schema: str, columns: List[str]):
+    """每个 schema 的列名只编码一次（一次 batch），之后复用"""
+    with _LOCK:
+        if schema in _COL_EMB:
+            _COL_EMB.move_to_end(schema)
+            return _COL_EMB[schema]
+    emb = get_encoder().encode(columns, convert_to_tensor=True)
+    with _LOCK:
+        _COL_EMB[schema] = emb
+        while len(_COL_EMB) > _EMB_SLOTS:
+            _COL_EMB.popitem(last=False)
+    return emb
+
+def resolve_columns(tokens: List[str], columns: List[str]) -> Dict[str, str | None]:
+    """
+    批量版 _best_match：返回 {token: 真实列名 | None}
+      ① LRU 命中的 token 直接返回；与列名完全相同的 token 就是它自己
+      ② 剩余 token 与全部列名做一次 RapidFuzz cdist，保留得分 > 80 的 Top-3
+      ③ 有候选的 token 一次 encode，与缓存的列向量算余弦，在候选里择优
+    """
+    schema = schema_key(columns)
+    out: Dict[str, str | None] = {}
+    todo: List[str] = []
+    col_set = set(columns)
+    with _LOCK:
+        for t in dict.fromkeys(tokens):                    # 去重且保序
+            if (schema, t) in _MATCHES:
+                _MATCHES.move_to_end((schema, t))
+                out[t] = _MATCHES[(schema, t)]
+            elif t in col_set:
+                out[t] = t
+            else:
+                todo.append(t)
+    if not todo:
+        return out
+
+    # 1) 传统编辑距离：一次算完 token × 列名 的 WRatio 矩阵
+    import numpy as np
+    fuzz_scores = process.cdist(todo, columns, scorer=fuzz.WRatio,
+                                score_cutoff=_FUZZ_MIN, workers=-1)
+    cand_idx: Dict[str, List[int]] = {}
+    for t, row in zip(todo, fuzz_scores):
+        top = [int(j) for j in np.argsort(-row, kind="stable")[:_FUZZ_TOP] if row[j] > _FUZZ_MIN]
+        if top:
+            cand_idx[t] = top
+        else:
+            out[t] = None
+
+    # 2) 语义向量相似度：所有有候选的 token 只走一次 encoder 前向
+    if cand_idx:
+        need = list(cand_idx)
+        emb_tok = get_encoder().encode(need, convert_to_tensor=True)
+        sims = _st.util.cos_sim(emb_tok, _column_embeddings(schema, columns)).tolist()
+        for t, row in zip(need, sims):
+            idx = cand_idx[t]
+            out[t] = columns[max(idx, key=lambda j: (row[j], -idx.index(j)))]
+
+    with _LOCK:
+        for t in todo:
+            _MATCHES[(schema, t)] = out[t]
+        while len(_MATCHES) > _MATCH_SLOTS:
+            _MATCHES.popitem(last=False)
+    return out
+
 def _best_match(token:str, columns:List[str])->str|None:
     # 形参 token：     在用户文本里捕获的「可能是列名」的词
     # 形参 columns：   CSV 中的真实列名列表
     # 返回值 str | None 表示「找到匹配就给列名字符串，否则返回 None」
-    """先用 RapidFuzz 筛出 top-3，再用向量相似度择优"""
-    # 1) 传统编辑距离
-    # 先把 token 与每个列名算相似度，保留得分 > 60 的 Top-3。WRatio 是综合 Levenshtein/部分匹配等指标的加权分。
-    candidates = [c for c,score,_ in process.extract(token, columns, scorer=fuzz.WRatio, limit=3) if score > 80]
-    if not candidates:
-        return None
-    # 2) 语义向量相似度
-    # 再用 SBERT 将 token 和候选列名编码成向量，用余弦相似度二次排名，最后返回分数最高列名。
-    emb_token = _MODEL.encode(token, convert_to_tensor=True)
-    emb_cols  = _MODEL.encode(candidates, convert_to_tensor=True)
-    scores = util.cos_sim(emb_token, emb_cols)[0].tolist()
-    return candidates[scores.index(max(scores))]
-
-
+    """先用 RapidFuzz 筛出 top-3，再用向量相似度择优（单 token 版，内部走批量路径与缓存）"""
+    return resolve_columns([token], columns)[token]
@@ -10,7 +10,6 @@ from __future__ import annotations
 import os, re, json
 from typing import Literal
 
-from openai import OpenAI
 from dotenv import load_dotenv
 
 load_dotenv()   # python-dotenv 库会把同目录或父目录的 .env 文件读取出来，并写入 os.environ
@@ -34,13 +33,10 @@ class RouterNode:
     def __init__(self) -> None:
         print(f"[LOG] RouterNode initialized (mode={ROUTER_MODE}).")
         if ROUTER_MODE == "llm":
-            if NGC_API_KEY is None:
-                raise EnvironmentError("NGC_API_KEY not set for llm router")
-            self.client = OpenAI(
-                base_url="https://integrate.api.nvidia.com/v1",
-                api_key=os.getenv("NGC_API_KEY"),
-                timeout=30,
-            )
+            if NGC_API_KEY is None and not (os.getenv("LLM_API_KEY") or os.getenv("LLM_BASE_URL")):
+                raise EnvironmentError("NGC_API_KEY not set for llm router")   # 本地桩（LLM_BASE_URL）不需要 key
+            from rag_llm import get_gateway     # rule 模式（默认）完全不碰 LLM 网关
+            self.gateway = get_gateway()
 
     # -------------- rule-based -------------------------------------------
     def _route_by_rule(self, text:str)->str:
@@ -61,21 +57,27 @@ class RouterNode:
         "- Otherwise ⇒ tabular"
     )
 
-    def _route_by_llm(self, text:str)->str:
-        resp = self.client.chat.completions.create(
-            model="meta/llama-3.1-8b-instruct",
-            messages=[
-                {"role":"system","content":self._SYSTEM_MSG},   # system 用来注入指令
-                {"role":"user"  ,"content":text.strip()}        # user 放实际输入
-            ],
-            temperature=0.0,
-            max_tokens=1,
-        )
-        label = resp.choices[0].message.content.strip().lower() # resp：OpenAI 返回的响应对象。.choices[0]：第一条候选答案。.message.content：该答案的文本。.strip().lower()：去掉首尾空白再转小写。
+    def _llm_messages(self, text:str)->list:
+        return [
+            {"role":"system","content":self._SYSTEM_MSG},   # system 用来注入指令
+            {"role":"user"  ,"content":text.strip()}        # user 放实际输入
+        ]
+
+    @staticmethod
+    def _parse_label(content:str)->str:
+        label = content.strip().lower()         # 去掉首尾空白再转小写
         if label not in {"tabular","kg","anomaly","viz"}:
             label = "tabular"
         return label
 
+    def _route_by_llm(self, text:str)->str:
+        return self._parse_label(
+            self.gateway.chat(self._llm_messages(text), temperature=0.0, max_tokens=1))
+
+    async def _aroute_by_llm(self, text:str)->str:
+        return self._parse_label(
+            await self.gateway.achat(self._llm_messages(text), temperature=0.0, max_tokens=1))
+
     # -------------- public API -------------------------------------------
     def run(self, processed_input:str)->dict:
         if ROUTER_MODE == "llm":
@@ -85,4 +87,11 @@ class RouterNode:
         print(f"[LOG] Router decision → {label}")
         return {"route": label}
 
+    async def arun(self, processed_input:str)->dict:
+        if ROUTER_MODE != "llm":
+            return self.run(processed_input)
+        label = await self._aroute_by_llm(processed_input)
+        print(f"[LOG] Router decision → {label}")
+        return {"route": label}
+
 
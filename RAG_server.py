@@ -0,0 +1,185 @@
+# RAG_server.py
+
+"""
+常驻服务模式（warm-start daemon）
+------------------------------------------------------------------
+RAG_main 一次性模式每个请求都要重新 build_graph()、加载 SentenceTransformer、
+构建 TOOL_REGISTRY、导入 isotree / pyod / sklearn / matplotlib —— 启动远比推理慢。
+这里把编译好的图与所有模型只建一次，然后循环处理请求：
+
+  • stdin  JSON-lines：   python RAG_main.py --serve
+  • socket JSON-lines：   python RAG_main.py --serve --socket 127.0.0.1:8765
+                          python RAG_main.py --serve --socket /tmp/rag.sock
+
+每个请求带自己的 ExecutionContext（rag_context），工具会话状态不再是进程全局，
+一个常驻进程即可并发处理多个请求：
+  • stdin 模式：请求交给 RAG_SERVER_WORKERS（默认 4）个线程的线程池，响应按完成先后写回（用 id 对应）；
+  • socket 模式：每个连接一个线程。
+
+请求：{"id": 1, "user_input": "...", "csv_path"?: ..., "refit"?: ..., "stream"?: ...}
+       {"cmd": "stats"}   → 返回累计请求数、最近 RAG_SERVER_LAT_WINDOW 个请求的延迟分位数、
+                            快速通道 / 计划缓存 / 工具结果缓存命中率
+响应：{"id": 1, "ok": true, "output": "...", "route": "...", "latency_ms": 123.4}
+"""
+from __future__ import annotations
+import os, sys, json, time, logging, threading, contextlib, socketserver, statistics
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, IO
+
+from rag_context import ExecutionContext, use_context
+
+log = logging.getLogger("rag.server")
+
+MAX_ROWS = 10                                   # DataFrame 结果渲染行数
+WORKERS  = int(os.getenv("RAG_SERVER_WORKERS", "4"))    # stdin 模式的并发请求数
+LAT_WINDOW = int(os.getenv("RAG_SERVER_LAT_WINDOW", "10000"))   # 延迟分位数只看最近这么多个请求
+# 允许请求直接覆盖的初始 state 字段（其余一律忽略，保证请求之间互不串味）
+PASS_KEYS = ("csv_path", "refit", "stream", "export_excel")
+
+def _render(state: Dict[str, Any]) -> str:
+    if state.get("final_answer"):
+        return str(state["final_answer"])
+    out = state.get("execution_output")
+    if hasattr(out, "head"):
+        return out.head(MAX_ROWS).to_string(index=False)
+    return str(out)
+
+class RagServer:
+    """持有唯一一份编译好的图；每个请求拿到全新的初始 state 与 ExecutionContext，可多线程并发调用 handle"""
+
+    def __init__(self) -> None:
+        t0 = time.perf_counter()
+        from RAG_graph_config import build_graph
+        self.graph = build_graph()
+        self._latencies: deque[float] = deque(maxlen=LAT_WINDOW)   # 常驻进程里不能无限增长
+        self._n_requests = 0
+        self._lat_lock = threading.Lock()
+        self._warm_up()
+        log.info("graph ready in %.2fs", time.perf_counter() - t0)
+
+    @staticmethod
+    def _warm_up() -> None:
+        """把首个请求才会触发的初始化提前做掉（句向量模型、LLM client、异常检测进程池等）"""
+        from rag_lazy import warm_all
+        from rag_parallel import warm_pool
+        warm_all()                                  # 所有 lazy(...) 对象：常驻进程里不必再“懒”
+        try:
+            from rag_algorithms import preload
+            preload()
+            warm_pool()
+        except Exception:                           # 预热失败不影响服务，首个请求时再建
+            log.warning("anomaly warm-up failed", exc_info=True)
+
+    # ---------- 单个请求 ----------
+    def handle(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        if req.get("cmd") == "stats":
+            return self.stats()
+
+        rid = req.get("id")
+        text = req.get("user_input") or req.get("input")
+        if not text:
+            return {"id": rid, "ok": False, "error": "missing 'user_input'"}
+
+        ctx = ExecutionContext(request_id=rid if rid is not None else f"req-{id(req)}",
+                               csv_path=req.get("csv_path"))
+        init = {"user_input": text, "exec_ctx": ctx, **{k: req[k] for k in PASS_KEYS if k in req}}
+        t0 = time.perf_counter()
+        try:
+            with use_context(ctx):                  # 本线程里直接调工具的代码也只看到本请求的状态
+                state = self.graph.invoke(init)
+            resp = {"id": rid, "ok": True, "output": _render(state),
+                    "route": state.get("route")}
+        except Exception as e:                      # 单个请求失败不影响服务
+            log.exception("request %s failed", rid)
+            resp = {"id": rid, "ok": False, "error": f"{type(e).__name__}: {e}"}
+        ms = (time.perf_counter() - t0) * 1000
+        with self._lat_lock:
+            self._latencies.append(ms)
+            self._n_requests += 1
+        resp["latency_ms"] = round(ms, 1)
+        log.info("request %s done in %.1f ms (ok=%s)", rid, ms, resp["ok"])
+        return resp
+
+    def stats(self) -> Dict[str, Any]:
+        from rag_nodes_react.plan_cache import stats as plan_cache_stats
+        from rag_memo import stats as memo_stats
+        from rag_nodes_react.fastpath import stats as fastpath_stats
+        with self._lat_lock:
+            lat, total = sorted(self._latencies), self._n_requests
+        if not lat:
+            return {"ok": True, "requests": 0, "fastpath": fastpath_stats(),
+                    "plan_cache": plan_cache_stats(), "tool_memo": memo_stats()}
+        q = lambda p: round(lat[min(len(lat) - 1, int(p * len(lat)))], 1)
+        return {"ok": True, "requests": total, "window": len(lat),
+                "mean_ms": round(statistics.fmean(lat), 1),
+                "p50_ms": q(0.50), "p95_ms": q(0.95), "max_ms": round(lat[-1], 1),
+                "fastpath": fastpath_stats(), "plan_cache": plan_cache_stats(),
+                "tool_memo": memo_stats()}
+
+    def handle_line(self, line: str) -> str | None:
+        line = line.strip()
+        if not line:
+            return None
+        try:
+            req = json.loads(line)
+        except json.JSONDecodeError as e:
+            return json.dumps({"ok": False, "error": f"bad json: {e}"})
+        return json.dumps(self.handle(req), ensure_ascii=False, default=str)
+
+# ---------- 传输层 ----------
+def _quiet_stdout() -> IO[str]:
+    """
+    stdout 留给响应：节点里的 print 与 logging 的控制台输出统统改到 stderr。
+    返回真正的 stdout 供写响应。
+    """
+    out = sys.stdout
+    for h in logging.getLogger().handlers:
+        if isinstance(h, logging.StreamHandler) and getattr(h, "stream", None) is out:
+            h.setStream(sys.stderr)
+    return out
+
+def serve_stdin(server: RagServer, out: IO[str], workers: int = WORKERS) -> None:
+    """逐行读请求交给线程池；响应写回时加锁，保证一行一个完整 JSON"""
+    write_lock = threading.Lock()
+
+    def _one(line: str) -> None:
+        resp = server.handle_line(line)
+        if resp is not None:
+            with write_lock:
+                out.write(resp + "\n")
+                out.flush()
+
+    with contextlib.redirect_stdout(sys.stderr), \
+            ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="rag-req") as pool:
+        for line in sys.stdin:
+            pool.submit(_one, line)
+
+def serve_socket(server: RagServer, address: str) -> None:
+    """address = "host:port"（TCP）或文件路径（Unix socket）"""
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for raw in self.rfile:
+                resp = server.handle_line(raw.decode("utf-8", errors="replace"))
+                if resp is not None:
+                    self.wfile.write((resp + "\n").encode("utf-8"))
+                    self.wfile.flush()
+
+    if ":" in address and not address.startswith("/"):
+        host, port = address.rsplit(":", 1)
+        srv = socketserver.ThreadingTCPServer((host, int(port)), Handler)
+    else:
+        srv = socketserver.ThreadingUnixStreamServer(address, Handler)
+    srv.daemon_threads = True
+    log.info("serving on %s", address)
+    with srv:
+        srv.serve_forever()
+
+def serve(socket_address: str | None = None) -> None:
+    if socket_address:
+        serve_socket(RagServer(), socket_address)
+        return
+    out = _quiet_stdout()
+    with contextlib.redirect_stdout(sys.stderr):    # 建图时的 [LOG] 输出也不能污染 stdout
+        server = RagServer()
+    serve_stdin(server, out)
@@ -12,46 +12,98 @@ from typing import Dict, Any, TypedDict
 import time, pandas as pd, numpy as np
 import os
 from pathlib import Path
-from rag_eval import run_evaluation
-from sklearn.metrics import average_precision_score
+from rag_eval import run_evaluation, pr_pass
 from langgraph.graph import StateGraph
 from RAG_tool_functions import load_data        # 你已有
-from rag_algorithms import ALGOS, run_algo
+from rag_algorithms import ALGOS, run_algo, score_algo
+from rag_parallel import run_algos_parallel
+from rag_features import prepare_features, transform_features
+import rag_streaming as rs
+from rag_catalog import describe
+from rag_model_store import STORE, RefitPolicy, schema_key
 from rag_eval import evaluate
 
+# ────────── 0. 取分：模型仓库命中则只打分，否则并行 fit ──────────
+def _score_all(feat_df: pd.DataFrame, refit: bool = False, n_rows: int | None = None):
+    """
+    返回 ({algo: (scores, seconds)}, {algo: "fit" | "score"}, FeatureSet)
+      • 同 schema 的模型与 scaler 已在仓库且未触发重训 → 惰性加载，只走打分路径；
+      • 需要重训的算法在进程池里并行 fit，工作进程顺手把模型写回仓库。
+    n_rows：数据集真实行数（流式模式下 feat_df 只是样本）；行数漂移按它判断、记入 meta。
+    """
+    X      = feat_df.values
+    n_rows = len(feat_df) if n_rows is None else n_rows
+    schema = schema_key(feat_df.columns, feat_df.dtypes.astype(str))
+    modes, reason = STORE.plan(schema, ALGOS.keys(), n_rows,
+                               RefitPolicy.from_env(force=refit))
+
+    if reason is not None:                       # 整体重训：scaler 一起重拟合
+        print(f"[LOG] model store: refit all ({reason})")
+        feats = prepare_features(X)              # 标准化一次，所有算法共用
+        STORE.save_scaler(schema, feats.scaler)
+    else:
+        feats = prepare_features(X, scaler=STORE.load_scaler(schema))
+
+    results = {}
+    for name in [n for n, m in modes.items() if m == "score"]:
+        t0 = time.perf_counter()
+        results[name] = (score_algo(name, STORE.load_model(schema, name), feats),
+                         time.perf_counter() - t0)
+
+    to_fit = [n for n, m in modes.items() if m == "fit"]
+    if to_fit:
+        # 所有待训练算法在进程池里同时 fit + 打分；X 经共享内存传给工作进程
+        results.update(run_algos_parallel(feats, to_fit,
+                                          save_to=(str(STORE.root), schema)))
+    if reason is not None:
+        STORE.write_meta(schema, n_rows, list(feat_df.columns))
+
+    return {n: results[n] for n in ALGOS.keys()}, modes, feats
+
+def _self_eval(S: np.ndarray, top_q: float):
+    """每列以自身 (1-top_q) 分位数为阈值做伪标签，返回 (阈值[k], 自评 PR‑AUC[k])"""
+    thr = np.quantile(S, 1 - top_q, axis=0)
+    ap, _ = pr_pass(S, S >= thr)
+    return thr, ap
+
 # ────────── 1. 计算节点 ──────────
 def _benchmark(state: dict, top_q: float = 0.02) -> dict:
     """
     对所有算法跑分，记录 latency 与 ‘自评’ PR‑AUC，
-    把得分最高模型的 anomaly_score 写回 DataFrame 并导出 Excel。
+    把得分最高模型的 anomaly_score 写回 DataFrame，分数矩阵写入 state 与 .npz。
     """
     csv_path: str = state["csv_path"]            # 预处理节点填好的
-    df        = pd.read_csv(csv_path)
-    X         = df.drop(columns=["time_stamp"]).values   # 只用数值列
+    if rs.should_stream(csv_path, state.get("stream")):
+        return _benchmark_stream(state, top_q)   # 超大文件：抽样 fit + 分块打分
+
+    # 唯一一次整表解析：dtype 由数据集目录给出，pandas 不必再逐列推断
+    info      = describe(csv_path)
+    df        = pd.read_csv(csv_path, dtype={c: "float64" for c in info.columns if c != "time_stamp"})
+    feat_df   = df.drop(columns=["time_stamp"]).astype("float64")   # 只用数值列
 
     rows   = []          # 每行记录一个算法的汇总
     scores_map = {}      # 保存每个算法的分数数组，稍后选最优
 
-    for name in ALGOS.keys():
-        t0 = time.perf_counter()
-        scores = run_algo(name, X)               # ← 你的算法跑分
-        dt = time.perf_counter() - t0
+    t_all = time.perf_counter()
+    results, modes, _ = _score_all(feat_df, refit=bool(state.get("refit")))
+    print(f"[LOG] {len(results)} algos finished in {time.perf_counter() - t_all:.2f}s (wall)")
 
-        # “自评”：用本模型自己 top‑2% 作为 pseudo label
-        thr = np.quantile(scores, 1 - top_q)  # 取 98% 分位数
-        y_ref = (scores >= thr).astype(int)  # 置 1 = 异常
-        pr_auc = average_precision_score(y_ref, scores)
+    # “自评”：每个模型用自己的 top‑2% 作为 pseudo label，整张矩阵一次算完
+    algos = list(results)
+    S = np.column_stack([results[a][0] for a in algos])
+    thr, self_ap = _self_eval(S, top_q)
 
-        print("阈值:", thr)
-        print("正样本个数 (≈20):", y_ref.sum())
-        print("自评 PR‑AUC:", pr_auc)
+    for j, name in enumerate(algos):
+        print(f"[{name}] 阈值: {thr[j]:.4f} | 正样本个数: {(S[:, j] >= thr[j]).sum()} "
+              f"| 自评 PR‑AUC: {self_ap[j]:.4f}")
 
         rows.append({
             "algo":    name,
-            "seconds": round(dt, 2),
-            "pr_auc":  round(pr_auc, 4),
+            "mode":    modes[name],          # fit / score（命中模型仓库）
+            "seconds": round(results[name][1], 2),
+            "pr_auc":  round(float(self_ap[j]), 4),
         })
-        scores_map[name] = scores
+        scores_map[name] = S[:, j]
 
     bench_df = pd.DataFrame(rows)
 
@@ -61,44 +113,109 @@ def _benchmark(state: dict, top_q: float = 0.02) -> dict:
     # 把最佳模型的分数写入原 DataFrame
     df["anomaly_score"] = scores_map[best]
 
-    # 保存 Excel（每个算法一个工作表 + benchmark 汇总）
-    excel_path = os.path.splitext(csv_path)[0] + "_anomaly_results.xlsx"
-    # with pd.ExcelWriter(excel_path, engine="openpyxl") as w:
-        # 每个模型的分数
-        # for algo, sc in scores_map.items():
-        #     tmp = df[["time_stamp"]].copy()
-        #     tmp["anomaly_score"] = sc
-        #     tmp.to_excel(w, sheet_name=algo, index=False)
-        # 保存每个算法的逐行分数。
-        # 统一所有工作表的列名为 time_stamp + anomaly_score，
-        # rag_eval.py 在读取时就不会再因找不到列而抛 KeyError: 'anomaly_score'。
-    with pd.ExcelWriter(excel_path, engine="openpyxl", mode="w") as w:
-        # --- 保存每个算法的逐行分数 ---
-        for algo, sc in scores_map.items():  # ← 这里用 algo
-            algo_df = pd.DataFrame({
-                "time_stamp": df["time_stamp"].astype(str),
-                "anomaly_score": sc
-            })
-            algo_df.to_excel(w, sheet_name=algo, index=False)  # ← sheet_name=algo
-
-        # 摘要
-        bench_df.to_excel(w, sheet_name="benchmark", index=False)
+    # 分数矩阵 (n_rows × n_algos) 直接经 state 交给评估节点；
+    # 磁盘上只落一个列式 .npz（Excel 改为可选、后台导出，见 _post_eval）
+    ts     = df["time_stamp"].astype(str).to_numpy()
+    artifact_path = os.path.splitext(csv_path)[0] + "_anomaly_results.npz"
+    _save_artifact(artifact_path, S, algos, bench_df, time_stamps=ts)
 
     # ——— 把结果写回 state ———
-    state["execution_output"] = df.sort_values("anomaly_score",
-                                               ascending=False).head(5)
+    state["execution_output"] = df.nlargest(5, "anomaly_score")
+    state["bench_summary"]    = bench_df
+    state["picked_algo"]      = best
+    state["score_matrix"]     = S
+    state["score_algos"]      = algos
+    state["time_stamps"]      = ts
+    state["artifact_path"]    = artifact_path
+    return state
+
+def _save_artifact(path: str, S: np.ndarray, algos, bench_df: pd.DataFrame,
+                   time_stamps=None) -> None:
+    """scores / algos / time_stamp + benchmark 各列，全部是普通 ndarray（无需 pickle）"""
+    arrays = {"scores": np.asarray(S), "algos": np.asarray(algos, dtype=str)}
+    if time_stamps is not None:
+        arrays["time_stamp"] = np.asarray(time_stamps, dtype=str)
+    for col in bench_df.columns:
+        arrays[f"bench_{col}"] = bench_df[col].to_numpy(
+            dtype=str if bench_df[col].dtype == object else None)
+    np.savez(path, **arrays)
+
+# ────────── 1b. 流式版本（文件大于内存时） ──────────
+def _benchmark_stream(state: dict, top_q: float = 0.02, top_k: int = 5) -> dict:
+    """
+    ① 第一遍：蓄水池抽样 → 在样本上 fit（或命中模型仓库）并按“自评” PR‑AUC 选模型
+    ② 第二遍：按块读取 → 所有模型只走打分路径 → 分数逐块写入 .npy（memmap）
+    ③ 全局 top‑k 由小根堆维护；峰值内存 = 样本 + 一个 chunk
+    评估节点拿到的是蓄水池样本上的分数矩阵（整表分数只在 .npy 里，不回读进内存）。
+    """
+    csv_path  = state["csv_path"]
+    feat_cols = rs.feature_columns(csv_path)
+
+    t0 = time.perf_counter()
+    sample, n_rows = rs.reservoir_sample(csv_path, feat_cols)
+    print(f"[LOG] stream: sampled {len(sample)}/{n_rows} rows in {time.perf_counter() - t0:.2f}s")
+
+    sample_scores, modes, feats = _score_all(sample, refit=bool(state.get("refit")), n_rows=n_rows)
+    _, self_ap = _self_eval(np.column_stack([sc for sc, _ in sample_scores.values()]), top_q)
+    seconds, rows = {}, []
+    for j, (name, (_, dt)) in enumerate(sample_scores.items()):
+        seconds[name] = dt
+        rows.append({"algo": name, "mode": modes[name], "pr_auc": round(float(self_ap[j]), 4)})
+    best = max(rows, key=lambda r: r["pr_auc"])["algo"]
+
+    # 第二遍：所有算法用同一套 scaler + 模型逐块打分
+    schema  = schema_key(sample.columns, sample.dtypes.astype(str))
+    models  = {n: STORE.load_model(schema, n) for n in ALGOS.keys()}
+    algos   = list(models)
+    stem    = os.path.splitext(csv_path)[0]
+    out_npy = stem + "_anomaly_scores.npy"
+    S       = np.lib.format.open_memmap(out_npy, mode="w+", dtype=np.float32,
+                                        shape=(n_rows, len(algos)))
+    top     = rs.TopK(top_k)
+    pos     = 0
+    for chunk in rs.iter_chunks(csv_path, dtype={c: "float64" for c in feat_cols}):
+        fs = transform_features(chunk[feat_cols].to_numpy(), feats.scaler)
+        for j, (name, model) in enumerate(models.items()):
+            t1 = time.perf_counter()
+            S[pos:pos + len(chunk), j] = score_algo(name, model, fs)
+            seconds[name] += time.perf_counter() - t1
+        top.push_chunk(chunk, S[pos:pos + len(chunk), algos.index(best)])
+        pos += len(chunk)
+    S.flush()
+    del S
+
+    for r in rows:
+        r["seconds"] = round(seconds[r["algo"]], 2)
+    bench_df = pd.DataFrame(rows)[["algo", "mode", "seconds", "pr_auc"]]
+    # 小文件记录 benchmark 与算法顺序；大矩阵留在 .npy 里按需映射
+    _save_artifact(stem + "_anomaly_results.npz", np.empty((0, len(algos))), algos, bench_df)
+
+    state["execution_output"] = top.to_frame()
     state["bench_summary"]    = bench_df
     state["picked_algo"]      = best
-    state["excel_path"]       = excel_path
+    # 评估只用样本分数：对整张 memmap 做 argsort 会把全部分数拉进内存，内存上界就没了
+    state["score_matrix"]     = np.column_stack([sample_scores[a][0] for a in algos])
+    state["score_sampled"]    = True
+    state["score_algos"]      = algos
+    state["time_stamps"]      = None        # 流式模式不在内存里保留时间戳
+    state["artifact_path"]    = out_npy
     return state
 
 # -------- 子图 state 描述 --------
 class AnomalyState(TypedDict, total=False):
+    refit:            bool         # True = 忽略模型仓库，强制重训
+    stream:           bool | None  # True/False 强制流式/内存模式；None = 按文件大小自动判断
     # 这几项是 _benchmark 已写进去的
     execution_output: Any          # DataFrame (供 printer 打印 Top‑5)
     bench_summary:    Any          # DataFrame (各算法评估表)
     picked_algo:      str
-    excel_path:       str
+    score_matrix:     Any          # ndarray (n_rows × n_algos)，列顺序 = score_algos
+    score_algos:      list
+    score_sampled:    bool         # True = score_matrix 只是蓄水池样本上的分数（流式模式）
+    time_stamps:      Any          # ndarray[str] | None
+    artifact_path:    str          # 列式产物：内存模式 .npz / 流式模式 .npy
+    excel_path:       str | None   # 仅在开启 Excel 导出时非空
+    export_excel:     bool         # 覆盖环境变量 RAG_EXCEL_EXPORT
 
     # 新增的评估汇总
     eval_summary:     Any
@@ -110,12 +227,27 @@ class AnomalyState(TypedDict, total=False):
 # -------- 在 benchmark 之后跑评估 --------
 def _post_eval(state: dict) -> dict:
     """
-    打开 benchmark 写出的 Excel，再跑一次评估+可视化，
+    直接拿 state 里的分数矩阵做评估+可视化（不再回读 Excel），
     并把结果写回同一个 state 供 printer 使用。
+    开启 RAG_EXCEL_EXPORT=1（或 state['export_excel']）时在后台线程导出 Excel。
     """
-    excel_path = state["excel_path"]
-    summary = run_evaluation(excel_path)      # rag_eval.py 中的主入口
+    S = state.get("score_matrix")
+    if S is None:
+        return state
+    export = state.get("export_excel")
+    if export is None:
+        export = os.getenv("RAG_EXCEL_EXPORT", "0") == "1"
+    prefix = os.path.splitext(state["csv_path"])[0] + "_anomaly_results"
+    sampled = bool(state.get("score_sampled"))
+    if sampled:                                 # 样本分数不是逐行结果，不导出 Excel
+        print(f"[LOG] stream: evaluating on the {len(S)}-row sample; full scores in {state['artifact_path']}")
+    excel_path = prefix + ".xlsx" if export and not sampled and len(S) < 1_048_576 else None   # Excel 行数上限
+
+    summary = run_evaluation(S, state["score_algos"],          # rag_eval.py 中的主入口
+                             time_stamps=state.get("time_stamps"),
+                             out_prefix=prefix, excel_path=excel_path)
     state["eval_summary"] = summary           # 打印 & 调试用
+    state["excel_path"]   = excel_path
     return state
 
 # -------- 组装子图 --------
@@ -1,7 +1,10 @@
 # RAG_subgraph_tabular_react.py
 
 from langgraph.graph import StateGraph, END
-from rag_nodes_react.thought    import thought_node
+from langchain_core.runnables import RunnableLambda
+from rag_nodes_react.fastpath   import fastpath_node
+from rag_nodes_react.plan_cache import plan_cache_node
+from rag_nodes_react.thought    import thought_node, athought_node
 from rag_nodes_react.validator  import validator_node
 from rag_nodes_react.execute    import execute_node     # 就是上面函数
 
@@ -23,7 +26,10 @@ def _validate_switch(state: dict) -> str:
 
 def build_tabular_react_subgraph():
     sg = StateGraph(dict)
-    sg.add_node("thought", thought_node)
+    # 同步 invoke 走 thought_node；ainvoke 走 athought_node（LLM 请求不占线程）
+    sg.add_node("thought", RunnableLambda(thought_node, afunc=athought_node, name="thought"))
+    sg.add_node("fastpath", fastpath_node)         # 简单句式：规则直接出计划，不走 LLM
+    sg.add_node("plan_cache", plan_cache_node)     # 命中 → 直接 execute，未命中 → thought
     sg.add_node("validate", validator_node)
     sg.add_node("execute",  execute_node)
 
@@ -37,6 +43,16 @@ def build_tabular_react_subgraph():
     # ★ 一行就够：把路径函数丢进去
     sg.add_conditional_edges("validate", _validate_switch)
 
-    sg.set_entry_point("thought")
+    sg.add_conditional_edges(
+        "plan_cache",
+        lambda s: "execute" if s.get("route") == "execute" else "thought"
+    )
+
+    sg.add_conditional_edges(
+        "fastpath",
+        lambda s: "execute" if s.get("route") == "execute" else "plan_cache"
+    )
+
+    sg.set_entry_point("fastpath")
     return sg.compile()
 
@@ -12,7 +12,8 @@ calculate_average、median、mode、sum、min、max、std、variance、percentil
 calculate_failure_rate、calculate_delay_avg
 """
 
-import os, re
+import os, re, logging, threading
+from collections import OrderedDict
 import pandas as pd
 import numpy as np
 import operator as _op
@@ -22,14 +23,50 @@ from pathlib import Path
 _BOPS = {"==": _op.eq, "!=": _op.ne, "<=": _op.le,
          ">=": _op.ge, "<": _op.lt,  ">": _op.gt}
 
-TIME_COLS = ["Scheduled_Start", "Scheduled_End",
-             "Actual_Start",    "Actual_End"]
-CSV_FILE = os.path.join("data", "hybrid_manufacturing_categorical.csv")
 
 # ---------- 基础 ----------
-TIME_COLS = ["Scheduled_Start", "Scheduled_End", "Actual_Start", "Actual_End"]
+from rag_catalog import TIME_COLS, describe     # 时间列常量与数据集目录
+from rag_sidecar import read_sidecar, write_sidecar   # Arrow/Feather 旁路文件
+from rag_predicate import predicate_mask              # select_rows 的条件编译 / 求值
+from rag_timecols import ensure_datetime, as_datetime, delta_seconds   # 时间列只解析一次
+from rag_concurrency import concurrency_series, peak_concurrency       # sweep-line 并发引擎
+from rag_context import current_context          # 请求级会话状态（last_scalar / csv_path）
 CSV_FILE = os.path.join("data", "hybrid_manufacturing_categorical.csv")
 
+log = logging.getLogger("rag.data")
+
+# Copy‑on‑Write：缓存里的 DataFrame 以浅拷贝交给工具，工具改列时才真正复制，缓存不会被污染。
+# pandas ≥ 3 默认开启；2.x 需要显式打开。
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+# ---------- 进程级 DataFrame 缓存 ----------
+# key = (绝对路径, mtime_ns-size)；按 DataFrame 实际字节数做 LRU 淘汰
+_DF_CACHE_BYTES = int(float(os.getenv("RAG_DF_CACHE_MB", "512")) * 1024 * 1024)
+_DF_CACHE: "OrderedDict[tuple, tuple[pd.DataFrame, int]]" = OrderedDict()
+_DF_CACHE_USED = 0
+_DF_LOCK = threading.Lock()
+
+def clear_df_cache() -> None:
+    global _DF_CACHE_USED
+    with _DF_LOCK:
+        _DF_CACHE.clear()
+        _DF_CACHE_USED = 0
+
+def _cache_put(key: tuple, df: pd.DataFrame) -> None:
+    global _DF_CACHE_USED
+    nbytes = int(df.memory_usage(deep=True).sum())
+    if nbytes > _DF_CACHE_BYTES:                 # 单个就超预算 → 不缓存
+        return
+    with _DF_LOCK:
+        for k in [k for k in _DF_CACHE if k[0] == key[0]]:   # 同一文件的旧版本直接丢掉
+            _DF_CACHE_USED -= _DF_CACHE.pop(k)[1]
+        _DF_CACHE[key] = (df, nbytes)
+        _DF_CACHE_USED += nbytes
+        while _DF_CACHE_USED > _DF_CACHE_BYTES:
+            _, (_, n) = _DF_CACHE.popitem(last=False)
+            _DF_CACHE_USED -= n
+
 # ==== 公共小工具 ====
 def _col(args: dict, *names, default=None):
     """尝试依次获取列名（column / target_column / …）"""
@@ -55,8 +92,8 @@ def _pick_target(d: dict, *keys: str, default=None):
 
 # ----------- 通用小工具 -----------
 def _df(cur):
-    """始终返回 DataFrame；避免布尔歧义"""
-    return cur if cur is not None else load_data()
+    """始终返回 DataFrame；避免布尔歧义（起点读本请求的数据文件）"""
+    return cur if cur is not None else load_data(current_context().csv_path)
 
 #def load_data():
 #     if not os.path.exists(CSV_FILE):
@@ -65,22 +102,87 @@ def _df(cur):
 
 def load_data(path: str | None = None) -> pd.DataFrame:
     """
-    • 如果文件包含 TIME_COLS 中的列 → 直接 parse_dates
-    • 否则普通读取，再尝试把 'time_stamp' 或任何 *_timestamp 列转为 datetime
+    带进程级缓存的读取：同一文件（路径 + mtime + size 不变）只解析一次。
+    返回缓存的浅拷贝（Copy‑on‑Write），调用方随便改列都不会影响缓存。
     """
-    path = path or CSV_FILE
-    path = Path(path)
-
+    path = Path(path or CSV_FILE)
     if not path.exists():
         raise FileNotFoundError(path)
 
-    # 1) 先读取首行拿全部列名
-    with path.open("r", encoding="utf‑8", errors="ignore") as f:
-        header = f.readline().rstrip("\n")
-    cols = [c.strip() for c in header.split(",")]
+    fp  = describe(path).fingerprint
+    key = (str(path.resolve()), fp)
+    with _DF_LOCK:
+        hit = _DF_CACHE.get(key)
+        if hit is not None:
+            _DF_CACHE.move_to_end(key)
+            return hit[0].copy(deep=False)
+
+    # 进程缓存未命中：先试旁路文件（类型已整理好、memory_map 读取），再回落 CSV
+    df = read_sidecar(path, fp)
+    if df is None:
+        df = compact_dtypes(_read_csv(path), path.name)
+        write_sidecar(path, fp, df)
+    _cache_put(key, df)
+    return df.copy(deep=False)
+
+# ---------- dtype 压缩 ----------
+_CAT_MAX_RATIO = 0.5        # 唯一值 ≤ 行数 × 0.5 的字符串列才转 category
+_INT_FLOOR     = np.int32   # 整数最多降到 int32：再小的话 df.eval 里的乘法容易静默溢出
+
+def _compact_series(s: pd.Series, n: int) -> pd.Series:
+    kind = s.dtype.kind
+    if (s.dtype == object or pd.api.types.is_string_dtype(s.dtype)) and not isinstance(
+            s.dtype, pd.CategoricalDtype):
+        if n and s.nunique(dropna=True) <= _CAT_MAX_RATIO * n:
+            return s.astype("category")            # 重复字符串 → 字典编码
+        return s
+    if kind in "iu":                               # 整数：按取值范围降位宽
+        lo, hi = (int(s.min()), int(s.max())) if n else (0, 0)
+        if np.iinfo(_INT_FLOOR).min <= lo and hi <= np.iinfo(_INT_FLOOR).max:
+            return s.astype(_INT_FLOOR)
+        return s
+    if kind == "f" and s.isna().any():             # 含 NaN 的“整数列”→ 可空整型
+        vals = s.dropna()
+        if len(vals) and (vals == np.round(vals)).all():
+            lo, hi = vals.min(), vals.max()
+            if np.iinfo(_INT_FLOOR).min <= lo and hi <= np.iinfo(_INT_FLOOR).max:
+                return s.astype("Int32")
+            return s.astype("Int64")
+    return s                                       # 其余浮点保持 float64，统计结果不丢精度
+
+def memory_report(before: pd.DataFrame, after: pd.DataFrame, name: str = "") -> str:
+    """逐列 before → after 的字节数与 dtype；总量一行汇总"""
+    b = before.memory_usage(deep=True, index=False)
+    a = after.memory_usage(deep=True, index=False)
+    lines = [f"{c:<28}{str(before[c].dtype):>14} → {str(after[c].dtype):<10}"
+             f"{b[c] / 1024:>10.1f} KB → {a[c] / 1024:>8.1f} KB"
+             for c in after.columns if before[c].dtype != after[c].dtype]
+    total = (f"[memory] {name}: {b.sum() / 2**20:.2f} MB → {a.sum() / 2**20:.2f} MB "
+             f"({1 - a.sum() / max(b.sum(), 1):.0%} saved)")
+    return "\n".join([total, *lines])
+
+def compact_dtypes(df: pd.DataFrame, name: str = "") -> pd.DataFrame:
+    """
+    load_data 的 dtype 压缩阶段：
+      • 重复字符串   → category（select_rows 的 ==、groupby、失败率都走编码）
+      • 整数         → int32（范围允许时）
+      • 含 NaN 的整数 → Int32 / Int64 可空整型
+    压缩前后的内存报告写到 rag.data 日志（INFO）。
+    """
+    n = len(df)
+    out = pd.DataFrame({c: _compact_series(df[c], n) for c in df.columns}, index=df.index)
+    if log.isEnabledFor(logging.INFO):
+        log.info(memory_report(df, out, name))
+    return out
 
+def _read_csv(path: Path) -> pd.DataFrame:
+    """
+    • 如果文件包含 TIME_COLS 中的列 → 直接 parse_dates
+    • 否则普通读取，再尝试把 'time_stamp' 或任何 *_timestamp 列转为 datetime
+    """
+    # 1) 列名 / 日期列直接查数据集目录（已缓存，不再自己读表头）
     # 2) 仅保留真正存在的日期列
-    date_cols = [c for c in TIME_COLS if c in cols]
+    date_cols = [c for c in TIME_COLS if c in describe(path).columns]
 
     try:
         df = pd.read_csv(path, parse_dates=date_cols or None, dayfirst=False)
@@ -88,12 +190,8 @@ def load_data(path: str | None = None) -> pd.DataFrame:
         # 极端情况下 parse_dates 与 dtype 冲突，再退回普通读
         df = pd.read_csv(path)
 
-    # 3) 兜底：把 'time_stamp' 或带 timestamp 的列转 datetime
-    for c in df.columns:
-        if c.lower().endswith("timestamp") or c.lower() == "time_stamp":
-            df[c] = pd.to_datetime(df[c], errors="coerce")
-
-    return df
+    # 3) 兜底：TIME_COLS / 'time_stamp' / *timestamp 列保证是 datetime64
+    return ensure_datetime(df)
 
 def _num(s: pd.Series):
     """安全转数值（失败返回 NaN）"""
@@ -110,6 +208,8 @@ def select_rows(cur, args):
       • 时间比较     'HH:MM'
       • top_n        condition:"top_n" + n/order/sort_column
       • 时间差表达式 "Actual_End - Actual_Start > 4 hours"
+      • 括号分组     "(A > 1 OR B < 2) AND C == 'x'"（AND 优先于 OR）
+    条件解析见 rag_predicate：按文本缓存 AST，整句求一次 mask。
     """
     df = _df(cur)
 
@@ -119,126 +219,35 @@ def select_rows(cur, args):
         n        = int(args.get("n", 5))
         asc      = args.get("order", "desc") == "asc"
         sort_col = args.get("sort_column", col)
-        return df.sort_values(sort_col, ascending=asc).head(n)
+        return _head_sorted(df, sort_col, n, asc)
 
-    condition = str(args["condition"]).strip()
-    col = _col(args, "column", "target_column", default=None)
+    # 优化器融合后的多个过滤条件：AND 成一个 mask，只做一次行筛选
+    if "conditions" in args:
+        masks = [predicate_mask(df, str(a["condition"]), a.get("column", a.get("target_column")))
+                 for a in args["conditions"]]
+        return df[np.logical_and.reduce(masks)]
 
-    # ---------- 缺省列名时，从条件头解析 ----------
-    if col is None:
-        m0 = re.match(r"\s*([A-Za-z_]\w*)\s*(==|!=|<=|>=|<|>)", condition)
-        if m0:
-            col = m0.group(1)
-            condition = condition[len(col):].lstrip()
-        else:
-            raise ValueError("select_rows: 无法确定列名")
-
-    # ---------- 递归处理 AND / OR ----------
-    if m := re.search(r"\s+(AND|OR)\s+", condition, flags=re.I):
-        left, logic, right = re.split(r"\s+(AND|OR)\s+", condition, 1,
-                                      flags=re.I)
-        df1 = select_rows(df, {"column": col, "condition": left})
-        if re.match(r"\s*[A-Za-z_]\w*\s*(==|!=|<=|>=|<|>)", right):
-            df2 = select_rows(df, {"condition": right})          # 右侧自己带列名
-        else:
-            df2 = select_rows(df, {"column": col, "condition": right})
-        return (pd.merge(df1, df2) if logic.upper() == "AND"
-                else pd.concat([df1, df2]).drop_duplicates())
-
-    # ---------- 1·4) column 本身就是 “A - B” 表达式，condition 只剩一个阈值 ----------
-    # 兼容形态：{"column":"A - B", "condition":"> 4 hours"} 或 {"column":"A-B", "condition":"<= 240 minutes"}
-    m_expr = None
-    if col and "-" in col and re.match(r"^\s*[<>]=?", condition):
-        m_expr = re.match(r"^\s*([A-Za-z_]\w*)\s*-\s*([A-Za-z_]\w*)\s*$", col)
-    if m_expr:
-        col_a, col_b = m_expr.groups()
-
-        # 解析 condition 里的符号 / 数值 / 单位
-        m_cond = re.match(
-            r"^\s*([<>]=?)\s*(\d+(?:\.\d+)?)\s*(hours?|minutes?|seconds?)\s*$",
-            condition, flags=re.I
-        )
-        if not m_cond:
-            raise ValueError("Bad time-diff condition syntax")
-
-        op_sym, num_str, unit = m_cond.groups()
-        seconds = float(num_str) * {"seconds": 1, "second": 1,
-                                    "minutes": 60, "minute": 60,
-                                    "hours": 3600, "hour": 3600}[unit.lower()]
-        delta = (pd.to_datetime(df[col_a]) -
-                 pd.to_datetime(df[col_b])).dt.total_seconds()
-        mask = _BOPS[op_sym](delta, seconds)
-        return df[mask]
-
-    # ---------- 1·5) 时间差表达式 ----------
-    m_td = re.match(
-        r"""^\s*
-            ([A-Za-z_]\w*)      # col A
-            \s*-\s*
-            ([A-Za-z_]\w*)      # col B
-            \s*([<>]=?)\s*      # >  >=  <  <=
-            (\d+(?:\.\d+)?)     # 数字
-            (?:\s*(hours?|minutes?|seconds?))?  # 单位可选，默认秒
-            \s*$""",
-        condition,  # ← 你的变量名，保持一致
-        flags=re.I | re.X,
-    )
-    if m_td:
-        col_a, col_b, op_sym, num_str, unit = m_td.groups()
-        unit = (unit or "seconds").lower()
-
-        seconds = float(num_str) * {
-            "seconds": 1, "second": 1,
-            "minutes": 60, "minute": 60,
-            "hours": 3600, "hour": 3600,
-        }[unit]
-
-        delta = (pd.to_datetime(df[col_a]) -
-                 pd.to_datetime(df[col_b])).dt.total_seconds()
-        mask = _BOPS[op_sym](delta, seconds)
-        return df[mask]
-
-    # ---------- 解析 <op> <rhs> ----------
-    m = re.match(r"^(==|!=|<=|>=|<|>)\s*(.+)$", condition)
-    if not m:
-        raise ValueError("Bad condition syntax")
-    op_sym, rhs_raw = m.groups()
-    rhs_raw = rhs_raw.strip(' "\'')
-
-    # 算术表达式
-    if any(sym in rhs_raw for sym in "+-*/") and rhs_raw not in df.columns:
-        mask = df.eval(f"`{col}` {op_sym} {rhs_raw}")
-        return df[mask]
-
-    # 列-列比较
-    if rhs_raw in df.columns:
-        mask = _BOPS[op_sym](df[col], df[rhs_raw])
-        return df[mask]
-
-    # HH:MM 时间点
-    if re.fullmatch(r"\d{1,2}:\d{2}", rhs_raw):
-        t_val = pd.to_datetime(rhs_raw, format="%H:%M").time()
-        mask  = _BOPS[op_sym](pd.to_datetime(df[col], errors="coerce").dt.time,
-                              t_val)
-        return df[mask]
-
-    # 日期 / 数值 / 字符串
-    if col in TIME_COLS:
-        if re.fullmatch(r"\d{4}-\d{2}-\d{2}", rhs_raw):
-            rhs_raw += " 00:00"
-        val = pd.to_datetime(rhs_raw, errors="coerce")
-    else:
-        val = pd.to_numeric(rhs_raw, errors="coerce")
-        if pd.isna(val):
-            val = rhs_raw
-
-    mask = _BOPS[op_sym](df[col], val)
+    # 条件文本 → AST（按文本缓存）→ 一次向量化 mask；行序与 index 原样保留
+    col  = args.get("column", args.get("target_column"))
+    mask = predicate_mask(df, str(args["condition"]), col)
     return df[mask]
 
+def _head_sorted(df: pd.DataFrame, col: str, n: int, asc: bool) -> pd.DataFrame:
+    """
+    sort_values(col, kind="stable").head(n) 的快速版：数值列且非空值足够时用 nsmallest / nlargest（O(n log k)）。
+    同值按原行序取（keep="first" 与稳定排序一致）；旧版默认 quicksort 时同值的先后是不确定的。
+    """
+    s = df[col]
+    if pd.api.types.is_numeric_dtype(s.dtype) and not pd.api.types.is_bool_dtype(s.dtype) \
+            and s.notna().sum() >= n:
+        return df.nsmallest(n, col, keep="first") if asc else df.nlargest(n, col, keep="first")
+    return df.sort_values(col, ascending=asc, kind="stable").head(n)
+
 def sort_rows(cur, args):
     df = _df(cur)
     asc = args.get("order", "asc") == "asc"
-    return df.sort_values(args["column"], ascending=asc)
+    return df.sort_values(_col(args, "column", "target_column", "sort_column"), ascending=asc,
+                          kind="stable")         # 同值保持原行序，与 top_n 的取法一致
 
 def top_n(cur, args):
     col = (_col(args, "column", "sort_column",
@@ -248,7 +257,7 @@ def top_n(cur, args):
     n    = int(args.get("n", 5))
     asc  = args.get("order", "desc") == "asc"
     df   = _df(cur)
-    return df.sort_values(col, ascending=asc).head(n)
+    return _head_sorted(df, col, n, asc)
 
 def group_top_n(cur, args):
     """每组取前 N；可 keep_all=True 保留其余列"""
@@ -258,8 +267,8 @@ def group_top_n(cur, args):
     n  = int(args.get("n", 1))
     asc = args.get("order", "desc") == "asc"
 
-    out = (df.sort_values(s, ascending=asc)
-             .groupby(g, as_index=False).head(n))
+    out = (df.sort_values(s, ascending=asc, kind="stable")     # 并列值保持原行序
+             .groupby(g, as_index=False, observed=True).head(n))
     return out if args.get("keep_all", True) else out[[g, s]]
 
 def filter_date_between_start_end(cur, args):
@@ -285,6 +294,7 @@ def add_derived_column(cur, args):
       • 单个日期差             "Scheduled_Start - Actual_Start"  → 秒
       • 占位符 {last_scalar}   参考注释
       • colA/colB 写法（不传 formula）
+    返回新帧（assign），不改输入：惰性计划出错回退到 base 时 base 必须还是原样
     """
     df = _df(cur)
 
@@ -292,14 +302,12 @@ def add_derived_column(cur, args):
     if "formula" not in args:
         if {"colA", "colB"} <= args.keys():
             unit = args.get("unit", "seconds")
-            delta = (pd.to_datetime(df[args["colA"]]) -
-                     pd.to_datetime(df[args["colB"]])).dt.total_seconds()
+            delta = delta_seconds(df, args["colA"], args["colB"])
             if unit == "minutes":
                 delta /= 60
             elif unit == "hours":
                 delta /= 3600
-            df[args["name"]] = delta
-            return df
+            return df.assign(**{args["name"]: delta})
         raise KeyError("add_derived_column: need 'formula' or colA/colB")
 
     # ------- 正常 formula 路径 -------
@@ -307,19 +315,17 @@ def add_derived_column(cur, args):
 
     # 占位符 {last_scalar}
     if "{last_scalar}" in formula:
-        last = globals().get("_LAST_SCALAR")
+        last = current_context().last_scalar
         formula = formula.replace("{last_scalar}", str(last) if last is not None else "0")
 
     # 单个日期差（自动转秒）
     if " - " in formula and any(c in formula for c in TIME_COLS):
         lhs, rhs = [s.strip() for s in formula.split("-", 1)]
-        delta = (pd.to_datetime(df[lhs]) -
-                 pd.to_datetime(df[rhs])).dt.total_seconds()
-        df[args["name"]] = delta
+        values = delta_seconds(df, lhs, rhs)
     else:
-        df[args["name"]] = df.eval(formula)
+        values = df.eval(formula)
 
-    return df
+    return df.assign(**{args["name"]: values})
 
 def rolling_average(cur, args):
     """支持全局与分组滚动平均"""
@@ -329,8 +335,8 @@ def rolling_average(cur, args):
     g   = args.get("group_by")
 
     if g:
-        res = (df.sort_values(g)
-                 .groupby(g, group_keys=False)[col]
+        res = (df.sort_values(g, kind="stable")     # 组内保持原行序，否则滚动窗口被打乱
+                 .groupby(g, group_keys=False, observed=True)[col]
                  .rolling(w, min_periods=1).mean()
                  .reset_index())
         res.rename(columns={col: f"rolling_avg_{col}"}, inplace=True)
@@ -367,7 +373,7 @@ def group_by_aggregate(cur, args):
     if agg in {"percentile", "quantile"}:
         q = float(args.get("q") or args.get("percentile")
                   or args.get("percent") or 50)
-        res = (_num(df[tcol]).groupby(df[gcol])
+        res = (_num(df[tcol]).groupby(df[gcol], observed=True)
                .quantile(q/100)
                .reset_index(name=f"p{int(q)}_{tcol}"))
         return df.merge(res, on=gcol, how="left") if keep else res
@@ -379,7 +385,7 @@ def group_by_aggregate(cur, args):
         if other is None:
             raise ValueError("cov/corr 需要指定 other_column / y")
         func  = pd.Series.cov if agg.startswith("cov") else pd.Series.corr
-        res = (_num(df[tcol]).groupby(df[gcol])
+        res = (_num(df[tcol]).groupby(df[gcol], observed=True)
                .apply(lambda s: func(s, _num(df[other]).loc[s.index]))
                .reset_index(name=f"{agg[:3]}_{tcol}"))
         return df.merge(res, on=gcol, how="left") if keep else res
@@ -388,7 +394,7 @@ def group_by_aggregate(cur, args):
     if agg not in _AGG_MAP:
         raise ValueError(f"Unsupported agg '{agg}'")
     func = _AGG_MAP[agg]
-    res = getattr(_num(df[tcol]).groupby(df[gcol]), func)() \
+    res = getattr(_num(df[tcol]).groupby(df[gcol], observed=True), func)() \
             .reset_index(name=f"{func}_{tcol}")
     return df.merge(res, on=gcol, how="left") if keep else res
 
@@ -400,7 +406,7 @@ def calculate_average(cur, args):
 
     if " - " in col:   # 快捷：日期差 (秒)
         lhs, rhs = [c.strip() for c in col.split("-", 1)]
-        delta = (pd.to_datetime(df[lhs]) - pd.to_datetime(df[rhs])).dt.total_seconds()
+        delta = delta_seconds(df, lhs, rhs)
         unit  = args.get("unit")
         if unit == "minutes": delta /= 60
         elif unit == "hours": delta /= 3600
@@ -429,7 +435,7 @@ def calculate_percentile(cur, args):
     q = float(args.get("percentile") or args.get("q") or 90)
     g = args.get("group_by") or args.get("group_column")
     if g:
-        return (df.groupby(g)[args["column"]]
+        return (df.groupby(g, observed=True)[args["column"]]
                   .quantile(q/100)
                   .reset_index(name=f"p{int(q)}_{args['column']}"))
     return _num(df[args["column"]]).quantile(q/100)
@@ -458,14 +464,13 @@ def count_rows(cur, _=None): return int(len(_df(cur)))
 def calculate_delay_avg(cur,args=None):
     """
     计算 delay=(col1-col2) 的平均值。
-    返回原 df，并把标量写到 _STATE['last_scalar']。
+    返回原 df，并把标量写到当前请求上下文的 last_scalar。
     """
     df = _df(cur)
-    dsec = (pd.to_datetime(df[args["column1"]]) -
-            pd.to_datetime(df[args["column2"]])).dt.total_seconds()
+    dsec = delta_seconds(df, args["column1"], args["column2"])
 
     avg_minutes = dsec.mean() / 60
-    _STATE["last_scalar"] = avg_minutes      # ← 只写标量缓存
+    current_context().last_scalar = avg_minutes   # ← 只写标量缓存
     df = df.assign(delay=dsec/60)            # 行级 delay 方便后续筛选
 
     return df                                # ← 仍然返回 DataFrame
@@ -477,22 +482,21 @@ def calculate_failure_rate(cur,args):
     """
     df = _df(cur)
     g   = args["group_column"]
-    failed = df[df["Job_Status"] == "Failed"].groupby(g).size()
-    total  = df.groupby(g).size()
+    failed = df[df["Job_Status"] == "Failed"].groupby(g, observed=True).size()
+    total  = df.groupby(g, observed=True).size()
     return (failed / total).fillna(0).reset_index(name="failure_rate")
 
 # --------- 新增：延迟平均（分组）-----------
 def calculate_delay_avg_grouped(cur, args):
     """
     计算 delay=(col1-col2) 的平均值。
-    返回原 df，并把标量写到 _STATE['last_scalar']。
+    返回原 df，并把标量写到当前请求上下文的 last_scalar。
     """
     df = _df(cur)
-    dsec = (pd.to_datetime(df[args["column1"]]) -
-            pd.to_datetime(df[args["column2"]])).dt.total_seconds()
+    dsec = delta_seconds(df, args["column1"], args["column2"])
 
     avg_minutes = dsec.mean() / 60
-    _STATE["last_scalar"] = avg_minutes      # ← 只写标量缓存
+    current_context().last_scalar = avg_minutes   # ← 只写标量缓存
     df = df.assign(delay=dsec/60)            # 行级 delay 方便后续筛选
 
     return df                                # ← 仍然返回 DataFrame
@@ -500,25 +504,14 @@ def calculate_delay_avg_grouped(cur, args):
 # ---------- 5) 导出 / 可视化 ----------
 def graph_export(cur, args: dict | None = None):
     """
-    Machine_ID ↔ Job_ID 简易二部图，保存为 GEXF
+    Machine_ID ↔ Job_ID 简易二部图，按扩展名保存为 GEXF / GraphML / 紧凑 CSR(.npz)
       args = {"file": "output/plant_graph.gexf"}
     """
-    import networkx as nx
-    df  = _df(cur)
+    from rag_graph_io import export_graph          # 批量去重建边 + 流式写出
     dst = (args or {}).get("file", "output/plant_graph.gexf")
-    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    return export_graph(_df(cur), dst)
 
-    G = nx.Graph()
-    for _, r in df.iterrows():
-        m, j = r["Machine_ID"], r["Job_ID"]
-        G.add_node(m, bipartite="machine")
-        G.add_node(j, bipartite="job")
-        G.add_edge(m, j,
-                   operation=r["Operation_Type"],
-                   start=r["Scheduled_Start"],
-                   end=r["Scheduled_End"])
-    nx.write_gexf(G, dst)
-    return dst
+_PLOT_LOCK = threading.Lock()      # pyplot 的“当前图”是进程级全局：并发请求画图必须串行
 
 # ========== 新增 2) plot_machine_avg_bar ==========
 def plot_machine_avg_bar(cur, args):
@@ -532,15 +525,16 @@ def plot_machine_avg_bar(cur, args):
     metric = args.get("metric", "Processing_Time")
     dst = args.get("file", f"output/avg_{metric}.png")
 
-    grp = df.groupby("Machine_ID")[metric].mean().sort_values()
-    plt.figure()
-    grp.plot.bar()
-    plt.ylabel(f"Average {metric}")
-    plt.title(f"Average {metric} per Machine")
-    plt.tight_layout()
+    grp = df.groupby("Machine_ID", observed=True)[metric].mean().sort_values()
     os.makedirs(os.path.dirname(dst), exist_ok=True)
-    plt.savefig(dst)
-    plt.close()
+    with _PLOT_LOCK:
+        plt.figure()
+        grp.plot.bar()
+        plt.ylabel(f"Average {metric}")
+        plt.title(f"Average {metric} per Machine")
+        plt.tight_layout()
+        plt.savefig(dst)
+        plt.close()
     return dst
 
 # ========== 新增 3) plot_concurrent_tasks_line ==========
@@ -554,28 +548,50 @@ def plot_concurrent_tasks_line(cur, args: dict | None = None):
     freq = (args or {}).get("freq", "10T")
     dst  = (args or {}).get("file", "output/concurrent_tasks.png")
 
-    # 构建时间线 (+1/-1)
-    events = []
-    for _, r in df.iterrows():
-        events.append((pd.to_datetime(r["Actual_Start"]), +1))
-        events.append((pd.to_datetime(r["Actual_End"]),   -1))
-    tl = pd.DataFrame(events, columns=["time", "delta"]).set_index("time")
-    series = (tl.sort_index()["delta"].cumsum()
+    # sweep-line：NumPy 排序 + cumsum 得到并发阶梯函数，再按 freq 重采样
+    series = (concurrency_series(df["Actual_Start"], df["Actual_End"])
                 .resample(freq).mean().ffill())
-    plt.figure()
-    series.plot()
-    plt.ylabel("Concurrent Jobs")
-    plt.title(f"Concurrent Jobs over Time (resample={freq})")
-    plt.tight_layout()
     os.makedirs(os.path.dirname(dst), exist_ok=True)
-    plt.savefig(dst)
-    plt.close()
+    with _PLOT_LOCK:
+        plt.figure()
+        series.plot()
+        plt.ylabel("Concurrent Jobs")
+        plt.title(f"Concurrent Jobs over Time (resample={freq})")
+        plt.tight_layout()
+        plt.savefig(dst)
+        plt.close()
     return dst
 
+def calculate_concurrency_series(cur, args: dict | None = None):
+    """
+    并发任务数时间序列（不画图）：返回 DataFrame[time, concurrent_jobs]
+      args = {"freq": "10T"}   # 可选；给了就按 freq 重采样（均值），否则返回事件级阶梯
+      可选 start_column / end_column，默认 Actual_Start / Actual_End
+    """
+    args = args or {}
+    df   = _df(cur)
+    s    = concurrency_series(df[args.get("start_column", "Actual_Start")],
+                              df[args.get("end_column", "Actual_End")])
+    if args.get("freq"):
+        s = s.resample(args["freq"]).mean().ffill()
+    return s.reset_index()
+
+def calculate_peak_concurrency(cur, args: dict | None = None):
+    """
+    最大并发任务数及首次达到的时刻；可按 group_column（如 Machine_ID）分别计算
+      args = {"group_column": "Machine_ID"}
+    """
+    args = args or {}
+    return peak_concurrency(_df(cur),
+                            args.get("start_column", "Actual_Start"),
+                            args.get("end_column", "Actual_End"),
+                            args.get("group_column"))
+
 def select_columns(cur, args):
     """
     保留 / 重排列：args["columns"] 或 args["pair"]
     允许写成 "Job_ID, delay" 字符串
+    strict=False 时忽略不存在的列（计划优化器插入的列裁剪用）
     """
     df = _df(cur)
 
@@ -587,6 +603,11 @@ def select_columns(cur, args):
     if isinstance(cols, str):
         cols = [c.strip() for c in cols.split(",") if c.strip()]
 
+    if not args.get("strict", True):
+        cols = [c for c in cols if c in df.columns]
+        if not cols:
+            return df
+
     if not cols:
         raise ValueError("select_columns: empty column list")
 
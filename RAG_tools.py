@@ -3,16 +3,32 @@
 """Wrap all low-level functions into BaseTool classes + registry."""
 import json, inspect, pandas as pd
 import RAG_tool_functions as tf
+from rag_deferred import LAZY_EXEC, DEFERRABLE, DeferredFrame, StepError, defer, collect, materialized
+from rag_memo import memoized, untag
+from rag_context import current_context
 from typing import Any, Dict, Optional, Callable
 from pydantic import BaseModel, SkipValidation
 from langchain_core.tools import BaseTool
 
-# —— 会话级状态 —— (DF + scalar)
-_STATE: Dict[str, Any] = {"current_df": None, "last_scalar": None}  # 把跨步骤共享的缓存清零，确保每次新请求不会受到上次遗留 DataFrame 或标量的影响。
+# —— 会话级状态 —— (DF + scalar) 不再是模块全局：存在请求级 ExecutionContext 里（见 rag_context）
+
+# 有副作用（写文件 / 改磁盘）的工具：execute 执行完即结束，也不做结果记忆化
+SIDE_EFFECT_FUNCS = {
+    "add_derived_column",       # 直接修改文件或磁盘
+    "graph_export",
+    "plot_machine_avg_bar",
+    "plot_concurrent_tasks_line",
+}
+# 不做记忆化：副作用工具 + 会写会话标量的工具
+NO_MEMO = SIDE_EFFECT_FUNCS | {"calculate_delay_avg", "calculate_delay_avg_grouped"}
 
 def reset_state() -> None:
-    _STATE["current_df"] = None
-    _STATE["last_scalar"] = None
+    """清空当前上下文的 DF + 标量（新请求请直接用新的 ExecutionContext）"""
+    current_context().reset()
+
+def current_frame() -> Optional[pd.DataFrame]:
+    """取当前上下文的 DataFrame：若有挂起的惰性计划，此时才执行"""
+    return current_context().frame()
 
 class DataFrameTool(BaseTool):  # BaseTool 来自 LangChain ，用于把任意函数包装成「可在 Agent/Graph 里统一调用」的工具对象。
     """
@@ -30,17 +46,42 @@ class DataFrameTool(BaseTool):  # BaseTool 来自 LangChain ，用于把任意
 
     def _run(self, tool_input: str) -> str:             # sync only
         args = json.loads(tool_input) if tool_input else {} # 解析 tool_input → args（如果字符串为空就给空字典）。
-        cur_df: Optional[pd.DataFrame] = _STATE["current_df"]   # cur_df 取自全局 _STATE，这样所有工具都能共享链式操作后的最新 DataFrame。
-        result = self.func(cur_df, args)
+        ctx = current_context()         # 本请求的上下文：同一请求的工具共享链式操作后的最新 DataFrame，请求之间互不可见
+        cur_df: Optional[pd.DataFrame] = ctx.current_df
+
+        # 惰性模式：DF→DF 工具只追加逻辑计划；标量 / 副作用工具到来时才一次性执行
+        if LAZY_EXEC and self.name in DEFERRABLE:
+            ctx.current_df = defer(cur_df, self.name, args)
+            return f"[DataFrame deferred] {len(ctx.current_df.steps)} pending step(s)"
+        try:
+            result = self.call(cur_df, args)
+        except StepError:
+            ctx.current_df = materialized(cur_df)   # 挂起计划里有坏步骤：退回最后一个已物化的帧
+            raise
 
         if isinstance(result, pd.DataFrame):
-            _STATE["current_df"] = result
+            ctx.current_df = result
             preview = result.head(10).to_string(index=False)
             return f"[DataFrame updated]\n{preview}"
         else:
-            _STATE["last_scalar"] = result
+            ctx.last_scalar = result
             return str(result)
 
+    def call(self, cur: Any, args: Dict[str, Any]) -> Any:
+        """
+        执行一次工具：cur 可以是 DeferredFrame（挂起的步骤连同本步一起优化、执行）。
+        确定性工具按 (输入血缘, args) 记忆化，命中时连挂起的计划都不用跑。
+        """
+        def compute():
+            if isinstance(cur, DeferredFrame):
+                return collect(cur.then(self.name, args))
+            return self.func(cur, args)
+        if self.name in NO_MEMO:
+            result = compute()
+            untag(cur), untag(result)           # 可能就地改了输入帧：它原来的血缘不再可信
+            return result
+        return memoized(self.name, cur, args, compute)
+
     @property
     def signature(self):
         # 先尝试类级 __signature__；若未生成，再退回真正函数的 inspect.signature
@@ -66,4 +107,4 @@ for fname, func in inspect.getmembers(tf, inspect.isfunction):
         tool = DataFrameTool(name=fname, description=doc, func=func)
         TOOL_REGISTRY[fname] = tool
 
-__all__ = ["TOOL_REGISTRY", "reset_state"]
+__all__ = ["TOOL_REGISTRY", "SIDE_EFFECT_FUNCS", "NO_MEMO", "reset_state", "current_frame"]
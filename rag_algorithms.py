@@ -9,29 +9,67 @@ OCSVM    – PyOD One‑ClassSVM
 """
 
 # --- ① 依赖导入
-from typing import Dict, Callable
+from typing import Dict, Callable, Tuple
+from contextlib import nullcontext
 import numpy as np
-from isotree import IsolationForest          # Extended IF (EIF)
-from pyod.models.lof import LOF              # kNN/LOF
-from pyod.models.copod import COPOD          # COPOD
-from pyod.models.ocsvm import OCSVM          # One‑Class SVM
-from pyod.models.inne import INNE
-from sklearn.neighbors import LocalOutlierFactor
-from sklearn.preprocessing import StandardScaler
+from rag_features import FeatureSet, prepare_features
+from rag_lazy import lazy_attr
+# isotree / pyod / sklearn 都很重，改为第一次实例化模型时才导入（tabular 请求一个都不加载）：
+#   isotree.IsolationForest              Extended IF (EIF)
+#   sklearn.neighbors.LocalOutlierFactor kNN/LOF
+#   pyod.models.copod.COPOD              COPOD
+#   pyod.models.inne.INNE                INNE
+#   pyod.models.ocsvm.OCSVM              One‑Class SVM
 
 # --- ② 工厂函数 —— 返回已经 .fit() 好且带 .decision_scores_ 属性的对象
 def _wrap_pyod(cls, **kw):
-    """把 PyOD 模型封装成 “无参构造器” 便于延迟实例化"""
-    return lambda: cls(**kw)
+    """把 PyOD 模型封装成 “无参构造器” 便于延迟实例化；cls 可以是 lazy_attr(...) 给出的延迟类"""
+    if isinstance(cls, type):
+        return lambda: cls(**kw)
+    return lambda: cls()(**kw)
+
+# 超参数单独列出：模型仓库（rag_model_store）用它做 key，改了参数自动重训
+ALGO_PARAMS: Dict[str, Dict[str, object]] = {
+    "EIF":   dict(ntrees=300, sample_size='auto', ndim=1, nthreads=-1),
+    "LOF":   dict(n_neighbors=20, novelty=True),
+    "COPOD": dict(),
+    "INNE":  dict(n_estimators=200, max_samples=256),
+    "OCSVM": dict(kernel="rbf", nu=0.05, gamma="scale"),
+}
+
+# 延迟类：调用时才 import 对应库
+_CLASSES: Dict[str, Callable[[], type]] = {
+    "EIF":   lazy_attr("isotree", "IsolationForest"),
+    "LOF":   lazy_attr("sklearn.neighbors", "LocalOutlierFactor"),
+    "COPOD": lazy_attr("pyod.models.copod", "COPOD"),
+    "INNE":  lazy_attr("pyod.models.inne", "INNE"),
+    "OCSVM": lazy_attr("pyod.models.ocsvm", "OCSVM"),
+}
 
 ALGOS: Dict[str, Callable[[], object]] = {
-    "EIF":   lambda : IsolationForest(ntrees=300, sample_size='auto', ndim=1, nthreads=-1),
-    "LOF":   lambda: LocalOutlierFactor(n_neighbors=20, novelty=True),
-    "COPOD": _wrap_pyod(COPOD),
-    "INNE":  _wrap_pyod(INNE, n_estimators=200, max_samples=256),
-    "OCSVM": _wrap_pyod(OCSVM, kernel="rbf", nu=0.05, gamma="scale"),
+    "EIF":   _wrap_pyod(_CLASSES["EIF"], **ALGO_PARAMS["EIF"]),
+    "LOF":   _wrap_pyod(_CLASSES["LOF"], **ALGO_PARAMS["LOF"]),
+    "COPOD": _wrap_pyod(_CLASSES["COPOD"], **ALGO_PARAMS["COPOD"]),
+    "INNE":  _wrap_pyod(_CLASSES["INNE"], **ALGO_PARAMS["INNE"]),
+    "OCSVM": _wrap_pyod(_CLASSES["OCSVM"], **ALGO_PARAMS["OCSVM"]),
 }
 
+def preload() -> None:
+    """一次性导入全部算法库（常驻服务 / 进程池预热用）"""
+    for cls in _CLASSES.values():
+        cls()
+
+# --- ②.5 每个算法的 CPU 预算（线程数）
+# 并行跑分时每个算法占一个进程，EIF 的 nthreads=-1 会把所有核吃满、和其他进程抢 CPU。
+# 可用环境变量覆盖，例如 RAG_ALGO_THREADS="EIF=4,OCSVM=1"
+ALGO_THREADS: Dict[str, int] = {"EIF": 2, "LOF": 1, "COPOD": 1, "INNE": 1, "OCSVM": 1}
+
+def _apply_cpu_budget(model, n_jobs: int) -> None:
+    """把线程数写进模型自身的并行参数（isotree: nthreads；sklearn/pyod: n_jobs）"""
+    for attr in ("nthreads", "n_jobs"):
+        if hasattr(model, attr):
+            setattr(model, attr, n_jobs)
+
 def _try_get_score(model, X, prefer_neg=True) -> np.ndarray:
     """
     按优先级依次尝试获取连续得分:
@@ -82,23 +120,58 @@ def _try_get_score(model, X, prefer_neg=True) -> np.ndarray:
 #     model = ALGOS[name]()
 #     model.fit(X_)
 #     return -model.predict(X_).astype(float)
-def run_algo(name: str, X: np.ndarray) -> np.ndarray:
+# 距离 / 密度模型对量纲敏感，吃标准化后的矩阵
+SCALED_ALGOS = {"LOF", "OCSVM", "INNE", "COPOD"}
+
+def _cpu_limits(n_jobs: int | None):
+    from threadpoolctl import threadpool_limits  # sklearn 的依赖，限制 BLAS/OpenMP 线程
+    return threadpool_limits(limits=n_jobs) if n_jobs is not None else nullcontext()
+
+def fit_algo(name: str, features: FeatureSet,
+             n_jobs: int | None = None) -> Tuple[object, np.ndarray]:
+    """训练一个算法，返回 (已 fit 的模型, 训练集上的 anomaly score)"""
+    X_ = features.scaled if name in SCALED_ALGOS else features.raw
+
+    model = ALGOS[name]()
+    if n_jobs is not None:
+        _apply_cpu_budget(model, n_jobs)
+    with _cpu_limits(n_jobs):
+        model.fit(X_)
+        scores = _try_get_score(model, X_, prefer_neg=True)
+    return model, scores
+
+def score_algo(name: str, model, features: FeatureSet,
+               n_jobs: int | None = None) -> np.ndarray:
+    """
+    只走打分路径：用已训练好的模型给新一批数据打分（不 fit）。
+    与 _try_get_score 的方向约定一致：分数越大 → 越异常。
+    """
+    X_ = features.scaled if name in SCALED_ALGOS else features.raw
+    if n_jobs is not None:
+        _apply_cpu_budget(model, n_jobs)
+    with _cpu_limits(n_jobs):
+        if hasattr(model, "decision_function"):
+            scores = model.decision_function(X_).ravel()
+        elif hasattr(model, "score_samples"):
+            scores = model.score_samples(X_).ravel()
+        else:
+            scores = model.predict(X_).astype(float)
+    return -np.asarray(scores, dtype=float)
+
+def run_algo(name: str, X: np.ndarray, n_jobs: int | None = None,
+             features: FeatureSet | None = None) -> np.ndarray:
     """
     统一调度各算法，返回连续 anomaly score。
     分数越大 → 越异常。
+    n_jobs：CPU 预算（线程数）；None = 沿用模型默认值。
+    features：prepare_features(X) 的结果；多个算法共用同一份，不再各自标准化。
     """
-    # 1) 特征缩放：距离 / 密度模型敏感
-    if name in {"LOF", "OCSVM", "INNE", "COPOD"}:
-        X_ = StandardScaler().fit_transform(X)
-    else:                       # EIF 或其它
-        X_ = X
-
-    # 2) 训练
-    model = ALGOS[name]()
-    model.fit(X_)
+    # 1) 特征缩放：由 FeatureSet 统一提供（每个数据集只算一次）
+    if features is None:
+        features = prepare_features(X)
 
-    # 3) 取分
-    scores = _try_get_score(model, X_, prefer_neg=True)
+    # 2) 训练 + 3) 取分
+    _, scores = fit_algo(name, features, n_jobs=n_jobs)
 
     # 4) 可选: 归一化 (解除注释即可)
     # scores = (scores - scores.mean()) / (scores.std(ddof=0) + 1e-9)
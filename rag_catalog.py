@@ -0,0 +1,133 @@
+# rag_catalog.py
+"""
+数据集目录（catalog）：不解析整张表就回答“这份 CSV 长什么样”
+------------------------------------------------------------------
+describe(path) → DatasetInfo(columns, dtypes, date_cols, n_rows, fingerprint)
+
+• 表头 + 前 SNIFF_ROWS 行推断 dtype；日期列 = TIME_COLS ∪ *timestamp 列；
+• 行数按字节数换行符得到（不解析字段，GB 级文件也只是一次顺序读）；
+• fingerprint = mtime_ns + size：文件变了自动失效；
+• 进程内 dict + 磁盘 .cache/catalog.json，跨进程 / 跨次运行复用。
+
+预处理取列名、thought 拼列名、load_data 找日期列、异常子图定 dtype 都从这里拿；
+真正的整表解析只在工具需要行数据时发生一次。
+"""
+
+from __future__ import annotations
+import os, json, hashlib, logging, tempfile, threading, contextlib
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+import pandas as pd
+
+log = logging.getLogger("rag.catalog")
+
+# 制造业数据集里固定的时间列（RAG_tool_functions 也从这里导入）
+TIME_COLS = ["Scheduled_Start", "Scheduled_End", "Actual_Start", "Actual_End"]
+
+CATALOG_PATH = Path(os.getenv("RAG_CATALOG", os.path.join(".cache", "catalog.json")))
+SNIFF_ROWS   = int(os.getenv("RAG_CATALOG_SNIFF", "1000"))   # 推断 dtype 读的行数
+
+@dataclass(frozen=True)
+class DatasetInfo:
+    path:        str                    # 绝对路径
+    fingerprint: str                    # f"{mtime_ns}-{size}"
+    columns:     Tuple[str, ...]
+    dtypes:      Dict[str, str]         # 列 → 推断出的 dtype 字符串
+    date_cols:   Tuple[str, ...]
+    n_rows:      int
+
+    @property
+    def numeric_columns(self) -> List[str]:
+        return [c for c in self.columns
+                if self.dtypes[c].startswith(("int", "float")) and c not in self.date_cols]
+
+_MEM: Dict[str, DatasetInfo] = {}
+_LOCK = threading.Lock()
+_DISK_LOADED = False
+
+def fingerprint(path: str | os.PathLike) -> str:
+    st = os.stat(path)
+    return f"{st.st_mtime_ns}-{st.st_size}"
+
+def _is_date_col(col: str) -> bool:
+    low = col.lower()
+    return col in TIME_COLS or low == "time_stamp" or low.endswith("timestamp")
+
+def _count_rows(path: Path, block: int = 1 << 20) -> int:
+    """数换行符得到数据行数（不含表头）；末行没有换行符也算一行"""
+    n, last = 0, b"\n"
+    with path.open("rb") as f:
+        while chunk := f.read(block):
+            n += chunk.count(b"\n")
+            last = chunk[-1:]
+    if last != b"\n":
+        n += 1
+    return max(n - 1, 0)
+
+def _sniff(path: Path, fp: str) -> DatasetInfo:
+    head = pd.read_csv(path, nrows=SNIFF_ROWS)
+    date_cols = tuple(c for c in head.columns if _is_date_col(c))
+    return DatasetInfo(path=str(path), fingerprint=fp,
+                       columns=tuple(map(str, head.columns)),
+                       dtypes={str(c): str(t) for c, t in head.dtypes.items()},
+                       date_cols=date_cols, n_rows=_count_rows(path))
+
+# ---------- 磁盘持久化 ----------
+def _load_disk() -> None:
+    global _DISK_LOADED
+    _DISK_LOADED = True
+    try:
+        raw = json.loads(CATALOG_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return
+    for key, d in raw.items():
+        try:
+            _MEM.setdefault(key, DatasetInfo(**{**d, "columns": tuple(d["columns"]),
+                                                "date_cols": tuple(d["date_cols"])}))
+        except TypeError:                              # 旧格式条目 → 忽略，重新 sniff
+            continue
+
+def _save_disk() -> None:
+    """唯一命名的临时文件 + os.replace：多个进程同时写目录时不会互相覆盖半个文件"""
+    text = json.dumps({k: asdict(v) for k, v in _MEM.items()}, ensure_ascii=False)
+    tmp = None
+    try:
+        CATALOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=CATALOG_PATH.parent, prefix=f".{CATALOG_PATH.name}.",
+                                   suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, CATALOG_PATH)
+    except OSError as e:
+        if tmp is not None:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp)
+        log.warning("catalog write failed: %s", e)
+
+# ---------- 对外接口 ----------
+def describe(path: str | os.PathLike) -> DatasetInfo:
+    """返回文件的 DatasetInfo；fingerprint 未变则直接命中缓存"""
+    p = Path(path).resolve()
+    if not p.exists():
+        raise FileNotFoundError(path)
+    key, fp = str(p), fingerprint(p)
+    with _LOCK:
+        if not _DISK_LOADED:
+            _load_disk()
+        info = _MEM.get(key)
+        if info is not None and info.fingerprint == fp:
+            return info
+    info = _sniff(p, fp)
+    log.debug("catalog: sniffed %s (%d cols, %d rows)", key, len(info.columns), info.n_rows)
+    with _LOCK:
+        _MEM[key] = info
+        _save_disk()
+    return info
+
+def columns(path: str | os.PathLike) -> List[str]:
+    return list(describe(path).columns)
+
+def schema_key(cols) -> str:
+    """列名序列的短哈希：只看 schema，不看数据（数据变了、列没变 → key 不变）"""
+    return hashlib.blake2b("\x1f".join(map(str, cols)).encode(), digest_size=8).hexdigest()
@@ -0,0 +1,68 @@
+# rag_concurrency.py
+"""
+并发任务数的 sweep-line 引擎（纯 NumPy）
+------------------------------------------------------------------
+每个任务 [start, end) 产生两个事件：start → +1，end → −1。
+    ① 事件时间一次性拼成数组（不逐行 iterrows / to_datetime）；
+    ② np.lexsort 排序：同一时刻先处理 −1 再处理 +1（首尾相接的任务不算重叠）；
+    ③ cumsum 得到每个事件之后的并发数；同一时刻只保留最后的状态。
+分组（如每台机器）时按 (组, 时间, 事件) 一起排序：每组的 +1/−1 总和为 0，
+整体 cumsum 在组边界自然归零，一遍扫描就得到所有组的曲线。
+"""
+
+from __future__ import annotations
+from typing import Tuple
+import numpy as np
+import pandas as pd
+
+from rag_timecols import as_datetime
+
+def _events(starts: pd.Series, ends: pd.Series) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """返回 (有效行 mask, 事件时间 int64 ns, 事件增量)；起止任一为 NaT 的任务丢弃"""
+    s = as_datetime(starts).to_numpy().astype("datetime64[ns]")
+    e = as_datetime(ends).to_numpy().astype("datetime64[ns]")
+    ok = ~(np.isnat(s) | np.isnat(e))
+    t = np.concatenate([s[ok], e[ok]]).view("i8")
+    d = np.concatenate([np.ones(ok.sum(), np.int64), -np.ones(ok.sum(), np.int64)])
+    return ok, t, d
+
+def _last_per_time(t: np.ndarray, c: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """已按时间排好序：同一时刻只保留最后一个（该时刻全部事件处理完后的状态）"""
+    last = np.ones(len(t), dtype=bool)
+    last[:-1] = t[1:] != t[:-1]
+    return t[last], c[last]
+
+def concurrency_series(starts: pd.Series, ends: pd.Series) -> pd.Series:
+    """阶梯函数：index = 事件时刻，值 = 该时刻之后的并发任务数"""
+    _, t, d = _events(starts, ends)
+    order = np.lexsort((d, t))                   # 主键时间，次键增量（−1 在前）
+    t, c = _last_per_time(t[order], np.cumsum(d[order]))
+    return pd.Series(c, index=pd.DatetimeIndex(t.view("datetime64[ns]"), name="time"),
+                     name="concurrent_jobs")
+
+def peak_concurrency(df: pd.DataFrame, start_col: str = "Actual_Start",
+                     end_col: str = "Actual_End", group_col: str | None = None) -> pd.DataFrame:
+    """每组（或整体）的最大并发数及首次达到峰值的时刻"""
+    if group_col is None:
+        s = concurrency_series(df[start_col], df[end_col])
+        if s.empty:
+            return pd.DataFrame({"peak_concurrency": [0], "peak_time": [pd.NaT]})
+        return pd.DataFrame({"peak_concurrency": [int(s.max())], "peak_time": [s.idxmax()]})
+
+    ok, t, d = _events(df[start_col], df[end_col])
+    codes, uniques = pd.factorize(df[group_col].to_numpy()[ok], sort=True)
+    g = np.concatenate([codes, codes])
+    order = np.lexsort((d, t, g))                # 组 → 时间 → 增量
+    g, t, c = g[order], t[order], np.cumsum(d[order])
+
+    # 同组同一时刻只留最后状态
+    last = np.ones(len(t), dtype=bool)
+    last[:-1] = (t[1:] != t[:-1]) | (g[1:] != g[:-1])
+    g, t, c = g[last], t[last], c[last]
+
+    res = pd.DataFrame({"g": g, "c": c, "t": t.view("datetime64[ns]")})
+    idx = res.groupby("g", sort=True)["c"].idxmax()
+    out = res.loc[idx.to_numpy()]
+    return pd.DataFrame({group_col:          np.asarray(uniques)[out["g"].to_numpy()],
+                         "peak_concurrency": out["c"].to_numpy(),
+                         "peak_time":        out["t"].to_numpy()})
@@ -0,0 +1,77 @@
+# rag_context.py
+"""
+请求级执行上下文（取代 RAG_tools 的模块级 _STATE）
+------------------------------------------------------------------
+旧实现：current_df / last_scalar 挂在模块全局上，calculate_delay_avg 写一个
+RAG_tool_functions 里根本不存在的 _STATE，add_derived_column 又去读 globals()["_LAST_SCALAR"]
+—— 同一进程里两个请求并发就会互相覆盖，只能靠多开进程（每个进程一份模型）来扩容。
+
+这里：
+  • ExecutionContext 保存一个请求的工具会话状态（当前帧、上一个标量、数据文件路径）；
+  • 通过 contextvars 绑定到“当前执行流”：线程池里的每个请求、asyncio 里的每个任务互不可见；
+  • execute_node 从 state["exec_ctx"] 取出本请求的上下文再调用工具，
+    LangGraph 把节点丢到别的线程 / 任务里跑也不会丢；
+  • 没有显式绑定时回落到进程级默认上下文（RAG_main 一次性模式、脚本里直接调工具）。
+"""
+
+from __future__ import annotations
+import itertools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, Optional
+
+from rag_deferred import DeferredFrame, StepError, collect, materialized
+
+_IDS = itertools.count(1)
+
+@dataclass
+class ExecutionContext:
+    request_id: Any = field(default_factory=lambda: f"ctx-{next(_IDS)}")
+    csv_path:    Optional[str] = None             # None = RAG_tool_functions.CSV_FILE
+    current_df:  Any = None                        # DataFrame / DeferredFrame / None
+    last_scalar: Any = None
+
+    def frame(self) -> Any:
+        """取当前 DataFrame：有挂起的惰性计划时此刻才执行（结果写回上下文）"""
+        if isinstance(self.current_df, DeferredFrame):
+            try:
+                self.current_df = collect(self.current_df)
+            except StepError:
+                self.current_df = materialized(self.current_df)    # 丢掉坏掉的挂起计划
+                raise
+        return self.current_df
+
+    def reset(self) -> None:
+        self.current_df = self.last_scalar = None
+
+    def __repr__(self) -> str:                     # state 被打日志时别把整张表打出来
+        return (f"ExecutionContext(request_id={self.request_id!r}, csv_path={self.csv_path!r}, "
+                f"current_df={type(self.current_df).__name__}, last_scalar={self.last_scalar!r})")
+
+_DEFAULT = ExecutionContext(request_id="process")
+_CURRENT: ContextVar[Optional[ExecutionContext]] = ContextVar("rag_exec_ctx", default=None)
+
+def current_context() -> ExecutionContext:
+    """当前执行流绑定的上下文；没有绑定时返回进程级默认上下文"""
+    return _CURRENT.get() or _DEFAULT
+
+@contextmanager
+def use_context(ctx: ExecutionContext) -> Iterator[ExecutionContext]:
+    """在 with 块内把 ctx 绑定为当前上下文（可嵌套，退出时恢复原绑定）"""
+    token = _CURRENT.set(ctx)
+    try:
+        yield ctx
+    finally:
+        _CURRENT.reset(token)
+
+def context_for(state: Dict[str, Any]) -> ExecutionContext:
+    """取 state 里本请求的上下文；没有就新建一个挂上去（同步 csv_path）"""
+    ctx = state.get("exec_ctx")
+    if not isinstance(ctx, ExecutionContext):
+        ctx = state["exec_ctx"] = ExecutionContext(csv_path=state.get("csv_path"))
+    elif state.get("csv_path"):
+        ctx.csv_path = state["csv_path"]
+    return ctx
+
+__all__ = ["ExecutionContext", "current_context", "use_context", "context_for"]
@@ -0,0 +1,70 @@
+# rag_deferred.py
+"""
+工具链的惰性执行（deferred execution）
+------------------------------------------------------------------
+DF→DF 工具（过滤 / 排序 / 派生列 …）不再立刻执行，而是往 DeferredFrame 上追加一步逻辑计划；
+只有遇到下面几种情况才 collect() 一次性跑完：
+    • 标量工具（calculate_* / count_rows …）需要真实数据；
+    • 副作用工具（graph_export / plot_*）；
+    • 计划最后一步 —— 最终结果要展示。
+步骤按原样执行：validator / fastpath 产出计划时已经优化过，collect 不再重复改写。
+中间结果不落 state、不渲染预览。某一步失败时抛 StepError，调用方应把当前帧退回
+DeferredFrame.base（最后一个已物化的帧），否则重试会接在坏掉的计划后面。
+RAG_LAZY_EXEC=0 恢复逐步立即执行。
+"""
+
+from __future__ import annotations
+import os, logging
+from dataclasses import dataclass
+from typing import Any, Dict, Tuple
+
+log = logging.getLogger("rag.deferred")
+
+LAZY_EXEC = os.getenv("RAG_LAZY_EXEC", "1") != "0"
+
+# 输入输出都是 DataFrame、且没有副作用的工具 —— 可以推迟
+DEFERRABLE = {
+    "select_rows", "sort_rows", "top_n", "group_top_n", "filter_date_between_start_end",
+    "add_derived_column", "rolling_average", "select_columns", "group_by_aggregate",
+}
+
+class StepError(RuntimeError):
+    """collect 时某一步失败：保留是哪个工具、什么参数，便于回报给 LLM"""
+    def __init__(self, fname: str, args: Dict[str, Any], err: Exception) -> None:
+        super().__init__(f"{fname} {args} -> {err}")
+        self.fname, self.step_args, self.err = fname, args, err
+
+@dataclass(frozen=True)
+class DeferredFrame:
+    base:  Any                                          # 起点 DataFrame；None = 由第一步 load_data()
+    steps: Tuple[Tuple[str, Dict[str, Any]], ...] = ()
+
+    def then(self, fname: str, args: Dict[str, Any]) -> "DeferredFrame":
+        return DeferredFrame(self.base, self.steps + ((fname, args),))
+
+    def __repr__(self) -> str:
+        chain = " → ".join(f for f, _ in self.steps) or "∅"
+        return f"<DeferredFrame {chain}>"
+
+def defer(cur: Any, fname: str, args: Dict[str, Any]) -> DeferredFrame:
+    base = cur if isinstance(cur, DeferredFrame) else DeferredFrame(cur)
+    return base.then(fname, args)
+
+def collect(obj: Any) -> Any:
+    """DeferredFrame → 真正执行；其他对象原样返回"""
+    if not isinstance(obj, DeferredFrame):
+        return obj
+    from RAG_tools import TOOL_REGISTRY
+
+    cur = obj.base
+    for fname, args in obj.steps:
+        try:
+            cur = TOOL_REGISTRY[fname].func(cur, args)
+        except Exception as e:
+            raise StepError(fname, args, e) from e
+    log.debug("collected %d deferred steps", len(obj.steps))
+    return cur
+
+def materialized(obj: Any) -> Any:
+    """最后一个已物化的帧：DeferredFrame → base，其余原样（出错后回退用）"""
+    return obj.base if isinstance(obj, DeferredFrame) else obj
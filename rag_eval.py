@@ -2,9 +2,86 @@
 
 import pandas as pd
 import numpy as np
-import os
-from sklearn.metrics import precision_recall_fscore_support, precision_recall_curve, average_precision_score
-import matplotlib.pyplot as plt
+import os, atexit, threading
+
+_EXPORT_JOIN_S = float(os.getenv("RAG_EXCEL_JOIN_S", "30"))   # 进程退出时最多等后台导出多久
+_EXPORTS: set[threading.Thread] = set()
+_EXPORTS_LOCK = threading.Lock()
+
+# ---------- 0. 向量化评估引擎 ----------
+def _as_matrix(S) -> np.ndarray:
+    S = np.asarray(S, dtype=np.float64)
+    return S[:, None] if S.ndim == 1 else S
+
+def pr_pass(S: np.ndarray, Y: np.ndarray, with_curves: bool = False):
+    """
+    一次排序同时得到所有列的 average precision（与 sklearn.average_precision_score 一致，
+    同分样本按同一阈值处理）。
+      S: (n × k) 分数；Y: (n × k) 或 (n,) 的 0/1 标签
+    返回 (ap[k], curves)；with_curves=True 时 curves[j] = (precision, recall)，
+    与 sklearn.precision_recall_curve 的输出顺序相同，可直接画图。
+    """
+    S = _as_matrix(S)
+    n, k = S.shape
+    Y = np.broadcast_to(np.asarray(Y).reshape(n, -1), (n, k))
+
+    order    = np.argsort(-S, axis=0, kind="stable")
+    S_sorted = np.take_along_axis(S, order, axis=0)
+    tp       = np.cumsum(np.take_along_axis(Y, order, axis=0), axis=0, dtype=np.int64)
+
+    # 每段同分样本的最后一个位置才是一个有效阈值
+    ends = np.ones((n, k), dtype=bool)
+    ends[:-1] = S_sorted[:-1] != S_sorted[1:]
+
+    # 上一个阈值处的 tp（tp 单调不减，累计最大值即“最近一个阈值”的值）
+    last = np.maximum.accumulate(np.where(ends, tp, 0), axis=0)
+    prev = np.vstack([np.zeros((1, k), dtype=tp.dtype), last[:-1]])
+
+    pos  = tp[-1]
+    prec = tp / np.arange(1, n + 1)[:, None]
+    ap   = (np.where(ends, tp - prev, 0) * prec).sum(0) / np.maximum(pos, 1)
+
+    curves = []
+    if with_curves:
+        for j in range(k):
+            idx = np.flatnonzero(ends[:, j])
+            tps = tp[idx, j]
+            p = tps / (idx + 1)
+            r = tps / pos[j] if pos[j] else np.ones_like(p)
+            curves.append((np.hstack((p[::-1], 1)), np.hstack((r[::-1], 0))))
+    return ap, curves
+
+def evaluate_matrix(S, top_q: float = 0.02, eval_q: float = 0.98,
+                    y_ref: np.ndarray | None = None, with_curves: bool = False) -> dict:
+    """
+    对整张分数矩阵一次算完：
+      thresholds —— 每列 (1-top_q) 分位数（一次 np.quantile(axis=0)）
+      votes      —— 每列 top‑q 投票；y_ens = 过半数
+      precision / recall / f1 —— 以每列 eval_q 分位数为界的二分类指标
+      pr_auc     —— average precision（pr_pass）
+    y_ref 为空时用 ensemble 伪标签做参照。每个指标只算一次，画图直接复用 curves。
+    """
+    S = _as_matrix(S)
+    k = S.shape[1]
+
+    thr   = np.quantile(S, 1 - top_q, axis=0)
+    votes = S >= thr
+    y_ens = (votes.sum(1) >= (k + 1) // 2).astype(int)
+    y     = y_ens if y_ref is None else np.asarray(y_ref).astype(int)
+
+    thr_eval = thr if np.isclose(eval_q, 1 - top_q) else np.quantile(S, eval_q, axis=0)
+    pred     = votes if thr_eval is thr else S >= thr_eval
+    tp       = (pred & (y[:, None] == 1)).sum(0)
+    n_pred   = pred.sum(0)
+    n_pos    = y.sum()
+    precision = np.divide(tp, n_pred, out=np.zeros(k), where=n_pred > 0)
+    recall    = tp / n_pos if n_pos else np.zeros(k)
+    denom     = precision + recall
+    f1        = np.divide(2 * precision * recall, denom, out=np.zeros(k), where=denom > 0)
+
+    ap, curves = pr_pass(S, y, with_curves=with_curves)
+    return dict(thresholds=thr, votes=votes, y_ens=y_ens, precision=precision,
+                recall=recall, f1=f1, pr_auc=ap, curves=curves)
 
 # ---------- 1. 构造“伪标签” ----------
 def pseudo_labels(df: pd.DataFrame, top_q: float = 0.02) -> np.ndarray:
@@ -13,74 +90,111 @@ def pseudo_labels(df: pd.DataFrame, top_q: float = 0.02) -> np.ndarray:
     生成 ensemble 伪标签。返回 0/1 ndarray。
     """
     algos = [c for c in df.columns if c not in ("time_stamp", "ensemble")]
-    votes = np.zeros((len(df), len(algos)), dtype=int)
-    for j, col in enumerate(algos):
-        thr = np.quantile(df[col], 1 - top_q)
-        votes[:, j] = (df[col] >= thr).astype(int)
-    # ≥ half 算一致异常
-    return (votes.sum(1) >= (len(algos) + 1)//2).astype(int)
+    return evaluate_matrix(df[algos].to_numpy(), top_q=top_q)["y_ens"]
 
 # ---------- 2. 单算法评估 ----------
 def evaluate(scores: np.ndarray, y_ref: np.ndarray) -> dict[str, float]:
-    prec, rec, f1, _ = precision_recall_fscore_support(
-        y_ref, (scores >= np.quantile(scores, 0.98)).astype(int),
-        average="binary", zero_division=0
-    )
-    pr_auc = average_precision_score(y_ref, scores)
-    return dict(precision=prec, recall=rec, f1=f1, pr_auc=pr_auc)
-
-# ---------- 3. 总入口 ----------
-def run_evaluation(excel_path: str, save_fig: bool = True) -> pd.DataFrame:
-    xls = pd.ExcelFile(excel_path)
-    dfs  = [xls.parse(s) for s in xls.sheet_names]
-
-    # 只保留含 anomaly_score 的工作表（排除 benchmark）
-    algo_sheets = [(s, df) for s, df in zip(xls.sheet_names, dfs) if "anomaly_score" in df.columns]
-
-    # 以第一个算法的 time_stamp 为主键做外连接，避免长度不一致
-    merged = algo_sheets[0][1][["time_stamp"]].copy()
-
-    for sheet, df in algo_sheets:
-        merged = merged.merge(
-            df[["time_stamp", "anomaly_score"]].rename(
-                columns={"anomaly_score": sheet}),
-            on="time_stamp", how="left"
-        )
-
-    y_ens = pseudo_labels(merged)
-    merged["ensemble"] = y_ens
+    m = evaluate_matrix(scores, y_ref=y_ref)
+    return {k: float(m[k][0]) for k in ("precision", "recall", "f1", "pr_auc")}
 
-    # ---------- 仅保留真正的算法列 ----------
-    algo_cols = [c for c in merged.columns if c not in ("time_stamp", "ensemble")]
+# ---------- 3. 读取落盘的分数 ----------
+def load_scores(path: str):
+    """
+    读取 benchmark 产物，返回 (score_matrix, algos, time_stamps)
+      • *.npz  —— 现行列式格式（scores / algos / time_stamp）
+      • *.xlsx —— 旧版每算法一个工作表的格式，仅为兼容保留
+    """
+    if path.endswith(".npz"):
+        with np.load(path, allow_pickle=False) as z:
+            ts = z["time_stamp"] if "time_stamp" in z.files else None
+            return z["scores"], [str(a) for a in z["algos"]], ts
+    xls = pd.ExcelFile(path)
+    sheets = [(s, xls.parse(s)) for s in xls.sheet_names]
+    sheets = [(s, df) for s, df in sheets if "anomaly_score" in df.columns]
+    ts = sheets[0][1]["time_stamp"].astype(str).to_numpy()
+    return (np.column_stack([df["anomaly_score"].to_numpy(float) for _, df in sheets]),
+            [s for s, _ in sheets], ts)
 
-    # ---------- 生成评估汇总 ----------
-    rows = []
-    for algo in algo_cols:
-        rows.append({"algo": algo,
-                     **evaluate(merged[algo].values, y_ens)})
-
-    summary = pd.DataFrame(rows).round(4)
-
-    # ---------- 4. 可视化 ----------
-    if save_fig:
-        plt.figure()
-        for algo in algo_cols:
-            p, r, _ = precision_recall_curve(y_ens, merged[algo].values)
-            plt.step(r, p, where="post",
-                     label=f"{algo}  AP={evaluate(merged[algo].values, y_ens)['pr_auc']:.3f}")
-        plt.xlabel("Recall")
-        plt.ylabel("Precision")
-        plt.title("Precision‑Recall curves (ensemble pseudo‑labels)")
-        plt.legend()
-        plt.tight_layout()
-        fig_path = os.path.splitext(excel_path)[0] + "_pr_curve.png"
-        plt.savefig(fig_path, dpi=300)
-        plt.close()
-
-    # 把 summary & 伪标签追加写回 Excel
-    with pd.ExcelWriter(excel_path, mode="a", engine="openpyxl", if_sheet_exists="replace") as w:
+# ---------- 4. 可选：后台导出 Excel ----------
+def export_excel(excel_path: str, scores: np.ndarray, algos: list[str],
+                 time_stamps, summary: pd.DataFrame, y_ens: np.ndarray) -> None:
+    """与旧版产物同构：每算法一个工作表 + benchmark 汇总 + merged_scores"""
+    ts = (pd.Series(time_stamps, dtype=str) if time_stamps is not None
+          else pd.Series(np.arange(len(scores)).astype(str)))
+    merged = pd.DataFrame(np.asarray(scores), columns=algos)
+    merged.insert(0, "time_stamp", ts.values)
+    merged["ensemble"] = y_ens
+    with pd.ExcelWriter(excel_path, engine="openpyxl", mode="w") as w:
+        for algo in algos:
+            merged[["time_stamp", algo]].rename(columns={algo: "anomaly_score"}) \
+                .to_excel(w, sheet_name=algo, index=False)
         summary.to_excel(w, sheet_name="benchmark", index=False)
         merged.to_excel(w, sheet_name="merged_scores", index=False)
-    return summary
 
+def _export_tracked(*args) -> None:
+    try:
+        export_excel(*args)
+    finally:
+        with _EXPORTS_LOCK:
+            _EXPORTS.discard(threading.current_thread())
+
+def export_excel_async(*args) -> threading.Thread:
+    """
+    openpyxl 很慢：放到后台 daemon 线程，不阻塞请求；
+    进程退出时最多等 RAG_EXCEL_JOIN_S 秒让它写完，卡住的导出不会拖住退出。
+    """
+    t = threading.Thread(target=_export_tracked, args=args, name="excel-export", daemon=True)
+    with _EXPORTS_LOCK:
+        _EXPORTS.add(t)
+    t.start()
+    return t
+
+@atexit.register
+def join_exports(timeout: float | None = None) -> None:
+    deadline = _EXPORT_JOIN_S if timeout is None else timeout
+    with _EXPORTS_LOCK:
+        pending = list(_EXPORTS)
+    for t in pending:
+        t.join(deadline)
 
+# ---------- 5. 总入口 ----------
+def run_evaluation(scores, algos: list[str] | None = None, time_stamps=None,
+                   out_prefix: str | None = None, save_fig: bool = True,
+                   excel_path: str | None = None) -> pd.DataFrame:
+    """
+    scores：(n_rows × n_algos) 分数矩阵（列顺序与 algos 一致），
+            也可以直接传 benchmark 产物路径（.npz / 旧版 .xlsx）。
+    out_prefix：PR 曲线图的文件名前缀；excel_path 非空时在后台导出 Excel。
+    """
+    if isinstance(scores, (str, os.PathLike)):
+        out_prefix = out_prefix or os.path.splitext(str(scores))[0]
+        scores, algos, time_stamps = load_scores(str(scores))
+
+    S = _as_matrix(scores)
+    algos = list(algos) if algos is not None else [f"algo_{j}" for j in range(S.shape[1])]
+    m = evaluate_matrix(S, with_curves=save_fig and bool(out_prefix))
+    y_ens = m["y_ens"]
+
+    # ---------- 生成评估汇总 ----------
+    summary = pd.DataFrame({"algo": algos, "precision": m["precision"],
+                            "recall": m["recall"], "f1": m["f1"],
+                            "pr_auc": m["pr_auc"]}).round(4)
+
+    # ---------- 可视化（复用上面算好的 PR 曲线与 AP） ----------
+    # 用 OO 的 Figure 而不是 pyplot：不碰全局“当前图”，并发评估互不串图
+    if save_fig and out_prefix:
+        from matplotlib.figure import Figure
+        fig = Figure()
+        ax = fig.add_subplot()
+        for algo, (p, r), ap in zip(algos, m["curves"], m["pr_auc"]):
+            ax.step(r, p, where="post", label=f"{algo}  AP={ap:.3f}")
+        ax.set_xlabel("Recall")
+        ax.set_ylabel("Precision")
+        ax.set_title("Precision‑Recall curves (ensemble pseudo‑labels)")
+        ax.legend()
+        fig.tight_layout()
+        fig.savefig(out_prefix + "_pr_curve.png", dpi=300)
+
+    if excel_path:
+        export_excel_async(excel_path, scores, algos, time_stamps, summary, y_ens)
+    return summary
@@ -0,0 +1,156 @@
+# rag_features.py
+"""
+特征准备阶段：每个数据集只标准化一次
+------------------------------------------------------------------
+• prepare_features(X) → FeatureSet(raw, scaled, scaler)
+• 以矩阵内容的哈希做 key（content-addressed）：
+      内存里保留最近几份；磁盘上 .cache/features/<key>.npy 可跨进程/跨次运行复用
+• scaled 统一存 float32 + C 连续，直接交给 LOF / OCSVM / INNE / COPOD，不再各自拷贝
+• 磁盘缓存有上限：RAG_FEATURE_CACHE_MB（默认 2048）/ RAG_FEATURE_CACHE_DAYS（默认 30），
+  每次写入后按最近使用时间淘汰（命中会刷新 mtime）
+"""
+
+from __future__ import annotations
+import os, time, hashlib, logging, tempfile, threading, contextlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+import numpy as np
+
+log = logging.getLogger("rag.features")
+
+CACHE_DIR = Path(os.getenv("RAG_FEATURE_CACHE", os.path.join(".cache", "features")))
+_MEM_SLOTS = 4                                   # 内存里最多保留几份 FeatureSet
+_DISK_MB   = float(os.getenv("RAG_FEATURE_CACHE_MB", "2048"))
+_DISK_DAYS = float(os.getenv("RAG_FEATURE_CACHE_DAYS", "30"))
+_MEM: "OrderedDict[str, FeatureSet]" = OrderedDict()
+_LOCK = threading.Lock()
+
+@dataclass(frozen=True)
+class FeatureSet:
+    key:    str                 # 内容哈希
+    raw:    np.ndarray          # 原始数值矩阵 (float64, C 连续) —— EIF 用
+    scaled: np.ndarray          # 标准化后矩阵 (float32, C 连续) —— 距离/密度模型用
+    scaler: object | None = None  # 拟合好的 StandardScaler（工作进程里为 None）
+
+def content_key(X: np.ndarray) -> str:
+    """shape + dtype + 字节内容 的 blake2b 摘要"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str((X.shape, X.dtype.str)).encode())
+    h.update(memoryview(np.ascontiguousarray(X)).cast("B"))
+    return h.hexdigest()
+
+def _with_scaler(key: str, scaler) -> str:
+    """同一份数据 + 不同 scaler → 不同 key"""
+    h = hashlib.blake2b(key.encode(), digest_size=16)
+    for arr in (scaler.mean_, scaler.scale_):
+        h.update(np.ascontiguousarray(arr, dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+def _remember(fs: FeatureSet) -> FeatureSet:
+    with _LOCK:
+        _MEM[fs.key] = fs
+        _MEM.move_to_end(fs.key)
+        while len(_MEM) > _MEM_SLOTS:
+            _MEM.popitem(last=False)
+    return fs
+
+# ---------- 磁盘缓存 ----------
+def _atomic_write(path: Path, write) -> None:
+    """唯一命名的临时文件 + os.replace：并发读者只会看到完整文件"""
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
+
+def _evict(max_mb: float = _DISK_MB, max_days: float = _DISK_DAYS) -> None:
+    """按 key 成组淘汰：先删超龄的，再从最久未用的删起直到总量不超过上限（0 = 不限）"""
+    groups: dict[str, list] = {}
+    for p in CACHE_DIR.glob("*.*"):
+        if p.name.startswith("."):              # 正在写的临时文件
+            continue
+        try:
+            st = p.stat()
+        except OSError:
+            continue
+        groups.setdefault(p.name.split(".", 1)[0], []).append((p, st.st_size, st.st_mtime))
+    entries = sorted(((max(m for _, _, m in fs), sum(z for _, z, _ in fs), fs)
+                      for fs in groups.values()), key=lambda e: e[0])
+    total, now = sum(e[1] for e in entries), time.time()
+    for mtime, size, files in entries:
+        too_old = max_days > 0 and now - mtime > max_days * 86400
+        too_big = max_mb > 0 and total > max_mb * 2**20
+        if not (too_old or too_big):
+            continue
+        for p, _, _ in files:
+            with contextlib.suppress(OSError):
+                p.unlink()                       # 已经 mmap 的进程不受影响（POSIX）
+        total -= size
+        log.debug("feature cache evicted %s", files[0][0].name.split(".", 1)[0])
+
+def prepare_features(X: np.ndarray, use_disk: bool = True,
+                     scaler: object | None = None) -> FeatureSet:
+    """
+    构造（或复用）数据集的 FeatureSet。
+      ① 内存命中 → 直接返回
+      ② 磁盘命中 → np.load(mmap_mode="r")，只读映射、不复制
+      ③ 都没有   → StandardScaler 拟合一次，落盘
+    scaler：传入已拟合的 scaler（如模型仓库里存的）时只做 transform，不重新拟合。
+    """
+    from sklearn.preprocessing import StandardScaler
+    import joblib
+
+    raw = np.ascontiguousarray(X, dtype=np.float64)
+    key = content_key(raw)
+    if scaler is not None:
+        key = _with_scaler(key, scaler)
+
+    with _LOCK:
+        if key in _MEM:
+            _MEM.move_to_end(key)
+            return _MEM[key]
+
+    arr_path = CACHE_DIR / f"{key}.scaled.npy"
+    scl_path = CACHE_DIR / f"{key}.scaler.joblib"
+    if use_disk and arr_path.exists() and scl_path.exists():
+        try:
+            scaled = np.load(arr_path, mmap_mode="r")
+            fs = FeatureSet(key, raw, scaled, joblib.load(scl_path))
+            log.debug("feature cache hit (disk) %s", key)
+            for p in (arr_path, scl_path):
+                with contextlib.suppress(OSError):
+                    os.utime(p)                 # 刷新 mtime：淘汰按最近使用
+            return _remember(fs)
+        except Exception as e:                  # 文件损坏 / 半截 pickle → 重新计算
+            log.warning("feature cache %s unreadable: %s", key, e)
+
+    if scaler is None:
+        scaler = StandardScaler().fit(raw)
+    scaled = np.ascontiguousarray(scaler.transform(raw), dtype=np.float32)
+
+    if use_disk:
+        try:
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+
+            def _save_array(tmp):
+                with open(tmp, "wb") as f:
+                    np.save(f, scaled)
+
+            # 原子替换，避免并发读到半个文件；scaler 先写，数组存在即表示整组可用
+            _atomic_write(scl_path, lambda tmp: joblib.dump(scaler, tmp))
+            _atomic_write(arr_path, _save_array)
+            _evict()
+        except OSError as e:
+            log.warning("feature cache write failed: %s", e)
+
+    return _remember(FeatureSet(key, raw, scaled, scaler))
+
+def transform_features(X: np.ndarray, scaler) -> FeatureSet:
+    """用已拟合的 scaler 临时构造 FeatureSet，不哈希、不缓存（流式打分的每个 chunk 用）"""
+    raw = np.ascontiguousarray(X, dtype=np.float64)
+    return FeatureSet("", raw, np.ascontiguousarray(scaler.transform(raw), dtype=np.float32), scaler)
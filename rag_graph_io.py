@@ -0,0 +1,162 @@
+# rag_graph_io.py
+"""
+二部图（Machine_ID ↔ Job_ID）的批量构建与流式导出
+------------------------------------------------------------------
+• bipartite_edges(df)   —— 列数组一次性去重：节点用 unique()，同一对 (机器, 任务) 保留最后一行
+                           （与旧实现逐行 add_edge 覆盖属性的语义一致）
+• build_graph(df)       —— add_nodes_from / add_edges_from 一次批量建 networkx 图
+• write_gexf / write_graphml —— 不建 XML 树，按块拼字符串直接写文件，内存只与块大小有关
+• write_csr             —— .npz：indptr / indices（机器 → 任务的 CSR）+ 两侧标签，
+                           百万级任务图的紧凑二进制导出
+export_graph(df, dst) 按扩展名选格式：.gexf / .graphml / .npz；其他扩展名照旧写 GEXF
+"""
+
+from __future__ import annotations
+import os, logging
+from dataclasses import dataclass
+from typing import Dict, Iterable, Sequence, TextIO
+import numpy as np
+import pandas as pd
+
+log = logging.getLogger("rag.graph")
+
+LEFT, RIGHT = "Machine_ID", "Job_ID"
+EDGE_ATTRS: Dict[str, str] = {"operation": "Operation_Type",
+                              "start":     "Scheduled_Start",
+                              "end":       "Scheduled_End"}
+CHUNK = int(os.getenv("RAG_GRAPH_CHUNK", "65536"))       # 每次写出的边数
+
+@dataclass(frozen=True)
+class BipartiteEdges:
+    left:   np.ndarray                   # 机器节点（去重后，object）
+    right:  np.ndarray                   # 任务节点（去重后，object）
+    src:    np.ndarray                   # 每条边的机器
+    dst:    np.ndarray                   # 每条边的任务
+    attrs:  Dict[str, np.ndarray]        # 边属性名 → 字符串数组
+
+    @property
+    def n_edges(self) -> int:
+        return len(self.src)
+
+# ---------- 批量抽取 ----------
+def _as_text(s: pd.Series) -> np.ndarray:
+    """属性列 → 字符串数组；datetime 统一成 ISO 格式，缺失 → 空串"""
+    if pd.api.types.is_datetime64_any_dtype(s.dtype):
+        return s.dt.strftime("%Y-%m-%dT%H:%M:%S").fillna("").to_numpy(dtype=object)
+    return s.astype(object).where(s.notna(), "").astype(str).to_numpy(dtype=object)
+
+def bipartite_edges(df: pd.DataFrame, left: str = LEFT, right: str = RIGHT,
+                    attrs: Dict[str, str] | None = None) -> BipartiteEdges:
+    attrs = EDGE_ATTRS if attrs is None else attrs
+    cols = [left, right] + [c for c in attrs.values() if c in df.columns]
+    sub = df[cols].dropna(subset=[left, right])
+    sub = sub[~sub.duplicated([left, right], keep="last")]  # 重复边：最后一行的属性生效
+    src = sub[left].astype(object).to_numpy()
+    dst = sub[right].astype(object).to_numpy()
+    return BipartiteEdges(left=pd.unique(src), right=pd.unique(dst), src=src, dst=dst,
+                          attrs={k: _as_text(sub[c]) for k, c in attrs.items() if c in sub.columns})
+
+def build_graph(df: pd.DataFrame, **kw):
+    """一次性 add_nodes_from / add_edges_from 建 networkx.Graph"""
+    import networkx as nx
+    e = bipartite_edges(df, **kw)
+    G = nx.Graph()
+    G.add_nodes_from(e.left, bipartite="machine")
+    G.add_nodes_from(e.right, bipartite="job")
+    names = list(e.attrs)
+    G.add_edges_from((s, d, dict(zip(names, vals)))
+                     for s, d, *vals in zip(e.src, e.dst, *e.attrs.values()))
+    return G
+
+# ---------- XML 流式写出 ----------
+def _esc(a: np.ndarray) -> np.ndarray:
+    """整列做 XML 转义（向量化的 str.replace）"""
+    s = pd.Series(a, dtype=object).astype(str)
+    for ch, rep in (("&", "&amp;"), ("<", "&lt;"), (">", "&gt;"), ('"', "&quot;")):
+        s = s.str.replace(ch, rep, regex=False)
+    return s.to_numpy(dtype=object)
+
+def _chunks(n: int) -> Iterable[slice]:
+    for i in range(0, n, CHUNK):
+        yield slice(i, min(i + CHUNK, n))
+
+def _write_rows(fh: TextIO, fmt: str, cols: Sequence[np.ndarray], n: int) -> None:
+    for sl in _chunks(n):
+        fh.write("".join(fmt.format(*row) for row in zip(*(c[sl] for c in cols))))
+
+def write_gexf(e: BipartiteEdges, dst: str) -> str:
+    names = list(e.attrs)
+    with open(dst, "w", encoding="utf-8") as fh:
+        fh.write("<?xml version='1.0' encoding='utf-8'?>\n"
+                 '<gexf xmlns="http://www.gexf.net/1.2draft" version="1.2">\n'
+                 '  <graph defaultedgetype="undirected" mode="static">\n'
+                 '    <attributes class="node" mode="static">\n'
+                 '      <attribute id="0" title="bipartite" type="string" />\n'
+                 '    </attributes>\n'
+                 '    <attributes class="edge" mode="static">\n')
+        fh.write("".join(f'      <attribute id="{i + 1}" title="{k}" type="string" />\n'
+                         for i, k in enumerate(names)))
+        fh.write("    </attributes>\n    <nodes>\n")
+        for nodes, kind in ((e.left, "machine"), (e.right, "job")):
+            ids = _esc(nodes)
+            _write_rows(fh, '      <node id="{0}" label="{0}"><attvalues>'
+                            f'<attvalue for="0" value="{kind}" /></attvalues></node>\n',
+                        [ids], len(ids))
+        fh.write("    </nodes>\n    <edges>\n")
+        att = "".join(f'<attvalue for="{i + 1}" value="{{{i + 3}}}" />' for i in range(len(names)))
+        _write_rows(fh, '      <edge source="{0}" target="{1}" id="{2}"><attvalues>'
+                        + att + "</attvalues></edge>\n",
+                    [_esc(e.src), _esc(e.dst), np.arange(e.n_edges)]
+                    + [_esc(v) for v in e.attrs.values()], e.n_edges)
+        fh.write("    </edges>\n  </graph>\n</gexf>\n")
+    return dst
+
+def write_graphml(e: BipartiteEdges, dst: str) -> str:
+    names = list(e.attrs)
+    with open(dst, "w", encoding="utf-8") as fh:
+        fh.write("<?xml version='1.0' encoding='utf-8'?>\n"
+                 '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+                 '  <key id="d0" for="node" attr.name="bipartite" attr.type="string" />\n')
+        fh.write("".join(f'  <key id="d{i + 1}" for="edge" attr.name="{k}" attr.type="string" />\n'
+                         for i, k in enumerate(names)))
+        fh.write('  <graph edgedefault="undirected">\n')
+        for nodes, kind in ((e.left, "machine"), (e.right, "job")):
+            ids = _esc(nodes)
+            _write_rows(fh, f'    <node id="{{0}}"><data key="d0">{kind}</data></node>\n',
+                        [ids], len(ids))
+        data = "".join(f'<data key="d{i + 1}">{{{i + 2}}}</data>' for i in range(len(names)))
+        _write_rows(fh, '    <edge source="{0}" target="{1}">' + data + "</edge>\n",
+                    [_esc(e.src), _esc(e.dst)] + [_esc(v) for v in e.attrs.values()], e.n_edges)
+        fh.write("  </graph>\n</graphml>\n")
+    return dst
+
+# ---------- 紧凑二进制 ----------
+def write_csr(e: BipartiteEdges, dst: str) -> str:
+    """机器 → 任务的 CSR：第 i 台机器的任务下标是 indices[indptr[i]:indptr[i+1]]"""
+    row = pd.Index(e.left).get_indexer(e.src)
+    col = pd.Index(e.right).get_indexer(e.dst)
+    order = np.lexsort((col, row))
+    indptr = np.zeros(len(e.left) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(row, minlength=len(e.left)), out=indptr[1:])
+    payload: Dict[str, np.ndarray] = {
+        "indptr":  indptr,
+        "indices": col[order].astype(np.int32 if len(e.right) < 2**31 else np.int64),
+        "left":    e.left.astype(str),
+        "right":   e.right.astype(str),
+    }
+    payload.update({f"attr_{k}": v[order].astype(str) for k, v in e.attrs.items()})
+    np.savez(dst, **payload)
+    return dst
+
+_WRITERS = {".gexf": write_gexf, ".graphml": write_graphml, ".npz": write_csr}
+
+def export_graph(df: pd.DataFrame, dst: str, **kw) -> str:
+    ext = os.path.splitext(dst)[1].lower()
+    if ext not in _WRITERS:                     # 旧版对任何文件名都写 GEXF：保持兼容
+        log.warning("graph_export: unknown extension %r, writing GEXF to %s", ext, dst)
+    os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+    e = bipartite_edges(df, **kw)
+    _WRITERS.get(ext, write_gexf)(e, dst)
+    log.info("graph_export: %d machines, %d jobs, %d edges → %s",
+             len(e.left), len(e.right), e.n_edges, dst)
+    return dst
@@ -0,0 +1,135 @@
+# rag_lazy.py
+"""
+惰性加载层 + 冷启动分析
+------------------------------------------------------------------
+• lazy_import("isotree")   —— 返回模块代理，第一次访问属性时才真正 import
+• lazy(factory)            —— 线程安全的“只建一次”包装；SentenceTransformer / OpenAI client 等用它
+• warm_all()               —— 常驻服务启动时一次性把所有 lazy 对象建好
+• 命令行：
+      python rag_lazy.py RAG_graph_config --budget-ms 1500
+  用 `python -X importtime` 在干净子进程里导入目标模块，打印最耗时的导入，
+  总耗时超出预算时以非零码退出（可放进 CI 守住冷启动时间）。
+"""
+
+from __future__ import annotations
+import os, re, sys, time, types, logging, importlib, threading, subprocess
+from typing import Any, Callable, Generic, List, Tuple, TypeVar
+
+log = logging.getLogger("rag.lazy")
+T = TypeVar("T")
+
+# ---------- 模块代理 ----------
+class _LazyModule(types.ModuleType):
+    def __init__(self, name: str) -> None:
+        super().__init__(name)
+        self.__dict__["_lazy_mod"] = None
+        self.__dict__["_lazy_lock"] = threading.Lock()
+
+    def _load(self) -> types.ModuleType:
+        mod = self.__dict__["_lazy_mod"]
+        if mod is None:
+            with self.__dict__["_lazy_lock"]:
+                mod = self.__dict__["_lazy_mod"]
+                if mod is None:
+                    t0 = time.perf_counter()
+                    mod = importlib.import_module(self.__name__)
+                    self.__dict__["_lazy_mod"] = mod
+                    log.debug("lazy import %s: %.0f ms", self.__name__,
+                              (time.perf_counter() - t0) * 1000)
+        return mod
+
+    def __getattr__(self, item: str) -> Any:
+        return getattr(self._load(), item)
+
+    def __dir__(self):
+        return dir(self._load())
+
+def lazy_import(name: str) -> types.ModuleType:
+    """已导入过就直接返回真模块；否则返回代理"""
+    return sys.modules.get(name) or _LazyModule(name)
+
+def lazy_attr(module: str, attr: str) -> Callable[[], Any]:
+    """延迟取 module.attr（常用于类）：lazy_attr("isotree", "IsolationForest")()"""
+    return lambda: getattr(importlib.import_module(module), attr)
+
+# ---------- 只建一次的对象 ----------
+_REGISTRY: List["Lazy"] = []
+
+class Lazy(Generic[T]):
+    """lazy(factory)()：首次调用时执行 factory，之后返回同一个对象"""
+
+    def __init__(self, factory: Callable[[], T], name: str | None = None) -> None:
+        self._factory = factory
+        self._value: T | None = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        self.name = name or getattr(factory, "__qualname__", repr(factory))
+        _REGISTRY.append(self)
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def __call__(self) -> T:
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    t0 = time.perf_counter()
+                    self._value = self._factory()
+                    self._loaded = True
+                    log.debug("lazy init %s: %.0f ms", self.name,
+                              (time.perf_counter() - t0) * 1000)
+        return self._value  # type: ignore[return-value]
+
+def lazy(factory: Callable[[], T], name: str | None = None) -> Lazy[T]:
+    return Lazy(factory, name)
+
+def warm_all() -> None:
+    """常驻模式：把所有已注册的 lazy 对象提前建好；单个失败只记日志"""
+    for item in list(_REGISTRY):
+        try:
+            item()
+        except Exception:
+            log.warning("warm-up of %s failed", item.name, exc_info=True)
+
+# ---------- 冷启动分析 ----------
+_IMPORT_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+def import_profile(module: str) -> Tuple[float, List[Tuple[str, float, float]]]:
+    """
+    在子进程里 `python -X importtime -c "import <module>"`，
+    返回 (总墙钟毫秒, [(模块, self_ms, cumulative_ms), …])
+    """
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True, cwd=os.getcwd())
+    wall = (time.perf_counter() - t0) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr else "import failed")
+    rows = [(m.group(4), int(m.group(1)) / 1000, int(m.group(2)) / 1000)
+            for m in map(_IMPORT_LINE.match, proc.stderr.splitlines()) if m]
+    return wall, rows
+
+def report(module: str, top: int = 15, budget_ms: float | None = None) -> bool:
+    """打印导入耗时 Top‑N；返回是否在预算之内"""
+    wall, rows = import_profile(module)
+    total_self = sum(r[1] for r in rows)
+    print(f"[cold-start] import {module}: wall {wall:.0f} ms, "
+          f"import {total_self:.0f} ms, {len(rows)} modules")
+    print(f"{'module':<48}{'self ms':>10}{'cum ms':>10}")
+    for name, self_ms, cum_ms in sorted(rows, key=lambda r: -r[2])[:top]:
+        print(f"{name:<48}{self_ms:>10.1f}{cum_ms:>10.1f}")
+    if budget_ms is not None and wall > budget_ms:
+        print(f"[cold-start] OVER BUDGET: {wall:.0f} ms > {budget_ms:.0f} ms")
+        return False
+    return True
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="import-time profile / cold-start budget")
+    ap.add_argument("module", nargs="?", default="RAG_graph_config")
+    ap.add_argument("--top", type=int, default=15)
+    ap.add_argument("--budget-ms", type=float,
+                    default=float(os.getenv("RAG_COLD_START_BUDGET_MS", "0")) or None)
+    a = ap.parse_args()
+    sys.exit(0 if report(a.module, a.top, a.budget_ms) else 1)
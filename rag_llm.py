@@ -0,0 +1,217 @@
+# rag_llm.py
+"""
+共享的异步 LLM 网关（OpenAI 兼容 /chat/completions）
+------------------------------------------------------------------
+旧实现：thought / router 各自 new 一个 OpenAI client，同步阻塞调用，validator 重试时整条链干等。
+这里：
+  • 一个进程只有一个 httpx.AsyncClient（连接池 + keep-alive），跑在后台事件循环线程上；
+  • asyncio.Semaphore 限制同时在途的请求数；
+  • 超时、429 / 5xx / 网络错误按指数退避 + 抖动重试（尊重 Retry-After）；
+  • achat() 可以在任意事件循环里 await（LangGraph ainvoke），chat() 给同步节点用。
+
+环境变量：
+  LLM_BASE_URL        默认 https://integrate.api.nvidia.com/v1（本地桩：http://127.0.0.1:8765/v1）
+  LLM_API_KEY         缺省时用 NGC_API_KEY
+  LLM_MODEL           默认 meta/llama-3.1-8b-instruct
+  LLM_CONCURRENCY=8   LLM_TIMEOUT=30   LLM_RETRIES=3   LLM_BACKOFF=0.5
+
+本地桩服务（联调 / 压测不花 API 费用）：
+  python rag_llm.py stub --port 8765 --reply '{"finish": "ok"}' --delay 0.2
+  LLM_BASE_URL=http://127.0.0.1:8765/v1 python rag_llm.py ping "hello"
+"""
+
+from __future__ import annotations
+import os, json, time, random, asyncio, logging, threading
+from typing import Any, Dict, List
+
+from rag_lazy import lazy
+
+log = logging.getLogger("rag.llm")
+
+DEFAULT_BASE_URL = "https://integrate.api.nvidia.com/v1"
+DEFAULT_MODEL    = "meta/llama-3.1-8b-instruct"
+_RETRY_STATUS    = {408, 409, 429, 500, 502, 503, 504}
+_MAX_SLEEP       = 30.0
+
+Messages = List[Dict[str, str]]
+
+class LLMError(RuntimeError):
+    """重试用尽或不可重试的错误（4xx / 响应格式不对）"""
+
+class LLMGateway:
+    def __init__(self, base_url: str | None = None, api_key: str | None = None,
+                 model: str | None = None, concurrency: int | None = None,
+                 timeout: float | None = None, retries: int | None = None,
+                 backoff: float | None = None) -> None:
+        self.base_url    = (base_url or os.getenv("LLM_BASE_URL") or DEFAULT_BASE_URL).rstrip("/")
+        self.api_key     = api_key or os.getenv("LLM_API_KEY") or os.getenv("NGC_API_KEY")
+        self.model       = model or os.getenv("LLM_MODEL", DEFAULT_MODEL)
+        self.concurrency = concurrency or int(os.getenv("LLM_CONCURRENCY", "8"))
+        self.timeout     = timeout or float(os.getenv("LLM_TIMEOUT", "30"))
+        self.retries     = int(os.getenv("LLM_RETRIES", "3")) if retries is None else retries
+        self.backoff     = float(os.getenv("LLM_BACKOFF", "0.5")) if backoff is None else backoff
+
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._client = None
+        self._sem: asyncio.Semaphore | None = None
+        self._start_lock = threading.Lock()
+        self._stats = {"requests": 0, "retries": 0, "failures": 0, "in_flight": 0, "seconds": 0.0}
+
+    # ---------- 后台事件循环 ----------
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is not None:
+            return self._loop
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="rag-llm-loop", daemon=True).start()
+                asyncio.run_coroutine_threadsafe(self._open(), loop).result()
+                self._loop = loop
+        return self._loop
+
+    async def _open(self) -> None:
+        import httpx                            # 只有真正要调 LLM 时才导入
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url, headers=headers,
+            timeout=httpx.Timeout(self.timeout),
+            limits=httpx.Limits(max_connections=self.concurrency,
+                                max_keepalive_connections=self.concurrency),
+        )
+        self._sem = asyncio.Semaphore(self.concurrency)
+
+    def close(self) -> None:
+        loop = self._loop
+        if loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._client.aclose(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        self._loop = self._client = self._sem = None
+
+    # ---------- 请求 + 重试（只在网关循环上运行） ----------
+    def _sleep_for(self, attempt: int, retry_after: str | None) -> float:
+        if retry_after:
+            try:
+                return min(float(retry_after), _MAX_SLEEP)
+            except ValueError:
+                pass
+        base = self.backoff * (2 ** attempt)
+        return min(base + random.uniform(0, self.backoff), _MAX_SLEEP)
+
+    async def _chat(self, messages: Messages, params: Dict[str, Any]) -> str:
+        import httpx
+        payload = {"model": self.model, "messages": messages, **params}
+        async with self._sem:
+            self._stats["in_flight"] += 1
+            t0 = time.perf_counter()
+            try:
+                for attempt in range(self.retries + 1):
+                    retry_after = None
+                    try:
+                        r = await self._client.post("/chat/completions", json=payload)
+                        if r.status_code < 400:
+                            data = r.json()
+                            self._stats["requests"] += 1
+                            return (data["choices"][0]["message"].get("content") or "").strip()
+                        if r.status_code not in _RETRY_STATUS:
+                            raise LLMError(f"LLM HTTP {r.status_code}: {r.text[:300]}")
+                        retry_after, why = r.headers.get("retry-after"), f"HTTP {r.status_code}"
+                    except (httpx.TransportError, httpx.TimeoutException) as e:
+                        why = f"{type(e).__name__}: {e}"
+                    except (KeyError, IndexError, ValueError) as e:
+                        raise LLMError(f"malformed LLM response: {e}") from e
+                    if attempt == self.retries:
+                        raise LLMError(f"LLM request failed after {attempt + 1} attempts ({why})")
+                    delay = self._sleep_for(attempt, retry_after)
+                    self._stats["retries"] += 1
+                    log.warning("LLM %s – retry %d/%d in %.2fs", why, attempt + 1, self.retries, delay)
+                    await asyncio.sleep(delay)
+            except Exception:
+                self._stats["failures"] += 1
+                raise
+            finally:
+                self._stats["in_flight"] -= 1
+                self._stats["seconds"] += time.perf_counter() - t0
+        raise AssertionError("unreachable")
+
+    # ---------- 对外接口 ----------
+    async def achat(self, messages: Messages, **params: Any) -> str:
+        """任意事件循环里都能 await；HTTP 始终在网关循环上跑（连接池只属于一个 loop）"""
+        loop = self._ensure_loop()
+        if asyncio.get_running_loop() is loop:
+            return await self._chat(messages, params)
+        return await asyncio.wrap_future(
+            asyncio.run_coroutine_threadsafe(self._chat(messages, params), loop))
+
+    def chat(self, messages: Messages, **params: Any) -> str:
+        """同步版本：阻塞当前线程直到拿到回复（不能在网关循环线程里调用）"""
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(self._chat(messages, params), loop).result()
+
+    def stats(self) -> Dict[str, Any]:
+        out = dict(self._stats)
+        out["seconds"] = round(out["seconds"], 3)
+        return out
+
+get_gateway = lazy(LLMGateway, name="LLM gateway")
+
+# ---------- 本地桩服务 ----------
+def serve_stub(port: int = 0, reply: str = '{"finish": "stub"}', delay: float = 0.0,
+               fail_first: int = 0):
+    """
+    OpenAI 兼容的最小桩：POST */chat/completions 返回固定 reply。
+    fail_first=N：前 N 个请求回 503，用来验证重试。返回已在后台线程运行的 server。
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    counter = {"n": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            with lock:
+                counter["n"] += 1
+                n = counter["n"]
+            time.sleep(delay)
+            if n <= fail_first:
+                self.send_response(503)
+                self.send_header("Retry-After", "0")
+                self.end_headers()
+                return
+            body = json.dumps({"choices": [{"index": 0, "message": {
+                "role": "assistant", "content": reply}}]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *a):              # 不刷屏
+            pass
+
+    srv = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, name="rag-llm-stub", daemon=True).start()
+    log.info("LLM stub on http://127.0.0.1:%d/v1", srv.server_address[1])
+    return srv
+
+
+if __name__ == "__main__":
+    import argparse
+    logging.basicConfig(level=logging.INFO)
+    ap = argparse.ArgumentParser(description="LLM gateway: local stub server / ping")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    s = sub.add_parser("stub")
+    s.add_argument("--port", type=int, default=8765)
+    s.add_argument("--reply", default='{"finish": "stub"}')
+    s.add_argument("--delay", type=float, default=0.0)
+    s.add_argument("--fail-first", type=int, default=0)
+    p = sub.add_parser("ping")
+    p.add_argument("text")
+    a = ap.parse_args()
+    if a.cmd == "stub":
+        serve_stub(a.port, a.reply, a.delay, a.fail_first)
+        threading.Event().wait()
+    else:
+        print(get_gateway().chat([{"role": "user", "content": a.text}], max_tokens=64))
+        print(get_gateway().stats())
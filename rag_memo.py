@@ -0,0 +1,156 @@
+# rag_memo.py
+"""
+确定性工具调用的结果记忆化
+------------------------------------------------------------------
+key = (工具名, 输入帧的血缘 key, 规范化后的 args JSON)
+
+输入帧的血缘（lineage）不靠哈希整张表，而是记录“它是怎么来的”：
+    • None            → ("src", 本请求数据文件的绝对路径, mtime/size 指纹) —— 文件变了自动失效
+    • DeferredFrame   → ("plan", 起点血缘, 挂起步骤)                  —— 命中时整条惰性链都不用执行
+    • 本模块产出的 DF → 产出它的那次调用的 key（按对象 id + 弱引用登记）
+来历不明的 DataFrame（外部传入 / 副作用工具产出）不参与记忆化，计为 bypass。
+
+命中返回浅拷贝（Copy-on-Write 下调用方随便改都不影响缓存）；条目数按 LRU 限额，
+单个结果超过 RAG_MEMO_MAX_MB 的不缓存。哪些工具跳过由调用方（RAG_tools.NO_MEMO）决定。
+RAG_MEMO=0 关闭。
+"""
+
+from __future__ import annotations
+import os, json, logging, threading, weakref
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Tuple
+import pandas as pd
+
+from rag_catalog import describe
+from rag_deferred import DeferredFrame
+from rag_context import current_context
+
+log = logging.getLogger("rag.memo")
+
+ENABLED = os.getenv("RAG_MEMO", "1") != "0"
+SIZE    = int(os.getenv("RAG_MEMO_SIZE", "512"))
+MAX_MB  = float(os.getenv("RAG_MEMO_MAX_MB", "64"))
+
+_STATEFUL_ARGS = ("{last_scalar}",)              # 引用请求上下文状态的参数：结果不由 (输入, args) 决定
+
+# ---------- 血缘登记 ----------
+_LINEAGE: Dict[int, Tuple[weakref.ref, Hashable]] = {}
+_LIN_LOCK = threading.Lock()
+
+def _tag(df: pd.DataFrame, key: Hashable) -> None:
+    i = id(df)
+
+    def _drop(ref, i=i):
+        with _LIN_LOCK:
+            if _LINEAGE.get(i, (None,))[0] is ref:
+                del _LINEAGE[i]
+
+    with _LIN_LOCK:
+        _LINEAGE[i] = (weakref.ref(df, _drop), key)
+
+def untag(obj: Any) -> None:
+    """就地改过的帧：血缘作废（之后以它为输入的调用一律 bypass）"""
+    if isinstance(obj, pd.DataFrame):
+        with _LIN_LOCK:
+            _LINEAGE.pop(id(obj), None)
+
+def _source_key(path: str | None = None) -> Hashable:
+    from RAG_tool_functions import CSV_FILE
+    p = Path(path or current_context().csv_path or CSV_FILE)
+    return ("src", str(p.resolve()), describe(p).fingerprint)
+
+def canon(obj: Any) -> str:
+    return json.dumps(obj, sort_keys=True, ensure_ascii=False, default=str, separators=(",", ":"))
+
+def lineage(cur: Any) -> Hashable | None:
+    """cur 的血缘 key；来历不明返回 None"""
+    if cur is None:
+        return _source_key()
+    if isinstance(cur, DeferredFrame):
+        base = lineage(cur.base)
+        return None if base is None else ("plan", base, canon(cur.steps))
+    if isinstance(cur, pd.DataFrame):
+        with _LIN_LOCK:
+            hit = _LINEAGE.get(id(cur))
+        if hit is not None and hit[0]() is cur:
+            return hit[1]
+    return None
+
+# ---------- 结果缓存 ----------
+def _nbytes(val: Any) -> int:
+    if isinstance(val, pd.DataFrame):
+        return int(val.memory_usage(index=True).sum())
+    if isinstance(val, pd.Series):
+        return int(val.memory_usage(index=True))
+    return 0
+
+def _share(val: Any) -> Any:
+    return val.copy(deep=False) if isinstance(val, (pd.DataFrame, pd.Series)) else val
+
+class ToolMemo:
+    def __init__(self, size: int = SIZE, max_mb: float = MAX_MB) -> None:
+        self.size, self.max_bytes = size, int(max_mb * 2**20)
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts = dict(hits=0, misses=0, bypass=0, stores=0, evictions=0, oversize=0)
+
+    def _bump(self, k: str) -> None:
+        with self._lock:
+            self._counts[k] += 1
+
+    def call(self, name: str, cur: Any, args: Dict[str, Any], compute: Callable[[], Any]) -> Any:
+        a = canon(args or {})
+        base = lineage(cur) if ENABLED and not any(s in a for s in _STATEFUL_ARGS) else None
+        if base is None:
+            self._bump("bypass")
+            return compute()
+
+        key = (name, base, a)
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self._counts["hits"] += 1
+                return self._out(self._data[key], key)
+            self._counts["misses"] += 1
+
+        val = compute()
+        if _nbytes(val) > self.max_bytes:
+            self._bump("oversize")
+            return self._out(val, key)
+        with self._lock:
+            self._data[key] = _share(val)               # 存一份独立的浅拷贝：调用方拿到的对象怎么改都不影响
+            self._counts["stores"] += 1
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+                self._counts["evictions"] += 1
+        return self._out(val, key)
+
+    @staticmethod
+    def _out(val: Any, key: Hashable) -> Any:
+        out = _share(val)
+        if isinstance(out, pd.DataFrame):
+            _tag(out, key)                             # 下游工具以它为输入时也能命中
+        return out
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._counts, entries=len(self._data))
+        looked = out["hits"] + out["misses"]
+        out["hit_rate"] = round(out["hits"] / looked, 3) if looked else 0.0
+        return out
+
+MEMO = ToolMemo()
+
+def memoized(name: str, cur: Any, args: Dict[str, Any], compute: Callable[[], Any]) -> Any:
+    return MEMO.call(name, cur, args, compute)
+
+def clear() -> None:
+    MEMO.clear()
+
+def stats() -> Dict[str, Any]:
+    return MEMO.stats()
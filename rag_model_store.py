@@ -0,0 +1,176 @@
+# rag_model_store.py
+"""
+异常检测模型仓库：fit 一次，之后只打分
+------------------------------------------------------------------
+目录结构（默认 .cache/models，可用 RAG_MODEL_STORE 改）：
+    <schema_key>/
+        meta.json                 fitted_at / n_rows / columns
+        scaler.joblib             与这些模型配套的 StandardScaler
+        <ALGO>-<param_key>.joblib 拟合好的模型
+
+• schema_key = 特征列名 + dtype 的哈希：同一条产线的新一批数据会命中同一目录；
+• param_key  = ALGO_PARAMS[algo] 的哈希：改了超参数自动视为“不存在”而重训；
+• 读取是惰性的：只有真正要打分的算法才 joblib.load，并在进程内缓存（daemon 模式常驻）；
+  缓存按 (path, mtime) 记，同一路径只留最新 mtime 的那份，总量由 RAG_MODEL_CACHE_SIZE 限定（LRU）。
+
+重训策略见 RefitPolicy：模型过旧 / 行数漂移过大 / 强制。
+"""
+
+from __future__ import annotations
+import os, json, time, hashlib, logging, tempfile, threading, contextlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+log = logging.getLogger("rag.model_store")
+
+STORE_DIR = os.getenv("RAG_MODEL_STORE", os.path.join(".cache", "models"))
+_CACHE_SLOTS = int(os.getenv("RAG_MODEL_CACHE_SIZE", "32"))   # 进程内最多常驻几个已加载对象
+_THREAD_KEYS = {"nthreads", "n_jobs"}     # CPU 预算不是超参数，不进 key
+
+def _digest(obj) -> str:
+    return hashlib.blake2b(json.dumps(obj, sort_keys=True, default=str).encode(),
+                           digest_size=8).hexdigest()
+
+def schema_key(columns: Iterable[str], dtypes: Iterable[str]) -> str:
+    return _digest([[str(c), str(t)] for c, t in zip(columns, dtypes)])
+
+def _atomic_write(path: Path, write) -> None:
+    """
+    写到同目录下唯一命名的临时文件再 os.replace：并发请求同时重训同一个 schema 时
+    各写各的临时文件，读者只会看到完整的旧文件或新文件。
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
+
+def param_key(name: str) -> str:
+    from rag_algorithms import ALGO_PARAMS
+    params = {k: v for k, v in ALGO_PARAMS[name].items() if k not in _THREAD_KEYS}
+    return _digest([name, params])
+
+# ---------- 重训策略 ----------
+@dataclass(frozen=True)
+class RefitPolicy:
+    max_age_s:     float | None = 7 * 24 * 3600   # 超过这个年龄就重训；None = 不看年龄
+    max_row_drift: float | None = 0.5             # |n - n_fit| / n_fit 超过即重训；None = 不看行数
+    force:         bool = False                   # 无条件重训
+
+    @classmethod
+    def from_env(cls, force: bool = False) -> "RefitPolicy":
+        """
+        RAG_REFIT=force            → 强制重训
+        RAG_MODEL_MAX_AGE_H=168    → 年龄上限（小时，0 = 不限）
+        RAG_MODEL_MAX_DRIFT=0.5    → 行数漂移上限（0 = 不限）
+        """
+        age = float(os.getenv("RAG_MODEL_MAX_AGE_H", "168"))
+        drift = float(os.getenv("RAG_MODEL_MAX_DRIFT", "0.5"))
+        return cls(max_age_s=age * 3600 if age > 0 else None,
+                   max_row_drift=drift if drift > 0 else None,
+                   force=force or os.getenv("RAG_REFIT", "").lower() == "force")
+
+    def refit_reason(self, meta: dict | None, n_rows: int) -> str | None:
+        """返回需要重训的原因；None 表示可以直接复用"""
+        if self.force:
+            return "forced"
+        if not meta:
+            return "no stored models"
+        if self.max_age_s is not None and time.time() - meta["fitted_at"] > self.max_age_s:
+            return f"older than {self.max_age_s / 3600:.0f}h"
+        n_fit = max(int(meta.get("n_rows", 0)), 1)
+        if self.max_row_drift is not None and abs(n_rows - n_fit) / n_fit > self.max_row_drift:
+            return f"row count drift {n_fit} → {n_rows}"
+        return None
+
+# ---------- 仓库 ----------
+class ModelStore:
+    def __init__(self, root: str | os.PathLike = STORE_DIR) -> None:
+        self.root = Path(root)
+        self._cache: "OrderedDict[Tuple[str, float], object]" = OrderedDict()   # (path, mtime) → 对象
+        self._lock = threading.Lock()
+
+    # ---- 路径 ----
+    def _dir(self, schema: str) -> Path:
+        return self.root / schema
+
+    def _model_path(self, schema: str, name: str) -> Path:
+        return self._dir(schema) / f"{name}-{param_key(name)}.joblib"
+
+    # ---- 元数据 ----
+    def meta(self, schema: str) -> dict | None:
+        p = self._dir(schema) / "meta.json"
+        if not p.exists():
+            return None
+        try:
+            return json.loads(p.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def write_meta(self, schema: str, n_rows: int, columns: List[str]) -> None:
+        text = json.dumps({"fitted_at": time.time(), "n_rows": int(n_rows),
+                           "columns": list(columns)}, ensure_ascii=False)
+        _atomic_write(self._dir(schema) / "meta.json",
+                      lambda tmp: Path(tmp).write_text(text, encoding="utf-8"))
+
+    # ---- 惰性读取 ----
+    def _load(self, path: Path):
+        import joblib
+        if not path.exists():
+            return None
+        key = (str(path), path.stat().st_mtime)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        obj = joblib.load(path)
+        with self._lock:
+            for old in [k for k in self._cache if k[0] == key[0] and k != key]:
+                del self._cache[old]                  # 重训后旧 mtime 的对象不再有人用
+            self._cache[key] = obj
+            while len(self._cache) > _CACHE_SLOTS:
+                self._cache.popitem(last=False)
+        return obj
+
+    def _dump(self, obj, path: Path) -> None:
+        import joblib
+        _atomic_write(path, lambda tmp: joblib.dump(obj, tmp))   # 原子替换，并发请求不会读到半个文件
+
+    def has_model(self, schema: str, name: str) -> bool:
+        return self._model_path(schema, name).exists()
+
+    def load_model(self, schema: str, name: str):
+        return self._load(self._model_path(schema, name))
+
+    def save_model(self, schema: str, name: str, model) -> None:
+        self._dump(model, self._model_path(schema, name))
+
+    def load_scaler(self, schema: str):
+        return self._load(self._dir(schema) / "scaler.joblib")
+
+    def save_scaler(self, schema: str, scaler) -> None:
+        self._dump(scaler, self._dir(schema) / "scaler.joblib")
+
+    # ---- 决策 ----
+    def plan(self, schema: str, names: Iterable[str], n_rows: int,
+             policy: RefitPolicy) -> Tuple[Dict[str, str], str | None]:
+        """
+        返回 ({algo: "score" | "fit"}, 整体重训原因)
+          整体重训（scaler 也重拟合）时所有算法都是 "fit"；
+          否则只有缺模型（新算法 / 超参数变了）的算法需要 fit。
+        """
+        reason = policy.refit_reason(self.meta(schema), n_rows)
+        if reason is None and not (self._dir(schema) / "scaler.joblib").exists():
+            reason = "no stored scaler"
+        if reason is not None:
+            return {n: "fit" for n in names}, reason
+        return {n: "score" if self.has_model(schema, n) else "fit" for n in names}, None
+
+STORE = ModelStore()
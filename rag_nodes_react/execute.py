@@ -3,25 +3,25 @@
 from __future__ import annotations
 import textwrap, pandas as pd, logging
 from typing import Dict, Any
-from RAG_tools import TOOL_REGISTRY
+from RAG_tools import TOOL_REGISTRY, SIDE_EFFECT_FUNCS
+from rag_deferred import LAZY_EXEC, DEFERRABLE, StepError, defer, materialized
+from rag_context import context_for, use_context
+from .plan_cache import forget
 
 log = logging.getLogger("rag.execute")
 
 MAX_PREVIEW = 10                # DataFrame 打印行数
-SIDE_EFFECT_FUNCS = {
-    "add_derived_column",       # 直接修改文件或磁盘
-    "graph_export",
-    "plot_machine_avg_bar",
-}
 
 def execute_node(state: Dict[str, Any]) -> Dict[str, Any]:
     """
     依 action_queue 逐条执行工具。
-    • result 若为 DF/标量写入 execution_output
+    • result 若为 DF/标量写入 execution_output，并同步到本请求的 ExecutionContext
+    • 工具在 state["exec_ctx"] 绑定的上下文里运行：并发请求互不串状态
     • route = thought (还有后续) / finish (已结束)
     """
 
     cur = state.get("execution_output")
+    ctx = context_for(state)
 
     queue = state.get("action_queue", [])
     log.debug("ENTER execute_node | pending-queue=%s", queue)
@@ -41,23 +41,40 @@ def execute_node(state: Dict[str, Any]) -> Dict[str, Any]:
     log.debug("Run tool %s | args=%s | cur_type=%s",
               fname, args, type(cur).__name__)
 
+    # ---- 惰性模式：DF→DF 的中间步骤只记进逻辑计划，不执行、不渲染预览 ----
+    if LAZY_EXEC and fname in DEFERRABLE and queue:
+        state["execution_output"] = defer(cur, fname, args)
+        state["route"] = "execute"
+        log.debug("Deferred %s | plan=%r", fname, state["execution_output"])
+        return state
+
     try:
         logging.debug("Run tool %s | args=%s | cur_type=%s", fname, args, type(cur).__name__)
-        result = TOOL_REGISTRY[fname].func(cur, args)
+        # 标量 / 副作用 / 最后一步：连同挂起的步骤一次跑完；确定性工具命中记忆化时直接取结果
+        with use_context(ctx):
+            result = TOOL_REGISTRY[fname].call(cur, args)
         logging.debug("Tool ok | result_type=%s", type(result).__name__)
 
     except Exception as e:
-        state["observation"] = f"[Tool-Error] {fname} {args} -> {e}"
+        if isinstance(e, StepError):    # 惰性链里失败：报告真正出错的那一步
+            state["observation"] = f"[Tool-Error] {e.fname} {e.step_args} -> {e.err}"
+        else:
+            state["observation"] = f"[Tool-Error] {fname} {args} -> {e}"
         state["route"] = "error"
+        # 挂起的计划里有坏步骤：退回最后一个已物化的帧，重试不能接在坏计划后面
+        state["execution_output"] = ctx.current_df = materialized(cur)
+        forget(state)                   # 出错的计划不再从缓存复用
         log.exception("Tool raised exception:")
         return state
 
     # ---- 更新共享状态 -------------------------------------------------
     state["execution_output"] = result
     if isinstance(result, pd.DataFrame):
+        ctx.current_df = result
         preview = textwrap.dedent(result.head(MAX_PREVIEW).to_string(index=False))
         state["final_answer"] = f"[DataFrame] top-{MAX_PREVIEW} rows\n{preview}"
     else:
+        ctx.last_scalar = result        # 后续 add_derived_column 的 {last_scalar} 读这里
         state["final_answer"] = str(result)
 
     log.debug("Tool ok | result_type=%s | route_decision=%s",
@@ -0,0 +1,242 @@
+# rag_nodes_react/fastpath.py
+# 规则快速通道：挡在 plan_cache / thought 前面，把高置信度的简单问题直接翻译成 action_queue。
+#
+#   "average Processing_Time"                          → calculate_average
+#   "average Processing_Time by Machine_ID"            → group_by_aggregate(keep_all=False)
+#   "max Energy_Consumption for Grinding jobs"         → select_rows(Operation_Type == 'Grinding') → calculate_max
+#   "how many jobs where Processing_Time > 60"         → select_rows → count_rows
+#   "how many Failed jobs"                              → select_rows(Job_Status == 'Failed') → count_rows
+#   "top 5 jobs by Energy_Consumption"                 → top_n
+#
+# 做法：先把句子里的列名替换成 §i§、分类取值替换成 ¤j¤（取值来自已缓存的数据帧里 category 列的类别），
+# 再对模板化后的句子做整句匹配；任何一段没被语法吃掉、列类型不对、取值归属不唯一 → 放弃，交给 LLM。
+# 产出的计划同样过 Action 校验与计划优化器。RAG_FASTPATH=0 关闭。
+
+from __future__ import annotations
+import os, re, logging, threading
+from typing import Any, Dict, List, Tuple
+
+from rag_catalog import describe, fingerprint
+from .models import Action
+from .optimizer import optimize_plan
+
+log = logging.getLogger("rag.fastpath")
+
+ENABLED      = os.getenv("RAG_FASTPATH", "1") != "0"
+_MAX_VALUES  = 50                     # 类别数超过这个的列（如 Job_ID）不做取值识别
+
+# ---------- 词表 ----------
+_AGG = {                              # 口语 → (标量工具, group_by_aggregate 的 agg)
+    "average": ("calculate_average", "avg"), "avg": ("calculate_average", "avg"),
+    "mean": ("calculate_average", "avg"),
+    "median": ("calculate_median", "percentile"),
+    "sum": ("calculate_sum", "sum"), "total": ("calculate_sum", "sum"),
+    "minimum": ("calculate_min", "min"), "min": ("calculate_min", "min"),
+    "lowest": ("calculate_min", "min"), "smallest": ("calculate_min", "min"),
+    "maximum": ("calculate_max", "max"), "max": ("calculate_max", "max"),
+    "highest": ("calculate_max", "max"), "largest": ("calculate_max", "max"),
+    "standard deviation": ("calculate_std", "std"), "std": ("calculate_std", "std"),
+    "variance": ("calculate_variance", "variance"),
+}
+_OPS = [                              # 长的写法在前
+    ("greater than or equal to", ">="), ("less than or equal to", "<="),
+    ("is not", "!="), ("not equal to", "!="), ("equal to", "=="), ("equals", "=="),
+    ("at least", ">="), ("at most", "<="), ("greater than", ">"), ("more than", ">"),
+    ("less than", "<"), ("fewer than", "<"), ("above", ">"), ("over", ">"),
+    ("exceeds", ">"), ("below", "<"), ("under", "<"), ("is", "=="),
+    (">=", ">="), ("<=", "<="), ("!=", "!="), ("==", "=="), ("=", "=="), (">", ">"), ("<", "<"),
+]
+
+_ALT = lambda words: "|".join(re.escape(w) for w in sorted(words, key=len, reverse=True))
+_PREFIX = (r"(?:(?:what is|what's|what are|show me|show|give me|get|compute|calculate|find|"
+           r"list|tell me)\s+)?(?:the\s+)?")
+_NOUN   = r"(?:\s+(?:jobs?|rows?|records?|entries|operations?|tasks?))?"
+_COL    = r"§(\d+)§"
+_VAL    = r"¤(\d+)¤"
+_NUM    = r"[+-]?\d+(?:\.\d+)?"
+
+_AGG_RE   = re.compile(rf"^{_PREFIX}(?P<agg>{_ALT(_AGG)})\s+(?:of\s+)?(?:the\s+)?{_COL}(?P<rest>.*)$")
+_COUNT_RE = re.compile(rf"^{_PREFIX}(?:count(?:\s+of)?|number\s+of|how\s+many){_NOUN}(?P<rest>.*)$")
+_TOP_RE   = re.compile(rf"^{_PREFIX}(?P<dir>top|bottom|first|last)\s+(?P<n>\d+){_NOUN}(?P<rest>.*)$")
+
+_GROUP_CL = re.compile(rf"^\s+(?:grouped\s+by|by|per|for\s+each|for\s+every|across)\s+{_COL}")
+_ORDER_CL = re.compile(rf"^\s+(?:by|ordered\s+by|sorted\s+by|with\s+(?:the\s+)?(?P<w>highest|largest|most|"
+                       rf"lowest|smallest|least))\s+{_COL}")
+_VALUE_CL = re.compile(rf"^\s+(?:(?:for|of|on|in|that\s+are|which\s+are|are|were|is|with)\s+)?"
+                       rf"{_VAL}{_NOUN}")
+_COND_CL  = re.compile(rf"^\s+(?:where|with|when|whose|if|and|that\s+have|having)\s+(?:the\s+)?{_COL}\s*"
+                       rf"(?P<op>{_ALT(dict(_OPS))})\s*(?P<val>{_NUM}|{_VAL}|'[^']*'|\"[^\"]*\")")
+_TAIL     = re.compile(r"^\s+(?:are\s+there|were\s+there|in\s+total|overall)")
+
+# ---------- 列 / 取值模板化 ----------
+_VALUES: Dict[Tuple[str, str], Dict[str, List[Tuple[str, str]]]] = {}
+_LOCK = threading.Lock()
+
+def category_values(path: str) -> Dict[str, List[Tuple[str, str]]]:
+    """小写取值 → [(列, 原值)]；只看 category 列（load_data 已缓存，不额外解析）"""
+    key = (os.path.abspath(path), fingerprint(path))
+    with _LOCK:
+        if key in _VALUES:
+            return _VALUES[key]
+    import pandas as pd
+    from RAG_tool_functions import load_data
+    df = load_data(path)
+    out: Dict[str, List[Tuple[str, str]]] = {}
+    for c in df.columns:
+        if isinstance(df[c].dtype, pd.CategoricalDtype) and len(df[c].cat.categories) <= _MAX_VALUES:
+            for v in df[c].cat.categories:
+                out.setdefault(str(v).lower(), []).append((c, str(v)))
+    with _LOCK:
+        _VALUES.clear()                       # 只留当前数据版本
+        _VALUES[key] = out
+    return out
+
+def _template(text: str, columns, values) -> Tuple[str, List[str], List[Tuple[str, str]]] | None:
+    t = " " + re.sub(r"\s+", " ", text.strip().lower()).rstrip(" ?.!") + " "
+    cols: List[str] = []
+    for c in sorted(columns, key=len, reverse=True):
+        pat = re.compile(rf"(?<=[\s(])" + re.escape(c.lower()).replace("_", "[_ ]") + r"(?=[\s),?.!])")
+        if pat.search(t):
+            t = pat.sub(f"§{len(cols)}§", t)
+            cols.append(c)
+    vals: List[Tuple[str, str]] = []
+    for v in sorted(values, key=len, reverse=True):
+        pat = re.compile(rf"(?<=[\s('\"]){re.escape(v)}(?=[\s)'\",?.!])")
+        if pat.search(t):
+            if len(values[v]) != 1:            # 同一取值出现在多列：归属不唯一
+                return None
+            t = pat.sub(f"¤{len(vals)}¤", t)
+            vals.append(values[v][0])
+    t = re.sub(r"['\"](¤\d+¤)['\"]", r"\1", t)
+    return t.strip(), cols, vals
+
+# ---------- 语法 ----------
+class _Plan:
+    def __init__(self, cols, vals, info) -> None:
+        self.cols, self.vals, self.info = cols, vals, info
+        self.filters: List[Dict[str, Any]] = []
+        self.group: str | None = None
+        self.order: Tuple[str, str] | None = None
+        self.explicit_order = False          # 句中写了 highest / lowest 之类的方向词
+
+    def numeric(self, col: str) -> bool:
+        return re.match(r"(int|uint|float)", self.info.dtypes.get(col, "")) is not None
+
+    def value_filter(self, idx: str) -> None:
+        col, raw = self.vals[int(idx)]
+        self.filters.append({"column": col, "condition": f"== '{raw}'"})
+
+    def cond_filter(self, m: re.Match) -> bool:
+        col, op, val = self.cols[int(m.group(1))], dict(_OPS)[m.group("op")], m.group("val")
+        if re.fullmatch(_NUM, val):
+            if not self.numeric(col):
+                return False
+            self.filters.append({"column": col, "condition": f"{op} {val}"})
+            return True
+        if op not in ("==", "!=") or self.numeric(col):
+            return False
+        if val.startswith("¤"):
+            vcol, raw = self.vals[int(val.strip("¤"))]
+            if vcol != col:
+                return False
+        else:
+            raw = val[1:-1]
+        self.filters.append({"column": col, "condition": f"{op} '{raw}'"})
+        return True
+
+    def consume(self, rest: str, allow_group: bool, allow_order: bool) -> bool:
+        """把 rest 逐段吃完；有吃不掉的就返回 False"""
+        while rest.strip():
+            if allow_group and self.group is None and (m := _GROUP_CL.match(rest)):
+                self.group = self.cols[int(m.group(1))]
+            elif allow_order and self.order is None and (m := _ORDER_CL.match(rest)):
+                w = m.group("w") or ""
+                self.order = (self.cols[int(m.group(2))],
+                              "asc" if w in ("lowest", "smallest", "least") else "desc")
+                self.explicit_order = bool(w)
+            elif m := _COND_CL.match(rest):
+                if not self.cond_filter(m):
+                    return False
+            elif m := _VALUE_CL.match(rest):
+                self.value_filter(m.group(1))
+            elif m := _TAIL.match(rest):
+                pass
+            else:
+                return False
+            rest = rest[m.end():]
+        return True
+
+    def actions(self, *tail: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return [{"function": "select_rows", "args": f} for f in self.filters] + list(tail)
+
+def plan_query(text: str, info, values) -> List[Dict[str, Any]] | None:
+    """整句命中语法 → action 列表；否则 None"""
+    tpl = _template(text, info.columns, values)
+    if tpl is None:
+        return None
+    t, cols, vals = tpl
+    p = _Plan(cols, vals, info)
+
+    if m := _AGG_RE.match(t):
+        col = cols[int(m.group(2))]
+        tool, agg = _AGG[m.group("agg")]
+        if not p.numeric(col) or not p.consume(m.group("rest"), True, False):
+            return None
+        if p.group:
+            args = {"agg": agg, "group_column": p.group, "column": col, "keep_all": False}
+            if agg == "percentile":
+                args["q"] = 50
+            return p.actions({"function": "group_by_aggregate", "args": args})
+        return p.actions({"function": tool, "args": {"column": col}})
+
+    if m := _COUNT_RE.match(t):
+        if not p.consume(m.group("rest"), False, False):
+            return None
+        return p.actions({"function": "count_rows", "args": {}})
+
+    if m := _TOP_RE.match(t):
+        if not p.consume(m.group("rest"), False, True) or p.order is None:
+            return None
+        col, order = p.order
+        if not p.numeric(col):
+            return None
+        if m.group("dir") in ("bottom", "last"):
+            if p.explicit_order:               # "bottom 3 … with the highest X"：说法自相矛盾，交给 LLM
+                return None
+            order = "asc" if order == "desc" else "desc"
+        return p.actions({"function": "top_n",
+                          "args": {"column": col, "n": int(m.group("n")), "order": order}})
+    return None
+
+# ---------- 节点 ----------
+_STATS = {"hits": 0, "misses": 0}
+
+def fastpath_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    """命中 → action_queue + route=execute；否则 route=plan_cache"""
+    state["route"] = "plan_cache"
+    if not ENABLED:
+        return state
+    from RAG_tool_functions import CSV_FILE
+    path = state.get("csv_path") or CSV_FILE
+    try:
+        acts = plan_query(state["processed_input"], describe(path), category_values(path))
+    except Exception:                          # 快速通道出任何问题都不影响正常流程
+        log.warning("fastpath failed, falling back to LLM", exc_info=True)
+        acts = None
+    if not acts:
+        with _LOCK:
+            _STATS["misses"] += 1
+        return state
+    queue = [Action.model_validate(a).model_dump() for a in acts]
+    state["action_queue"], _ = optimize_plan(queue)
+    state.update(route="execute", fastpath=True)
+    with _LOCK:
+        _STATS["hits"] += 1
+    log.info("fastpath plan: %s", state["action_queue"])
+    return state
+
+def stats() -> Dict[str, Any]:
+    with _LOCK:
+        out = dict(_STATS)
+    looked = out["hits"] + out["misses"]
+    return dict(out, hit_rate=round(out["hits"] / looked, 3) if looked else 0.0)
@@ -0,0 +1,189 @@
+# rag_nodes_react/optimizer.py
+# 计划级优化器：validator 产出 action_queue 之后、execute 之前，对整条计划做等价改写。
+#
+#   ① 过滤下推   add_derived_column → select_rows      ⇒ 先过滤再派生（过滤条件不引用新列时）
+#   ② 过滤融合   select_rows → select_rows → …          ⇒ 一个 select_rows{"conditions":[…]}，只算一次 mask
+#   ③ 排序消除   sort_rows(X) → top_n(X)                 ⇒ 只留 top_n（内部走 nlargest / nsmallest）
+#   ④ 列裁剪     计划以标量工具结尾、每一步的参数键都在 _TOOL_ARGS 白名单里，且中间步骤全部惰性执行
+#                （裁剪后的窄帧只在同一次 collect 里被消费，不会落到 execution_output）
+#                                                         ⇒ 开头插一个非严格的 select_columns
+#
+# 只做与逐条执行结果一致的改写；RAG_OPTIMIZE=0 可关闭。
+
+from __future__ import annotations
+import os, re, copy, json, logging
+from typing import Any, Dict, List, Set, Tuple
+
+from rag_deferred import LAZY_EXEC, DEFERRABLE
+
+log = logging.getLogger("rag.optimizer")
+
+ENABLED = os.getenv("RAG_OPTIMIZE", "1") != "0"
+
+# 按行过滤、且只依赖显式列的工具
+FILTERS = {"select_rows", "filter_date_between_start_end"}
+# 返回标量的工具：结果与列宽无关，适合列裁剪
+SCALAR_TOOLS = {
+    "calculate_average", "calculate_median", "calculate_mode", "calculate_sum",
+    "calculate_min", "calculate_max", "calculate_std", "calculate_variance",
+    "calculate_percentile", "calculate_correlation", "count_rows",
+}
+# 所有列引用都写在 args 里的工具（没有隐式读 Job_Status / TIME_COLS 之类的列），及其认识的参数键。
+# 列裁剪只在每一步的键都落在这里时才做：LLM 自创的键、工具新增的键都可能装着列名，宁可不裁。
+_COLUMN_ONLY = {"column", "target_column"}
+_TOOL_ARGS: Dict[str, Set[str]] = {
+    "select_rows":                   _COLUMN_ONLY | {"condition", "conditions", "sort_column", "n", "order"},
+    "filter_date_between_start_end": _COLUMN_ONLY | {"start", "end", "inclusive"},
+    "sort_rows":                     _COLUMN_ONLY | {"sort_column", "order"},
+    "top_n":                         _COLUMN_ONLY | {"sort_column", "n", "order"},
+    "add_derived_column":            {"name", "formula", "colA", "colB", "unit"},
+    "calculate_average":             _COLUMN_ONLY | {"unit"},
+    "calculate_median":              _COLUMN_ONLY,
+    "calculate_mode":                _COLUMN_ONLY,
+    "calculate_sum":                 _COLUMN_ONLY,
+    "calculate_min":                 _COLUMN_ONLY,
+    "calculate_max":                 _COLUMN_ONLY,
+    "calculate_std":                 _COLUMN_ONLY,
+    "calculate_variance":            _COLUMN_ONLY,
+    "calculate_percentile":          _COLUMN_ONLY | {"percentile", "q", "group_by", "group_column"},
+    "calculate_correlation":         _COLUMN_ONLY | {"x", "y", "column1", "column2", "other_column"},
+    "count_rows":                    set(),
+}
+_COND_ARGS = _COLUMN_ONLY | {"condition"}            # conditions 列表里每一项的键
+EXPLICIT_TOOLS = set(_TOOL_ARGS)
+
+_COL_KEYS  = ("column", "target_column", "sort_column", "group_column", "group_by", "other_column",
+              "x", "y", "column1", "column2", "colA", "colB")
+_LIST_KEYS = ("columns", "pair")
+_TEXT_KEYS = ("condition", "formula")
+_IDENT     = re.compile(r"[A-Za-z_]\w*")
+_QUOTED    = re.compile(r"'[^']*'|\"[^\"]*\"")
+_WORDS     = {"AND", "OR", "and", "or", "hour", "hours", "minute", "minutes",
+              "second", "seconds", "top_n", "last_scalar"}
+
+Action = Dict[str, Any]
+
+# ---------- 列引用分析 ----------
+def _refs(args: Dict[str, Any]) -> Set[str]:
+    """args 里可能引用到的列名（宁多勿少：多了只是少裁几列）"""
+    out: Set[str] = set()
+    for k in _COL_KEYS:
+        v = args.get(k)
+        if isinstance(v, str):
+            out |= set(_IDENT.findall(v)) if not v.isidentifier() else {v}
+    for k in _LIST_KEYS:
+        v = args.get(k)
+        if isinstance(v, str):
+            v = v.split(",")
+        if isinstance(v, (list, tuple)):
+            out |= {str(c).strip() for c in v}
+    for k in _TEXT_KEYS:
+        v = args.get(k)
+        if isinstance(v, str):
+            out |= set(_IDENT.findall(_QUOTED.sub(" ", v))) - _WORDS
+    for sub in args.get("conditions", []):
+        out |= _refs(sub)
+    return out
+
+def _new_column(act: Action) -> str | None:
+    return act["args"].get("name") if act["function"] == "add_derived_column" else None
+
+def _is_plain_filter(act: Action) -> bool:
+    return act["function"] in FILTERS and act["args"].get("condition") != "top_n"
+
+def _sort_col(args: Dict[str, Any]) -> str | None:
+    for k in ("column", "target_column", "sort_column"):
+        if isinstance(args.get(k), str):
+            return args[k]
+    return None
+
+# ---------- 改写规则 ----------
+def _push_filters(plan: List[Action], notes: List[str]) -> bool:
+    for i in range(len(plan) - 1):
+        a, b = plan[i], plan[i + 1]
+        new = _new_column(a)
+        if new and _is_plain_filter(b) and new not in _refs(b["args"]):
+            plan[i], plan[i + 1] = b, a
+            notes.append(f"push {b['function']} before add_derived_column({new})")
+            return True
+    return False
+
+def _as_condition(act: Action) -> List[Dict[str, Any]]:
+    args = act["args"]
+    if "conditions" in args:
+        return list(args["conditions"])
+    return [{k: v for k, v in args.items() if k in ("column", "target_column", "condition")}]
+
+def _fuse_filters(plan: List[Action], notes: List[str]) -> bool:
+    for i in range(len(plan) - 1):
+        a, b = plan[i], plan[i + 1]
+        if a["function"] == b["function"] == "select_rows" \
+                and _is_plain_filter(a) and _is_plain_filter(b):
+            fused = {"function": "select_rows",
+                     "args": {"conditions": _as_condition(a) + _as_condition(b)}}
+            plan[i:i + 2] = [fused]
+            notes.append(f"fuse select_rows ×{len(fused['args']['conditions'])}")
+            return True
+    return False
+
+def _drop_sort_before_top(plan: List[Action], notes: List[str]) -> bool:
+    for i in range(len(plan) - 1):
+        a, b = plan[i], plan[i + 1]
+        top_n_like = b["function"] == "top_n" or (
+            b["function"] == "select_rows" and b["args"].get("condition") == "top_n")
+        if a["function"] == "sort_rows" and top_n_like:
+            col = _sort_col(a["args"])
+            if col is not None and col == (b["args"].get("sort_column") or _sort_col(b["args"])):
+                del plan[i]
+                notes.append(f"drop sort_rows({col}) before top_n")
+                return True
+    return False
+
+def _known_args(act: Action) -> bool:
+    """这一步的参数键全在白名单里（列引用都能被 _refs 找到）"""
+    allowed = _TOOL_ARGS.get(act["function"])
+    args = act.get("args") or {}
+    if allowed is None or not set(args) <= allowed:
+        return False
+    conds = args.get("conditions", [])
+    return isinstance(conds, list) and all(isinstance(c, dict) and set(c) <= _COND_ARGS for c in conds)
+
+def _project_early(plan: List[Action], notes: List[str]) -> None:
+    if len(plan) < 2 or plan[-1]["function"] not in SCALAR_TOOLS:
+        return
+    if not all(_known_args(a) for a in plan):
+        return
+    # 逐步执行时窄帧会成为 execution_output，后续 / 重试的步骤就缺列了
+    if not LAZY_EXEC or not all(a["function"] in DEFERRABLE for a in plan[:-1]):
+        return
+    needed: List[str] = []
+    for a in plan:
+        for c in sorted(_refs(a["args"])):
+            if c not in needed:
+                needed.append(c)
+    if not needed:
+        return
+    plan.insert(0, {"function": "select_columns",
+                    "args": {"columns": needed, "strict": False}})
+    notes.append(f"project to {len(needed)} columns")
+
+# ---------- 入口 ----------
+def optimize_plan(queue: List[Action]) -> Tuple[List[Action], List[str]]:
+    """返回 (改写后的计划, 生效的规则说明)；原 queue 不被修改"""
+    if not ENABLED or len(queue) < 2:
+        return queue, []
+    plan = copy.deepcopy(queue)
+    notes: List[str] = []
+    for _ in range(4 * len(plan)):              # 规则都只会缩短 / 交换计划，迭代有界
+        if not (_push_filters(plan, notes) or _fuse_filters(plan, notes)
+                or _drop_sort_before_top(plan, notes)):
+            break
+    _project_early(plan, notes)
+    if notes:
+        log.info("plan rewritten (%s):\n  before: %s\n  after:  %s",
+                 "; ".join(notes), _fmt(queue), _fmt(plan))
+    return plan, notes
+
+def _fmt(plan: List[Action]) -> str:
+    return " → ".join(f"{a['function']}({json.dumps(a.get('args', {}), ensure_ascii=False, default=str)})"
+                      for a in plan)
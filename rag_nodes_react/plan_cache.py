@@ -0,0 +1,212 @@
+# rag_nodes_react/plan_cache.py
+# 计划缓存：挡在 thought 前面。同一 schema 上问过的问题直接复用 validator 校验过的 action_queue。
+#
+#   key     = (schema_key(列名), 归一化后的 processed_input)
+#   精确命中 → 跳过 LLM 与 validator，直接 execute
+#   近似命中 → MiniLM 句向量余弦 ≥ RAG_PLAN_CACHE_SIM，且两句里的“字面量”完全一致，才复用：
+#              数字、引号内容、带大写 / 下划线 / 数字的词（列名、机器号 …）、比较符号、
+#              数据里的分类取值（不分大小写）、方向 / 比较 / 聚合词（above / lowest / median …）
+#              （"top 5" 与 "top 10"、"grinding" 与 "milling"、"above" 与 "below" 语义很近但计划不同）
+#   淘汰    = TTL（RAG_PLAN_CACHE_TTL 秒）+ LRU（RAG_PLAN_CACHE_SIZE 条）
+#   失效    = execute 报错时删掉本次用到的条目
+# RAG_PLAN_CACHE=0 关闭；stats() 给出命中率等计数。
+
+from __future__ import annotations
+import os, re, copy, time, logging, threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, Iterable, List, Tuple
+
+from rag_catalog import columns as catalog_columns, schema_key
+
+log = logging.getLogger("rag.plan_cache")
+
+ENABLED = os.getenv("RAG_PLAN_CACHE", "1") != "0"
+TTL     = float(os.getenv("RAG_PLAN_CACHE_TTL", str(8 * 3600)))    # 默认一个班次
+SIZE    = int(os.getenv("RAG_PLAN_CACHE_SIZE", "256"))
+SIM     = float(os.getenv("RAG_PLAN_CACHE_SIM", "0.92"))
+
+_SPACE   = re.compile(r"\s+")
+_TRAIL   = re.compile(r"[\s?.!。？！]+$")
+_LITERAL = re.compile(r"'[^']*'|\"[^\"]*\"|\d+(?:\.\d+)?|\b\w*[A-Z_\d]\w*\b")
+_CAPWORD = re.compile(r"^[A-Z][a-z]+$")
+_SYMBOL  = re.compile(r"[<>!=]=?")
+_WORD    = re.compile(r"[a-z]+")
+# 换一个就换计划的词：比较方向、排序方向、聚合方式、否定
+_PLAN_WORDS = frozenset("""
+    above below over under exceed exceeds exceeding more less fewer greater higher lower least most
+    highest lowest largest smallest biggest longest shortest earliest latest top bottom first last
+    ascending descending asc desc increasing decreasing before after between
+    not no without except excluding non
+    average avg mean median mode sum total count number min minimum max maximum std deviation
+    variance percentile rate ratio
+""".split())
+
+Key = Tuple[str, str]
+
+def normalize(text: str) -> str:
+    return _TRAIL.sub("", _SPACE.sub(" ", text.strip().lower()))
+
+def literals(text: str, values: Iterable[str] = ()) -> FrozenSet[str]:
+    """
+    决定计划内容的字面量；近似命中要求两句完全一致（句首的普通大写词不算）。
+    values：数据里的分类取值（小写），句中出现的也算字面量。
+    """
+    text = text.strip()
+    low  = text.lower()
+    out  = {m.group(0).lower() for m in _LITERAL.finditer(text)
+            if not (m.start() == 0 and _CAPWORD.match(m.group(0)))
+            and m.group(0).lower() not in {"i", "a"}}
+    out.update(w for w in _WORD.findall(low) if w in _PLAN_WORDS)
+    out.update(_SYMBOL.findall(text))
+    out.update(v for v in values if re.search(rf"(?<!\w){re.escape(v)}(?!\w)", low))
+    return frozenset(out)
+
+@dataclass
+class _Entry:
+    plan:    List[Dict[str, Any]]
+    sig:     FrozenSet[str]
+    vec:     Any                          # 归一化句向量（numpy）；编码器不可用时为 None
+    created: float = field(default_factory=time.monotonic)
+    hits:    int = 0
+
+class PlanCache:
+    def __init__(self, size: int = SIZE, ttl: float = TTL, sim: float = SIM) -> None:
+        self.size, self.ttl, self.sim = size, ttl, sim
+        self._data: "OrderedDict[Key, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._encoder_ok = True
+        self._counts = dict(lookups=0, exact=0, near=0, misses=0, stores=0,
+                            evictions=0, expired=0, invalidations=0)
+
+    # ---------- 句向量（复用预处理的 MiniLM） ----------
+    def _embed(self, text: str):
+        if not self._encoder_ok:
+            return None
+        try:
+            from RAG_node_0_preprocessing import get_encoder
+            return get_encoder().encode([text], normalize_embeddings=True)[0]
+        except Exception:                  # 没装 sentence-transformers：只做精确命中
+            log.warning("plan cache: encoder unavailable, near-duplicate matching disabled",
+                        exc_info=True)
+            self._encoder_ok = False
+            return None
+
+    def _expired(self, e: _Entry, now: float) -> bool:
+        return self.ttl > 0 and now - e.created > self.ttl
+
+    # ---------- 查 ----------
+    def lookup(self, schema: str, text: str, values: Iterable[str] = ()
+               ) -> Tuple[str, Key, Key | None, List[Dict[str, Any]] | None]:
+        """返回 (exact|near|miss, 本次请求的 key, 命中条目的 key, 计划副本)；values 见 literals()"""
+        key, now = (schema, normalize(text)), time.monotonic()
+        with self._lock:
+            self._counts["lookups"] += 1
+            e = self._data.get(key)
+            if e is not None and self._expired(e, now):
+                del self._data[key]
+                self._counts["expired"] += 1
+                e = None
+            if e is not None:
+                self._data.move_to_end(key)
+                e.hits += 1
+                self._counts["exact"] += 1
+                return "exact", key, key, copy.deepcopy(e.plan)
+            sig = literals(text, values)
+            cands = [(k, c) for k, c in self._data.items()
+                     if k[0] == schema and c.sig == sig and c.vec is not None
+                     and not self._expired(c, now)]
+        if cands:
+            vec = self._embed(key[1])
+            if vec is not None:
+                k, c = max(cands, key=lambda kc: float(kc[1].vec @ vec))
+                score = float(c.vec @ vec)
+                if score >= self.sim:
+                    with self._lock:
+                        if k in self._data:
+                            self._data.move_to_end(k)
+                            c.hits += 1
+                            self._counts["near"] += 1
+                            log.info("plan cache near hit (%.3f): %r ≈ %r", score, key[1], k[1])
+                            return "near", key, k, copy.deepcopy(c.plan)
+        with self._lock:
+            self._counts["misses"] += 1
+        return "miss", key, None, None
+
+    # ---------- 存 / 删 ----------
+    def store(self, key: Key, text: str, plan: List[Dict[str, Any]], values: Iterable[str] = ()) -> None:
+        entry = _Entry(copy.deepcopy(plan), literals(text, values), self._embed(key[1]))
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            self._counts["stores"] += 1
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+                self._counts["evictions"] += 1
+
+    def invalidate(self, key: Key) -> None:
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self._counts["invalidations"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._counts, entries=len(self._data))
+        hits = out["exact"] + out["near"]
+        out["hit_rate"] = round(hits / out["lookups"], 3) if out["lookups"] else 0.0
+        return out
+
+CACHE = PlanCache()
+
+def _path(state: Dict[str, Any]) -> str:
+    from RAG_tool_functions import CSV_FILE
+    return state.get("csv_path") or CSV_FILE
+
+def _schema(state: Dict[str, Any]) -> str:
+    return schema_key(catalog_columns(_path(state)))
+
+def _values(state: Dict[str, Any]) -> Iterable[str]:
+    """数据里的分类取值（小写，与快速通道共用一份缓存）；取不到时只靠其余字面量"""
+    from .fastpath import category_values
+    try:
+        return category_values(_path(state)).keys()
+    except Exception:
+        log.warning("plan cache: category values unavailable", exc_info=True)
+        return ()
+
+# ---------- 节点 / 钩子 ----------
+def plan_cache_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    """命中 → route=execute（带好 action_queue）；未命中 → route=thought"""
+    for k in ("plan_cache_key", "plan_cache_src"):
+        state.pop(k, None)
+    if not ENABLED:
+        state["route"] = "thought"
+        return state
+    text = state["processed_input"]
+    kind, key, src, plan = CACHE.lookup(_schema(state), text, _values(state))
+    state.update(plan_cache=kind, plan_cache_key=key, plan_cache_src=src)
+    if plan:
+        state.update(action_queue=plan, route="execute")
+        log.info("plan cache %s hit → %d step(s)", kind, len(plan))
+    else:
+        state["route"] = "thought"
+    return state
+
+def remember(state: Dict[str, Any], plan: List[Dict[str, Any]]) -> None:
+    """validator 校验通过后调用：把这次的计划记到当前请求的 key 下"""
+    key = state.get("plan_cache_key")
+    if ENABLED and key and plan:
+        CACHE.store(tuple(key), state.get("processed_input", key[1]), plan, _values(state))
+
+def forget(state: Dict[str, Any]) -> None:
+    """execute 出错时调用：计划不可靠，删掉（近似命中时删的是被复用的那条）"""
+    for k in ("plan_cache_src", "plan_cache_key"):
+        if state.get(k):
+            CACHE.invalidate(tuple(state[k]))
+
+def stats() -> Dict[str, Any]:
+    return CACHE.stats()
@@ -6,7 +6,8 @@ from __future__ import annotations
 from typing import Dict, Any
 from string import Template
 from RAG_tools import TOOL_REGISTRY
-from openai import OpenAI
+from rag_catalog import describe
+from .tool_retrieval import TOP_K, select_tools, select_columns, count_tokens
 import os, pandas as pd, logging
 import os, dotenv; dotenv.load_dotenv()
 
@@ -14,16 +15,24 @@ log = logging.getLogger("rag.thought")
 
 # ---------- 环境 ----------
 dotenv.load_dotenv()
-client = OpenAI(
-    base_url="https://integrate.api.nvidia.com/v1",
-    api_key=os.getenv("NGC_API_KEY"),
+
+# LLM 调用统一走 rag_llm 的共享网关（连接池 + 并发上限 + 超时重试）
+from rag_llm import get_gateway
+
+_LLM_PARAMS = dict(
+    temperature=0.0,
+    max_tokens=1024,
+    response_format={"type": "json_object"},   # ←★ 保证纯 JSON :contentReference[oaicite:3]{index=3}
+    stop=["```"],                              # ←★ 防止 markdown 包裹 :contentReference[oaicite:4]{index=4}
 )
 
 # ---------- 列名 & 工具规范 ----------
 # 读取数据文件的列名，供工具函数使用
 # 在 预处理 阶段如检测到用户显式提供了 some_file.csv，load_data() 会用该文件；否则回落默认 data/hybrid_manufacturing_categorical.csv。
 # OLS 只用于给 LLM 提供「列名全集」，生产环境可在读取预处理结果后 重新 计算列名并写回 prompt；为演示简化成固定文件，无功能冲突。
-COLS = ", ".join(pd.read_csv("data/hybrid_manufacturing_categorical.csv", nrows=0).columns)
+# 导入时不再读文件：拼 prompt 时才查数据集目录（按 mtime/size 缓存）；优先用预处理找到的 csv_path
+def _dataset(state: Dict[str, Any]):
+    return describe(state.get("csv_path") or "data/hybrid_manufacturing_categorical.csv")
 
 # # TOOL_REGISTRY 是 RAG_tools.py 中的全局变量，包含所有工具函数的注册表。
 # # args 是传给工具函数的参数 dict
@@ -39,19 +48,63 @@ COLS = ", ".join(pd.read_csv("data/hybrid_manufacturing_categorical.csv", nrows=
 # TOOL_SPEC = "\n".join(
 #     f"### {name}\n{tool.description}" for name, tool in TOOL_REGISTRY.items()
 # )
-TOOL_SPEC = "\n".join(
-    f"### {name}\n{tool.description}\nRequired keys: {', '.join(tool.signature)}"
-    for name, tool in TOOL_REGISTRY.items()
-)
+def _spec(name: str) -> str:
+    # 不再附 "Required keys"：tool.signature 取到的是 DataFrameTool 这个 pydantic 模型的字段
+    # （name / description / callbacks …），不是工具参数，每个工具白占一行 token
+    return f"### {name}\n{TOOL_REGISTRY[name].description}"
+
+TOOL_SPEC = "\n".join(_spec(name) for name in TOOL_REGISTRY)    # 完整工具表（检索关闭 / 回落时用）
+
+# ---------- 按入选工具附带的提示 ----------
+# (触发工具, 提示)：只有相关工具进了 prompt，对应的提示才一起进
+_HINTS = [
+    ({"add_derived_column", "calculate_delay_avg", "calculate_delay_avg_grouped"},
+     "– If the user asks for delay / duration between two time columns, first call add_derived_column OR directly call calculate_delay_avg / calculate_delay_avg_grouped instead of naïvely putting \"colA - colB\" into other tools."),
+    ({"calculate_peak_concurrency", "calculate_concurrency_series", "plot_concurrent_tasks_line"},
+     "– For “how many jobs run at the same time” / peak concurrency questions, call calculate_peak_concurrency (group_column=\"Machine_ID\" for per-machine) or calculate_concurrency_series; use plot_concurrent_tasks_line only when a chart is requested."),
+    ({"group_by_aggregate", "group_top_n"},
+     "– After aggregation (group_by_aggregate / group_top_n) do not re-aggregate the already-aggregated table unless the user explicitly asks so."),
+    ({"calculate_delay_avg", "calculate_delay_avg_grouped", "rolling_average"},
+     "– If you still need to filter rows afterwards, DO NOT call *_avg tools; use add_derived_column or select_columns instead."),
+]
+
+def _hints(tools) -> str:
+    lines = [h for trig, h in _HINTS if trig & set(tools)]
+    return "Decision hints:\n" + "\n".join(lines) if lines else ""
+
+# group_by_aggregate 的参数格式说明 + 示例：只在它入选时附带
+_AGG_RULE = """  
+Additional formatting rule
+--------------------------
+
+• When you need to aggregate an *existing* column, ALWAYS use
+  {
+      "function": "group_by_aggregate",
+      "args": {
+          "agg"         : "<avg|sum|min|max|…>",
+          "group_column": "<group key>",
+          "column"      : "<target column>"
+      }
+  }
+  DO NOT wrap the column inside "derived".
+
+Example
+~~~~~~~
+User     : "Average Energy_Consumption by Operation_Type"
+Assistant: {
+             "actions":[
+               {"function":"group_by_aggregate",
+                "args":{"agg":"avg","group_column":"Operation_Type",
+                        "column":"Energy_Consumption"}}
+             ]
+           }
+"""
 
 _PROMPT_T = Template("""
 You are an assistant that MUST translate a user's natural‑language request into a raw JSON command describing a sequence of data‑processing steps.
 If the question restricts rows (e.g. “for Grinding jobs”), ALWAYS start with a select_rows action that applies that filter.
 
-Decision hints:
-– If the user asks for delay / duration between two time columns, first call add_derived_column OR directly call calculate_delay_avg / calculate_delay_avg_grouped instead of naïvely putting "colA - colB" into other tools.
-– After aggregation (group_by_aggregate / group_top_n) do not re-aggregate the already-aggregated table unless the user explicitly asks so.
-– If you still need to filter rows afterwards, DO NOT call *_avg tools; use add_derived_column or select_columns instead.
+$hints
 
 
 $tool_spec
@@ -92,55 +145,56 @@ User: ${user}
 Return either  
   • exactly ONE such object, **not wrapped in an "actions" list**  
   • or {"finish":"<answer>"} if you are done.
-  
-Additional formatting rule
---------------------------
-• When you need to aggregate an *existing* column, ALWAYS use
-  {
-      "function": "group_by_aggregate",
-      "args": {
-          "agg"         : "<avg|sum|min|max|…>",
-          "group_column": "<group key>",
-          "column"      : "<target column>"
-      }
-  }
-  DO NOT wrap the column inside "derived".
-
-Example
-~~~~~~~
-User     : "Average Energy_Consumption by Operation_Type"
-Assistant: {
-             "actions":[
-               {"function":"group_by_aggregate",
-                "args":{"agg":"avg","group_column":"Operation_Type",
-                        "column":"Energy_Consumption"}}
-             ]
-           }
+$agg_rule
 """.lstrip())
 # scratchpad: 是一个字符串，包含之前的 LLM 回复（观察），用于上下文。
 
 # ---------- node ----------
-def thought_node(state: Dict[str, Any]) -> Dict[str, Any]:
-    prompt = _PROMPT_T.substitute(
-        tool_spec  = TOOL_SPEC,
-        cols       = COLS,
+def _render(tools, cols, state: Dict[str, Any]) -> str:
+    return _PROMPT_T.substitute(
+        hints      = _hints(tools),
+        tool_spec  = "\n".join(_spec(n) for n in tools),
+        cols       = ", ".join(cols),
         scratchpad = state.get("scratchpad", ""),
         user       = state["processed_input"],
+        agg_rule   = _AGG_RULE if "group_by_aggregate" in tools else "",
     )
 
+_FULL_TOKENS: Dict[tuple, int] = {}     # (数据文件, 指纹) → 完整工具表 prompt 去掉问题 / scratchpad 后的 token 数
+
+def _full_tokens(info, state: Dict[str, Any]) -> int:
+    """不检索时的 prompt 大小（仅用于日志）：固定部分每个数据版本只渲染、计数一次"""
+    key = (info.path, info.fingerprint)
+    if key not in _FULL_TOKENS:
+        _FULL_TOKENS[key] = count_tokens(_render(list(TOOL_REGISTRY), info.columns, {"processed_input": ""}))
+    return _FULL_TOKENS[key] + count_tokens(f"{state.get('scratchpad', '')}\n{state['processed_input']}")
+
+def _messages(state: Dict[str, Any]):
+    """只放与问题相关的 top-k 工具与列；前后 token 数记日志，便于量化首 token 延迟的收益"""
+    info  = _dataset(state)
+    text  = f"{state['processed_input']}\n{state.get('scratchpad', '')}"
+    tools = select_tools(text, info.columns, TOP_K)
+    cols  = select_columns(text + "\n" + "\n".join(TOOL_REGISTRY[n].description for n in tools),
+                           info.columns, info.dtypes, info.date_cols)
+    prompt = _render(tools, cols, state)
+
+    full = _full_tokens(info, state)
+    sent = count_tokens(prompt)
+    state["prompt_tokens"] = {"full": full, "sent": sent}
+    log.info("prompt tokens %d → %d (-%.0f%%) | tools %d/%d | cols %d/%d",
+             full, sent, 100 * (1 - sent / full) if full else 0,
+             len(tools), len(TOOL_REGISTRY), len(cols), len(info.columns))
     log.debug("LLM prompt (first 400 chars):\n%s", prompt[:400])
+    return [{"role": "user", "content": prompt}]
 
-    resp = client.chat.completions.create(
-        model="meta/llama-3.1-8b-instruct",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.0,
-        max_tokens=1024,
-        response_format={"type": "json_object"},   # ←★ 保证纯 JSON :contentReference[oaicite:3]{index=3}
-        stop=["```"],                              # ←★ 防止 markdown 包裹 :contentReference[oaicite:4]{index=4}
-    )
-
-    state["llm_output"] = resp.choices[0].message.content.strip()
+def _store(state: Dict[str, Any], content: str) -> Dict[str, Any]:
+    state["llm_output"] = content.strip()
     log.debug("LLM raw output: %s", state["llm_output"])
     return state
 
+def thought_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    return _store(state, get_gateway().chat(_messages(state), **_LLM_PARAMS))
 
+async def athought_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    """异步版本：graph.ainvoke 时不占线程，常驻服务可以同时挂起多个 LLM 请求"""
+    return _store(state, await get_gateway().achat(_messages(state), **_LLM_PARAMS))
@@ -0,0 +1,152 @@
+# rag_nodes_react/tool_retrieval.py
+# 工具检索：每次只把与问题相关的 top-k 工具、相关列放进 thought 的 prompt。
+#
+#   索引（进程内只建一次）：每个工具 = 名字拆词 + 英文意图关键词 + docstring
+#   打分：关键词 idf 加权命中；装了 sentence-transformers 时再加 MiniLM 余弦（复用预处理的编码器）
+#   固定保留 PINNED（prompt 规则与示例里直接点名的工具）+ 问题 / scratchpad 里直接写出的工具名
+#   命中太少（< MIN_TOOLS）→ 回落完整工具表，宁可多花 token 也不让 LLM 缺工具
+#
+#   列：问题 / scratchpad / 入选工具说明里出现的列 ∪ 非数值非时间列
+#      （“for Grinding jobs” 这类按取值过滤时，LLM 需要看到 Operation_Type 之类的分类列）
+#
+# RAG_TOOL_TOPK=0 关闭检索（始终完整工具表 + 全部列）。
+
+from __future__ import annotations
+import os, re, math, logging, threading
+from collections import Counter
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from RAG_tools import TOOL_REGISTRY
+
+log = logging.getLogger("rag.tool_retrieval")
+
+TOP_K     = int(os.getenv("RAG_TOOL_TOPK", "8"))
+MIN_TOOLS = 4
+PINNED    = ("select_rows", "sort_rows")
+
+# 很多 docstring 是中文或只有一句 "Data processing tool"：补一份英文意图词，检索主要靠它
+_KEYWORDS: Dict[str, str] = {
+    "calculate_average":             "average mean avg",
+    "calculate_median":              "median middle",
+    "calculate_mode":                "mode most frequent common",
+    "calculate_sum":                 "sum total",
+    "calculate_min":                 "min minimum lowest smallest least",
+    "calculate_max":                 "max maximum highest largest most",
+    "calculate_std":                 "std standard deviation spread",
+    "calculate_variance":            "variance spread",
+    "calculate_percentile":          "percentile quantile p90 p95 p99",
+    "calculate_correlation":         "correlation correlate relationship related",
+    "calculate_covariance":          "covariance",
+    "calculate_failure_rate":        "failure failed fail rate ratio",
+    "calculate_delay_avg":           "delay late lateness duration between average",
+    "calculate_delay_avg_grouped":   "delay late lateness duration per by each group",
+    "calculate_peak_concurrency":    "peak concurrency concurrent simultaneous parallel same time",
+    "calculate_concurrency_series":  "concurrency concurrent simultaneous over time series",
+    "count_rows":                    "count how many number rows jobs",
+    "filter_date_between_start_end": "between date time window range period since until",
+    "group_by_aggregate":            "by per each group grouped aggregate breakdown",
+    "group_top_n":                   "top each per group best worst",
+    "top_n":                         "top highest lowest largest smallest first best worst",
+    "sort_rows":                     "sort order rank ascending descending",
+    "select_columns":                "columns show only keep",
+    "rolling_average":               "rolling moving average window trend smooth",
+    "add_derived_column":            "derived compute new column ratio difference formula",
+    "graph_export":                  "graph network export gexf graphml bipartite",
+    "plot_machine_avg_bar":          "plot chart bar visualize visualise machine",
+    "plot_concurrent_tasks_line":    "plot chart line visualize visualise concurrency",
+    "select_rows":                   "filter where only rows with whose",
+}
+
+_WORD = re.compile(r"[a-z][a-z0-9]*")
+
+def _words(text: str) -> List[str]:
+    return [w[:-1] if len(w) > 3 and w.endswith("s") else w
+            for w in _WORD.findall(text.lower().replace("_", " "))]
+
+class ToolIndex:
+    def __init__(self, names: Sequence[str], docs: Dict[str, str]) -> None:
+        self.names = list(names)
+        self.texts = {n: f"{n.replace('_', ' ')} {_KEYWORDS.get(n, '')} {docs.get(n, '')}"
+                      for n in self.names}
+        self.bags  = {n: set(_words(f"{n} {_KEYWORDS.get(n, '')}")) for n in self.names}
+        df = Counter(w for bag in self.bags.values() for w in bag)
+        self.idf = {w: math.log(1 + len(self.names) / c) for w, c in df.items()}
+        self._vecs = None
+        self._vec_tried = False
+
+    # ---------- 语义分（可选） ----------
+    def _semantic(self, query: str) -> Dict[str, float]:
+        if not self._vec_tried:
+            self._vec_tried = True
+            try:
+                from RAG_node_0_preprocessing import get_encoder
+                self._vecs = get_encoder().encode([self.texts[n] for n in self.names],
+                                                  normalize_embeddings=True)
+            except Exception:
+                log.info("tool retrieval: encoder unavailable, keyword scoring only")
+        if self._vecs is None:
+            return {}
+        from RAG_node_0_preprocessing import get_encoder
+        q = get_encoder().encode([query], normalize_embeddings=True)[0]
+        return dict(zip(self.names, (self._vecs @ q).tolist()))
+
+    def rank(self, query: str, columns: Iterable[str] = ()) -> List[Tuple[str, float]]:
+        """query 中的列名先去掉（Processing_Time 里的 time 不该命中并发类工具）"""
+        for c in sorted(columns, key=len, reverse=True):
+            query = re.sub(rf"(?<!\w){re.escape(c)}(?!\w)", " ", query, flags=re.I)
+        q = set(_words(query))
+        lex = {n: sum(self.idf[w] for w in q & bag) for n, bag in self.bags.items()}
+        sem = self._semantic(query)
+        scored = [(n, lex[n] + 2.0 * max(sem.get(n, 0.0), 0.0)) for n in self.names]
+        return sorted(scored, key=lambda t: -t[1])
+
+    def select(self, query: str, columns: Iterable[str] = (), k: int = TOP_K) -> List[str]:
+        """返回入选工具名（保持注册表顺序）；k<=0 或命中太少时返回全部"""
+        if k <= 0:
+            return list(self.names)
+        ranked = [n for n, s in self.rank(query, columns) if s > 0][:k]
+        named = [n for n in self.names if re.search(rf"\b{n}\b", query)]
+        picked = set(ranked) | set(named) | {p for p in PINNED if p in self.names}
+        if len(set(ranked) | set(named)) < MIN_TOOLS - len(PINNED):
+            return list(self.names)
+        return [n for n in self.names if n in picked]
+
+_INDEX: ToolIndex | None = None
+_LOCK = threading.Lock()
+
+def get_index() -> ToolIndex:
+    global _INDEX
+    if _INDEX is None:
+        with _LOCK:
+            if _INDEX is None:
+                _INDEX = ToolIndex(list(TOOL_REGISTRY),
+                                   {n: t.description for n, t in TOOL_REGISTRY.items()})
+    return _INDEX
+
+def select_tools(query: str, columns: Iterable[str] = (), k: int = TOP_K) -> List[str]:
+    return get_index().select(query, columns, k)
+
+def select_columns(text: str, columns: Sequence[str], dtypes: Dict[str, str],
+                   date_cols: Iterable[str] = ()) -> List[str]:
+    """文本里出现的列 ∪ 分类（非数值、非时间）列；一个都没有时返回全部"""
+    if TOP_K <= 0:
+        return list(columns)
+    dates = set(date_cols)
+    out = [c for c in columns
+           if re.search(rf"(?<!\w){re.escape(c)}(?!\w)", text, re.I)
+           or (c not in dates and not re.match(r"(int|uint|float|bool|datetime)", dtypes.get(c, "")))]
+    return out or list(columns)
+
+# ---------- token 计数 ----------
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_ENC: list = []                                   # [encoder 或 None]，只尝试导入一次
+
+def count_tokens(text: str) -> int:
+    """有 tiktoken 用 cl100k_base；否则按“词 + 标点”近似（足够比较前后差异）"""
+    if not _ENC:
+        try:
+            import tiktoken
+            _ENC.append(tiktoken.get_encoding("cl100k_base"))
+        except Exception:
+            _ENC.append(None)
+    return len(_ENC[0].encode(text)) if _ENC[0] is not None else len(_TOKEN_RE.findall(text))
@@ -6,6 +6,8 @@ from typing import Dict, Any
 from pydantic import ValidationError
 from json_repair import repair_json      # :contentReference[oaicite:5]{index=5}
 from .models import Action, Finish
+from .optimizer import optimize_plan
+from .plan_cache import remember
 
 log = logging.getLogger("rag.validator")
 
@@ -109,8 +111,9 @@ def validator_node(state: Dict[str, Any]) -> Dict[str, Any]:
         else:                                                    # 单 action
             acts = [_normalize(data)]
 
-        state["action_queue"] = [Action.model_validate(a).model_dump()
-                                  for a in acts]
+        queue = [Action.model_validate(a).model_dump() for a in acts]
+        state["action_queue"], _ = optimize_plan(queue)   # 计划级等价改写（过滤融合 / 下推 / 列裁剪）
+        remember(state, state["action_queue"])            # 校验通过的计划进缓存，下次同类问题跳过 LLM
         state["route"] = "execute"               # ❷ 永远只发往 execute
         return state
     except ValidationError as e:
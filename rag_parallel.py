@@ -0,0 +1,168 @@
+# rag_parallel.py
+"""
+多算法并行跑分引擎
+------------------------------------------------------------------
+• 每个算法一个工作进程，EIF / LOF / COPOD / INNE / OCSVM 同时 fit + 打分，
+  总耗时 ≈ 最慢的那个算法，而不是五个相加；
+• 特征矩阵（原始 + 标准化）只拷贝一次到共享内存（multiprocessing.shared_memory），
+  工作进程按名字挂载、零拷贝地读，不再逐任务 pickle 整个矩阵；
+• 每个算法有独立的 CPU 预算（rag_algorithms.ALGO_THREADS / RAG_ALGO_THREADS），
+  避免 EIF 的 nthreads=-1 把整机超额订阅。
+"""
+
+from __future__ import annotations
+import os, time, atexit, logging, threading
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, Iterable, Tuple
+import numpy as np
+
+log = logging.getLogger("rag.parallel")
+
+_POOL: ProcessPoolExecutor | None = None
+_POOL_SIZE = 0
+_POOL_LOCK = threading.Lock()
+
+# ---------- CPU 预算 ----------
+def cpu_budget(names: Iterable[str]) -> Dict[str, int]:
+    """
+    返回 {algo: 线程数}
+      默认取 rag_algorithms.ALGO_THREADS；
+      环境变量 RAG_ALGO_THREADS="EIF=4,OCSVM=1" 可逐项覆盖。
+    """
+    from rag_algorithms import ALGO_THREADS
+    budget = {n: ALGO_THREADS.get(n, 1) for n in names}
+    for item in os.getenv("RAG_ALGO_THREADS", "").split(","):
+        if "=" in item:
+            k, v = item.split("=", 1)
+            if k.strip() in budget:
+                budget[k.strip()] = max(1, int(v))
+    return budget
+
+# ---------- 进程池（常驻，跨请求复用） ----------
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """spawn 方式起进程：父进程里可能已加载 torch 等带线程的库，fork 不安全"""
+    global _POOL, _POOL_SIZE
+    with _POOL_LOCK:
+        if _POOL is None or _POOL_SIZE < workers:
+            if _POOL is not None:
+                _POOL.shutdown(wait=True)
+            ctx = mp.get_context(os.getenv("RAG_MP_START", "spawn"))
+            _POOL = ProcessPoolExecutor(max_workers=workers, mp_context=ctx)
+            _POOL_SIZE = workers
+        return _POOL
+
+@atexit.register
+def shutdown_pool() -> None:
+    global _POOL, _POOL_SIZE
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.shutdown(wait=True, cancel_futures=True)
+        _POOL, _POOL_SIZE = None, 0
+
+def _preload(_=None) -> int:
+    from rag_algorithms import preload
+    preload()              # 让工作进程提前导入 isotree / pyod / sklearn
+    return os.getpid()
+
+def warm_pool(workers: int | None = None) -> None:
+    """常驻服务启动时调用：提前 spawn 工作进程并导入算法库，首个请求不再付这笔开销"""
+    from rag_algorithms import ALGOS
+    workers = workers or min(len(ALGOS), os.cpu_count() or 1)
+    if os.getenv("RAG_PARALLEL", "1") == "0" or workers <= 1:
+        return
+    list(_get_pool(workers).map(_preload, range(workers)))
+
+# ---------- 共享内存 ----------
+def _to_shm(arr: np.ndarray) -> Tuple[shared_memory.SharedMemory, Tuple]:
+    """把数组拷进一块新共享内存，返回 (shm, 描述符)；描述符可安全 pickle 给子进程"""
+    shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+    np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[:] = arr
+    return shm, (shm.name, arr.shape, arr.dtype.str)
+
+def _attach(desc: Tuple) -> Tuple[shared_memory.SharedMemory, np.ndarray]:
+    name, shape, dtype = desc
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+# ---------- 工作进程入口 ----------
+def _fit_one(name: str, fs, n_jobs: int,
+             save_to: Tuple[str, str] | None) -> Tuple[np.ndarray, float]:
+    """fit + 打分；save_to=(仓库根目录, schema_key) 时顺便把模型存进模型仓库"""
+    from rag_algorithms import fit_algo
+    t0 = time.perf_counter()
+    model, scores = fit_algo(name, fs, n_jobs=n_jobs)
+    dt = time.perf_counter() - t0
+    if save_to is not None:
+        from rag_model_store import ModelStore
+        root, schema = save_to
+        ModelStore(root).save_model(schema, name, model)
+    return scores, dt
+
+def _worker(key: str, raw_desc: Tuple, scaled_desc: Tuple, name: str, n_jobs: int,
+            save_to: Tuple[str, str] | None = None) -> Tuple[str, np.ndarray, float]:
+    """挂载共享内存 → fit_algo → 返回 (algo, scores, seconds)"""
+    from rag_features import FeatureSet
+    shm_raw, raw = _attach(raw_desc)
+    shm_scl, scaled = _attach(scaled_desc)
+    try:
+        fs = FeatureSet(key, raw, scaled)
+        scores, dt = _fit_one(name, fs, n_jobs, save_to)
+        scores = np.array(scores, dtype=float)  # 脱离共享 buffer 再返回
+        del fs, raw, scaled                     # 释放对 buffer 的引用后才能 close
+        return name, scores, dt
+    finally:
+        shm_raw.close()
+        shm_scl.close()
+
+def _run_serial(fs, names, budget, save_to) -> Dict[str, Tuple[np.ndarray, float]]:
+    return {name: _fit_one(name, fs, budget[name], save_to) for name in names}
+
+# ---------- 总入口 ----------
+def run_algos_parallel(X: "np.ndarray | FeatureSet",
+                       names: Iterable[str] | None = None,
+                       budget: Dict[str, int] | None = None,
+                       max_workers: int | None = None,
+                       save_to: Tuple[str, str] | None = None) -> Dict[str, Tuple[np.ndarray, float]]:
+    """
+    并行跑所有算法，返回 {algo: (scores, seconds)}，顺序与 names 一致。
+    X 可以是原始矩阵，也可以是 prepare_features() 已经准备好的 FeatureSet。
+    seconds 为该算法在工作进程内的 fit+打分耗时（不含进程调度）。
+    save_to=(仓库根目录, schema_key)：工作进程直接把拟合好的模型写进模型仓库，
+    模型本身不用再 pickle 回父进程。
+    RAG_PARALLEL=0 或只有 1 个算法时退化为串行。
+    """
+    from rag_algorithms import ALGOS
+    from rag_features import FeatureSet, prepare_features
+    names = list(names or ALGOS.keys())
+    budget = {**cpu_budget(names), **(budget or {})}
+    fs = X if isinstance(X, FeatureSet) else prepare_features(X)
+
+    workers = max_workers or min(len(names), os.cpu_count() or 1)
+    if os.getenv("RAG_PARALLEL", "1") == "0" or workers <= 1 or len(names) <= 1:
+        return _run_serial(fs, names, budget, save_to)
+
+    # raw / scaled 各放一块共享内存，所有工作进程共用
+    shm_raw, raw_desc = _to_shm(fs.raw)
+    try:
+        shm_scl, scaled_desc = _to_shm(np.ascontiguousarray(fs.scaled))
+    except BaseException:
+        shm_raw.close(); shm_raw.unlink()
+        raise
+    try:
+        pool = _get_pool(workers)
+        # 预算大的（通常最慢）先提交，尽早开始
+        order = sorted(names, key=lambda n: -budget[n])
+        futs = [pool.submit(_worker, fs.key, raw_desc, scaled_desc, n, budget[n], save_to)
+                for n in order]
+        done = {}
+        for f in futs:
+            name, scores, dt = f.result()
+            done[name] = (scores, dt)
+            log.debug("algo %s finished in %.2fs (threads=%s)", name, dt, budget[name])
+        return {n: done[n] for n in names}
+    finally:
+        for shm in (shm_raw, shm_scl):
+            shm.close()
+            shm.unlink()
@@ -0,0 +1,247 @@
+# rag_predicate.py
+"""
+select_rows 的谓词引擎：条件字符串 → AST（按文本缓存）→ 一次向量化布尔 mask
+------------------------------------------------------------------
+支持的写法（与旧 select_rows 兼容）：
+    "> 5"                                   column 参数给出列名
+    "Energy_Consumption > 100"              列名写在条件里
+    ">= Other_Col + 10"                     列间 / 算术表达式（df.eval，装了 numexpr 自动用）
+    "Actual_End - Actual_Start > 4 hours"   时间差（秒 / 分钟 / 小时）
+    ">= 08:30"                              HH:MM 时间点
+    "== 'Low Efficiency' AND <= 50"         省略列名的子句沿用前一个子句的列
+    "(A > 1 OR B < 2) AND C == 'x'"         AND 优先于 OR，支持括号
+
+结果是与 df 等长的 bool 数组：行序与 index 原样保留（旧实现的 merge / concat 会打乱）。
+"""
+
+from __future__ import annotations
+import re
+from dataclasses import dataclass
+from datetime import time as dtime
+from functools import lru_cache
+from typing import List, Tuple, Union
+import numpy as np
+import pandas as pd
+
+from rag_catalog import TIME_COLS
+from rag_timecols import as_datetime, delta_seconds
+
+# ---------- AST ----------
+@dataclass(frozen=True)
+class Clause:
+    lhs:      str               # 列名，或 "A - B" / "A / B * 2" 这样的表达式
+    op:       str               # == != <= >= < >
+    rhs_kind: str               # num | str | date | time | dur | name | expr
+    rhs:      object
+
+@dataclass(frozen=True)
+class BoolOp:
+    op:    str                  # AND | OR
+    items: Tuple["Node", ...]
+
+Node = Union[Clause, BoolOp]
+
+_IDENT    = re.compile(r"^[A-Za-z_]\w*$")
+_TD_LHS   = re.compile(r"^([A-Za-z_]\w*)\s*-\s*([A-Za-z_]\w*)$")
+_BOOL     = re.compile(r"\s+(AND|OR)\s+", re.I)
+_CLAUSE   = re.compile(r"^\s*(.*?)\s*(==|!=|<=|>=|<|>)\s*(.+?)\s*$", re.S)
+_NUM      = re.compile(r"^[+-]?(\d+(\.\d*)?|\.\d+)([eE][+-]?\d+)?$")
+_DUR      = re.compile(r"^(\d+(?:\.\d+)?)\s*(hours?|minutes?|seconds?)$", re.I)
+_HHMM     = re.compile(r"^\d{1,2}:\d{2}$")
+_DATE     = re.compile(r"^\d{4}-\d{2}-\d{2}([ T]\d{1,2}:\d{2}(:\d{2})?)?$")
+_UNIT_S   = {"second": 1, "minute": 60, "hour": 3600}
+
+# ---------- 词法：按顶层 AND / OR / 括号切分，引号与子句内部括号原样保留 ----------
+def _tokenize(text: str) -> List[str]:
+    out: List[str] = []
+    buf: List[str] = []
+    quote, depth, i = None, 0, 0
+
+    def flush():
+        s = "".join(buf).strip()
+        if s:
+            out.append(s)
+        buf.clear()
+
+    while i < len(text):
+        ch = text[i]
+        if quote:
+            buf.append(ch)
+            quote = None if ch == quote else quote
+        elif ch in "'\"":
+            quote = ch
+            buf.append(ch)
+        elif ch == "(" and not "".join(buf).strip():        # 子句开头的括号 → 分组
+            out.append("(")
+        elif ch == "(":                                      # 表达式里的括号
+            depth += 1
+            buf.append(ch)
+        elif ch == ")" and depth:
+            depth -= 1
+            buf.append(ch)
+        elif ch == ")":
+            flush()
+            out.append(")")
+        elif depth == 0 and (m := _BOOL.match(text, i)):
+            flush()
+            out.append(m.group(1).upper())
+            i = m.end()
+            continue
+        else:
+            buf.append(ch)
+        i += 1
+    flush()
+    return out
+
+# ---------- 语法：expr := term (OR term)* ; term := factor (AND factor)* ----------
+class _Parser:
+    def __init__(self, tokens: List[str], column: str | None) -> None:
+        self.toks, self.pos, self.last_lhs = tokens, 0, column
+
+    def _peek(self) -> str | None:
+        return self.toks[self.pos] if self.pos < len(self.toks) else None
+
+    def parse(self) -> Node:
+        node = self._expr()
+        if self._peek() is not None:
+            raise ValueError(f"Bad condition syntax near {self._peek()!r}")
+        return node
+
+    def _expr(self) -> Node:
+        items = [self._term()]
+        while self._peek() == "OR":
+            self.pos += 1
+            items.append(self._term())
+        return items[0] if len(items) == 1 else BoolOp("OR", tuple(items))
+
+    def _term(self) -> Node:
+        items = [self._factor()]
+        while self._peek() == "AND":
+            self.pos += 1
+            items.append(self._factor())
+        return items[0] if len(items) == 1 else BoolOp("AND", tuple(items))
+
+    def _factor(self) -> Node:
+        tok = self._peek()
+        if tok is None:
+            raise ValueError("Bad condition syntax: unexpected end")
+        self.pos += 1
+        if tok == "(":
+            node = self._expr()
+            if self._peek() != ")":
+                raise ValueError("Bad condition syntax: missing ')'")
+            self.pos += 1
+            return node
+        if tok in ("AND", "OR", ")"):
+            raise ValueError(f"Bad condition syntax near {tok!r}")
+        return self._clause(tok)
+
+    def _clause(self, text: str) -> Clause:
+        m = _CLAUSE.match(text)
+        if not m:
+            raise ValueError("Bad condition syntax")
+        lhs, op, rhs = m.groups()
+        lhs = lhs.strip() or self.last_lhs           # 省略列名 → 沿用 column / 前一子句
+        if not lhs:
+            raise ValueError("select_rows: 无法确定列名")
+        self.last_lhs = lhs
+        kind, val = _literal(rhs)
+        return Clause(lhs, op, kind, val)
+
+def _literal(raw: str) -> Tuple[str, object]:
+    raw = raw.strip()
+    if len(raw) >= 2 and raw[0] == raw[-1] and raw[0] in "'\"":
+        inner = raw[1:-1]
+        if _DATE.match(inner):
+            return "date", inner
+        if _HHMM.match(inner):
+            return "time", inner
+        return "str", inner
+    if _NUM.match(raw):
+        return "num", float(raw)
+    if m := _DUR.match(raw):
+        unit = m.group(2).lower().rstrip("s")
+        return "dur", float(m.group(1)) * _UNIT_S[unit]
+    if _HHMM.match(raw):
+        return "time", raw
+    if _DATE.match(raw):
+        return "date", raw
+    if _IDENT.match(raw):
+        return "name", raw                           # 列名或不带引号的字符串，求值时决定
+    if any(sym in raw for sym in "+-*/"):
+        return "expr", raw
+    return "str", raw
+
+@lru_cache(maxsize=512)
+def compile_predicate(condition: str, column: str | None = None) -> Node:
+    """条件文本（+ 缺省列名）→ AST；同一条件只解析一次"""
+    return _Parser(_tokenize(condition), column).parse()
+
+# ---------- 求值 ----------
+_CMP = {"==": np.equal, "!=": np.not_equal, "<=": np.less_equal,
+        ">=": np.greater_equal, "<": np.less, ">": np.greater}
+
+def plain(s: pd.Series) -> pd.Series:
+    """category → 原始类型；用于大小比较 / 两列互比（无序 category 不支持这些操作）"""
+    return s.astype(s.cat.categories.dtype) if isinstance(s.dtype, pd.CategoricalDtype) else s
+
+def _is_time_col(df: pd.DataFrame, name: str) -> bool:
+    return name in TIME_COLS or pd.api.types.is_datetime64_any_dtype(df[name].dtype)
+
+def _lhs(df: pd.DataFrame, c: Clause) -> Tuple[pd.Series, bool]:
+    """返回 (左值, 是否为时间差秒数)"""
+    if c.lhs in df.columns:
+        return df[c.lhs], False
+    m = _TD_LHS.match(c.lhs)
+    if m and m.group(1) in df.columns and m.group(2) in df.columns and (
+            c.rhs_kind == "dur" or (_is_time_col(df, m.group(1)) and _is_time_col(df, m.group(2)))):
+        a, b = m.groups()
+        return delta_seconds(df, a, b), True
+    if _IDENT.match(c.lhs):
+        raise KeyError(c.lhs)
+    return df.eval(c.lhs), False
+
+def _rhs(df: pd.DataFrame, c: Clause, lhs: pd.Series, is_td: bool):
+    kind, val = c.rhs_kind, c.rhs
+    if kind == "name" and val in df.columns:
+        return df[val]
+    if kind == "expr":
+        return df.eval(val)
+    if kind in ("dur", "num"):
+        return val
+    if kind in ("str", "name") and _NUM.match(str(val)) and pd.api.types.is_numeric_dtype(lhs.dtype):
+        return float(val)                                        # "== '5'" 与数值列比较
+    if kind == "date" and (is_td is False and (c.lhs in TIME_COLS or
+                                               pd.api.types.is_datetime64_any_dtype(lhs.dtype))):
+        return pd.Timestamp(val)
+    if kind == "time":
+        return pd.to_datetime(val, format="%H:%M").time()
+    return str(val)
+
+def _clause_mask(df: pd.DataFrame, c: Clause) -> np.ndarray:
+    lhs, is_td = _lhs(df, c)
+    rhs = _rhs(df, c, lhs, is_td)
+    if isinstance(rhs, dtime):                                   # HH:MM 时间点
+        lhs = as_datetime(lhs).dt.time
+        ok = lhs.notna().to_numpy()
+        out = np.zeros(len(df), dtype=bool)
+        out[ok] = _CMP[c.op](lhs[ok].to_numpy(dtype=object), rhs).astype(bool)
+        return out
+    if isinstance(rhs, pd.Series) or c.op not in ("==", "!="):
+        lhs = plain(lhs)                                         # 大小比较 / 列-列比较
+        rhs = plain(rhs) if isinstance(rhs, pd.Series) else rhs
+    elif isinstance(rhs, str) and pd.api.types.is_numeric_dtype(lhs.dtype):
+        return np.full(len(df), c.op == "!=")                   # 数值列 == 字符串：恒不等
+    res = {"==": lhs.__eq__, "!=": lhs.__ne__, "<=": lhs.__le__,
+           ">=": lhs.__ge__, "<": lhs.__lt__, ">": lhs.__gt__}[c.op](rhs)
+    return pd.Series(res).fillna(c.op == "!=").to_numpy(dtype=bool)
+
+def evaluate(node: Node, df: pd.DataFrame) -> np.ndarray:
+    if isinstance(node, Clause):
+        return _clause_mask(df, node)
+    masks = [evaluate(n, df) for n in node.items]
+    return (np.logical_and if node.op == "AND" else np.logical_or).reduce(masks)
+
+def predicate_mask(df: pd.DataFrame, condition: str, column: str | None = None) -> np.ndarray:
+    """select_rows 的入口：返回与 df 等长的 bool 数组"""
+    return evaluate(compile_predicate(condition.strip(), column), df)
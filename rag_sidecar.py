@@ -0,0 +1,91 @@
+# rag_sidecar.py
+"""
+CSV 的二进制列式旁路文件（Arrow/Feather v2）
+------------------------------------------------------------------
+第一次 load_data 解析完 CSV 后，把“已经整理好类型”的 DataFrame 写成
+.cache/frames/<文件名>-<路径哈希>.feather：
+    • 日期列已经是 datetime64，不用再 parse_dates；
+    • 重复字符串列已是 category → Arrow dictionary 编码；
+    • 不压缩 + memory_map 读取，数值列几乎零拷贝。
+schema metadata 里记着源 CSV 的 fingerprint（mtime_ns-size），源文件一变就失效、回落 CSV。
+
+pyarrow 在 requirements 里声明，但代码上仍按可选依赖处理：没装时 read_sidecar 返回 None、
+write_sidecar 什么都不做，load_data 每次都回落到解析 CSV（结果相同，只是慢）——
+第一次发现缺 pyarrow 会打一条 info 日志，免得“旁路从没生效”没人知道。
+RAG_SIDECAR=0 可整体关闭。
+"""
+
+from __future__ import annotations
+import os, hashlib, logging, tempfile, contextlib
+from pathlib import Path
+import pandas as pd
+
+log = logging.getLogger("rag.sidecar")
+
+SIDECAR_DIR = Path(os.getenv("RAG_SIDECAR_DIR", os.path.join(".cache", "frames")))
+ENABLED     = os.getenv("RAG_SIDECAR", "1") != "0"
+_FP_KEY     = b"rag_fingerprint"
+FORMAT      = 2          # load_data 的类型整理流程变了就加 1，旧旁路文件自动作废
+
+_warned_missing = False
+
+def _no_pyarrow() -> None:
+    global _warned_missing
+    if not _warned_missing:
+        _warned_missing = True
+        log.info("pyarrow not installed: feather sidecar disabled, CSV is parsed on every load")
+
+def _tag(fingerprint: str) -> bytes:
+    return f"{fingerprint}|v{FORMAT}".encode()
+
+def sidecar_path(src: Path) -> Path:
+    tag = hashlib.blake2b(str(src.resolve()).encode(), digest_size=8).hexdigest()
+    return SIDECAR_DIR / f"{src.stem}-{tag}.feather"
+
+def read_sidecar(src: Path, fingerprint: str) -> pd.DataFrame | None:
+    """fingerprint 匹配则返回 DataFrame；否则（或没装 pyarrow / 文件损坏）返回 None"""
+    if not ENABLED:
+        return None
+    try:
+        from pyarrow import feather
+    except ImportError:
+        _no_pyarrow()
+        return None
+    p = sidecar_path(src)
+    if not p.exists():
+        return None
+    try:
+        table = feather.read_table(p, memory_map=True)
+    except Exception as e:                       # 写到一半 / 版本不兼容 → 当作不存在
+        log.warning("sidecar %s unreadable: %s", p, e)
+        return None
+    if (table.schema.metadata or {}).get(_FP_KEY) != _tag(fingerprint):
+        log.debug("sidecar %s is stale", p)
+        return None
+    return table.to_pandas()                     # dictionary 列 → category，datetime 保持不变
+
+def write_sidecar(src: Path, fingerprint: str, df: pd.DataFrame) -> None:
+    if not ENABLED:
+        return
+    try:
+        import pyarrow as pa
+        from pyarrow import feather
+    except ImportError:
+        _no_pyarrow()
+        return
+    p = sidecar_path(src)
+    tmp = None
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                               _FP_KEY: _tag(fingerprint)})
+        p.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=p.parent, prefix=f".{p.name}.", suffix=".tmp")
+        os.close(fd)                             # 每个写者一个临时文件，并发写同一 CSV 不互踩
+        feather.write_feather(table, tmp, compression="uncompressed")
+        os.replace(tmp, p)                       # 原子替换
+    except Exception as e:                       # 旁路文件只是加速，失败不影响主流程
+        if tmp is not None:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp)
+        log.warning("sidecar write failed for %s: %s", src, e)
@@ -0,0 +1,89 @@
+# rag_streaming.py
+"""
+超大 CSV 的流式异常打分工具
+------------------------------------------------------------------
+• reservoir_sample  —— 第一遍按块读，蓄水池抽样出固定大小的训练样本（内存有界）
+• TopK              —— 小根堆维护全局 top‑k 异常行，替代对全表 sort_values().head()
+• iter_chunks       —— 第二遍按块读，供调用方逐块打分、逐块落盘
+
+峰值内存 ≈ 样本 + 一个 chunk，与文件总行数无关。
+"""
+
+from __future__ import annotations
+import os, heapq, itertools
+from typing import Iterator, List, Tuple
+import numpy as np
+import pandas as pd
+
+STREAM_MIN_MB = float(os.getenv("RAG_STREAM_MIN_MB", "1024"))   # 超过这个大小自动走流式
+SAMPLE_SIZE   = int(os.getenv("RAG_STREAM_SAMPLE", "200000"))   # 蓄水池容量（行）
+CHUNK_SIZE    = int(os.getenv("RAG_STREAM_CHUNK", "100000"))    # 每块行数
+
+def should_stream(csv_path: str, force: bool | None = None) -> bool:
+    """state['stream'] 显式指定优先；否则按文件大小判断"""
+    if force is not None:
+        return bool(force)
+    return os.path.getsize(csv_path) >= STREAM_MIN_MB * 1024 * 1024
+
+def feature_columns(csv_path: str, exclude=("time_stamp",)) -> List[str]:
+    """返回参与打分的列（查数据集目录，不读数据）"""
+    from rag_catalog import describe
+    return [c for c in describe(csv_path).columns if c not in exclude]
+
+def iter_chunks(csv_path: str, chunksize: int = CHUNK_SIZE,
+                **read_kw) -> Iterator[pd.DataFrame]:
+    yield from pd.read_csv(csv_path, chunksize=chunksize, **read_kw)
+
+# ---------- 1. 蓄水池抽样 ----------
+def reservoir_sample(csv_path: str, columns: List[str], k: int = SAMPLE_SIZE,
+                     chunksize: int = CHUNK_SIZE, seed: int = 0) -> Tuple[pd.DataFrame, int]:
+    """
+    Algorithm R 的按块向量化版本：第 i 行（0 起）以 k/(i+1) 的概率替换池中随机一格。
+    返回 (样本 DataFrame, 文件总行数)。样本不超过 k 行。
+    """
+    rng  = np.random.default_rng(seed)
+    pool = np.empty((k, len(columns)), dtype=np.float64)
+    seen = 0
+    for chunk in iter_chunks(csv_path, chunksize, usecols=columns,
+                             dtype={c: "float64" for c in columns}):
+        X = chunk[columns].to_numpy(dtype=np.float64)
+        n = len(X)
+        # ① 池子还没满：直接填
+        fill = min(max(k - seen, 0), n)
+        if fill:
+            pool[seen:seen + fill] = X[:fill]
+        # ② 池子已满：为剩余行各抽一个槽位，落在 [0, k) 的才替换
+        if fill < n:
+            idx  = np.arange(seen + fill, seen + n)          # 全局行号
+            slot = rng.integers(0, idx + 1)                  # j ~ U[0, i]
+            hit  = slot < k
+            pool[slot[hit]] = X[fill:][hit]                  # 同槽多次命中 → 后者覆盖，与逐行一致
+        seen += n
+    return pd.DataFrame(pool[:min(seen, k)], columns=columns), seen
+
+# ---------- 2. 全局 top‑k ----------
+class TopK:
+    """小根堆：始终保留分数最高的 k 行（行内容以 dict 形式保存）"""
+
+    def __init__(self, k: int = 5) -> None:
+        self.k = k
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()          # 同分时的稳定次序
+
+    def push_chunk(self, chunk: pd.DataFrame, scores: np.ndarray) -> None:
+        # 先在块内 argpartition 取候选，只有少量行进入 Python 层的堆操作
+        m = min(self.k, len(scores))
+        if m == 0:
+            return
+        cand = np.argpartition(-scores, m - 1)[:m]
+        rows = chunk.iloc[cand].to_dict("records")   # 按行取会把混合 dtype 上转为 float
+        for i, row in zip(cand, rows):
+            item = (float(scores[i]), next(self._seq), row)
+            if len(self._heap) < self.k:
+                heapq.heappush(self._heap, item)
+            elif item[0] > self._heap[0][0]:
+                heapq.heapreplace(self._heap, item)
+
+    def to_frame(self, score_col: str = "anomaly_score") -> pd.DataFrame:
+        best = sorted(self._heap, key=lambda t: (-t[0], t[1]))
+        return pd.DataFrame([{**row, score_col: sc} for sc, _, row in best])
@@ -0,0 +1,95 @@
+# rag_timecols.py
+"""
+时间列层：解析一次，之后只做减法
+------------------------------------------------------------------
+• ensure_datetime(df)      —— TIME_COLS 与 *timestamp 列保证是 datetime64（load_data 调用）
+• as_datetime(s)           —— 已是 datetime64 直接返回；否则解析一次并按底层数组缓存
+• epoch_ns(s)              —— int64 纳秒时间戳（NaT → iNaT），datetime64 下是零拷贝视图
+• delta_seconds(df, a, b)  —— (a - b) 秒数，按两列底层数组记忆化：同一份数据重复算延迟只是一次拷贝
+
+缓存 key 用底层数组的数据指针 + 形状 + 步长 + dtype（或扩展数组对象 id），
+起始地址相同、长度相同但步长不同的两个视图（df.iloc[:5] / df.iloc[::2]）不会撞 key；
+条目里持有数组本身的强引用，保证地址在条目存活期间不会被复用；容量有界（LRU）。
+"""
+
+from __future__ import annotations
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Iterable, Tuple
+import numpy as np
+import pandas as pd
+
+from rag_catalog import TIME_COLS
+
+_SLOTS = 128
+_CACHE: "OrderedDict[Hashable, Tuple[Any, Any]]" = OrderedDict()   # key → (anchor, value)
+_LOCK = threading.Lock()
+
+def is_time_col(name: str) -> bool:
+    low = str(name).lower()
+    return name in TIME_COLS or low == "time_stamp" or low.endswith("timestamp")
+
+def ensure_datetime(df: pd.DataFrame, cols: Iterable[str] | None = None) -> pd.DataFrame:
+    """把时间列就地转成 datetime64（解析失败 → NaT）；已经是 datetime 的列不动"""
+    for c in (cols if cols is not None else [c for c in df.columns if is_time_col(c)]):
+        if c in df.columns and not pd.api.types.is_datetime64_any_dtype(df[c].dtype):
+            df[c] = pd.to_datetime(df[c], errors="coerce")
+    return df
+
+# ---------- 按底层数组记忆化 ----------
+def _ident(s: pd.Series) -> Tuple[Hashable, Any]:
+    """(key, anchor)：numpy 数组用 (数据指针, 形状, 步长, dtype)，扩展数组用对象 id"""
+    arr = s.array
+    if isinstance(arr, pd.arrays.DatetimeArray) or isinstance(arr, pd.arrays.NumpyExtensionArray):
+        np_arr = s.to_numpy(copy=False)
+        return (np_arr.__array_interface__["data"][0], np_arr.shape, np_arr.strides,
+                np_arr.dtype.str), np_arr
+    return (id(arr), len(arr), str(s.dtype)), arr
+
+def _memo(key: Hashable, anchor: Any, compute):
+    with _LOCK:
+        hit = _CACHE.get(key)
+        if hit is not None:
+            _CACHE.move_to_end(key)
+            return hit[1]
+    val = compute()
+    with _LOCK:
+        _CACHE[key] = (anchor, val)
+        while len(_CACHE) > _SLOTS:
+            _CACHE.popitem(last=False)
+    return val
+
+def clear_cache() -> None:
+    with _LOCK:
+        _CACHE.clear()
+
+def as_datetime(s: pd.Series) -> pd.Series:
+    if pd.api.types.is_datetime64_any_dtype(s.dtype):
+        return s
+    key, anchor = _ident(s)
+    values = _memo(("dt",) + key, anchor,
+                   lambda: pd.to_datetime(s, errors="coerce").to_numpy())
+    return pd.Series(values, index=s.index, name=s.name, copy=False)
+
+def epoch_ns(s: pd.Series) -> np.ndarray:
+    """datetime64[ns] 的 int64 视图；非 ns 精度 / 字符串列先统一到 ns"""
+    dt = as_datetime(s)
+    key, anchor = _ident(dt)
+    return _memo(("ns",) + key, anchor,
+                 lambda: dt.to_numpy().astype("datetime64[ns]").view("i8"))
+
+def delta_seconds(df: pd.DataFrame, a: str, b: str) -> pd.Series:
+    """(df[a] - df[b]) 的秒数；NaT → NaN。返回新 Series，调用方可随意就地修改"""
+    sa, sb = as_datetime(df[a]), as_datetime(df[b])
+    ka, anchor_a = _ident(sa)
+    kb, anchor_b = _ident(sb)
+
+    def compute() -> np.ndarray:
+        ea, eb = epoch_ns(sa), epoch_ns(sb)
+        out = (ea - eb) / 1e9
+        out[(ea == np.iinfo(np.int64).min) | (eb == np.iinfo(np.int64).min)] = np.nan
+        out.flags.writeable = False
+        return out
+
+    values = _memo(("delta",) + ka + kb, (anchor_a, anchor_b), compute)
+    return pd.Series(values.copy(), index=df.index)
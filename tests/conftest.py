@@ -0,0 +1,21 @@
+# tests/conftest.py
+# 测试从仓库根目录导入模块、按相对路径读 data/（与 python RAG_main.py 的运行方式一致）
+
+import os, sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+CSV = os.path.join("data", "hybrid_manufacturing_categorical.csv")
+
+@pytest.fixture(autouse=True)
+def _repo_cwd(monkeypatch):
+    monkeypatch.chdir(ROOT)
+
+@pytest.fixture
+def df():
+    """样例数据集（load_data 缓存的浅拷贝，随便改）"""
+    from RAG_tool_functions import load_data
+    return load_data(CSV)
@@ -0,0 +1,44 @@
+# tests/test_anomaly_equivalence.py
+# 异常检测侧的改写：共享标准化（user-002）与逐算法现拟合一致；并行（user-001）与串行分数一致。
+
+import numpy as np
+import pytest
+from sklearn.preprocessing import StandardScaler
+
+import rag_features
+
+def _X(seed=0, n=400, k=5):
+    return np.random.default_rng(seed).normal(size=(n, k)) * [1, 10, 100, 0.1, 5]
+
+def test_cached_features_match_fresh_scaler(tmp_path, monkeypatch):
+    monkeypatch.setattr(rag_features, "CACHE_DIR", tmp_path)
+    monkeypatch.setattr(rag_features, "_MEM", rag_features.OrderedDict())
+    X = _X()
+    ref = StandardScaler().fit_transform(X).astype(np.float32)
+
+    fresh = rag_features.prepare_features(X)
+    np.testing.assert_allclose(fresh.scaled, ref, rtol=1e-6)
+
+    rag_features._MEM.clear()                    # 强制走磁盘缓存
+    disk = rag_features.prepare_features(X)
+    np.testing.assert_array_equal(np.asarray(disk.scaled), fresh.scaled)
+    np.testing.assert_array_equal(disk.raw, X)
+
+def test_given_scaler_only_transforms(tmp_path, monkeypatch):
+    monkeypatch.setattr(rag_features, "CACHE_DIR", tmp_path)
+    fit_on = _X(1)
+    scaler = StandardScaler().fit(fit_on)
+    X = _X(2)
+    fs = rag_features.prepare_features(X, scaler=scaler)
+    np.testing.assert_allclose(fs.scaled, scaler.transform(X).astype(np.float32), rtol=1e-6)
+    assert fs.key != rag_features.prepare_features(X).key
+
+def test_parallel_scores_match_serial(monkeypatch):
+    pytest.importorskip("pyod")
+    from rag_parallel import run_algos_parallel
+    X, names = _X(3), ["LOF", "COPOD"]
+    par = run_algos_parallel(X, names, max_workers=2)
+    monkeypatch.setenv("RAG_PARALLEL", "0")
+    ser = run_algos_parallel(X, names)
+    for n in names:
+        np.testing.assert_allclose(par[n][0], ser[n][0])
@@ -0,0 +1,35 @@
+import json
+import logging
+import os
+import threading
+import time
+
+import rag_catalog
+
+
+def test_concurrent_saves_use_private_temp_files(tmp_path, monkeypatch, caplog):
+    path = tmp_path / "catalog.json"
+    monkeypatch.setattr(rag_catalog, "CATALOG_PATH", path)
+    info = rag_catalog.describe("data/hybrid_manufacturing_categorical.csv")
+
+    real_replace, sources = os.replace, []
+
+    def slow_replace(src, dst):                 # 拉长写完到替换之间的窗口
+        sources.append(str(src))
+        time.sleep(0.02)
+        real_replace(src, dst)
+
+    monkeypatch.setattr(rag_catalog.os, "replace", slow_replace)
+    caplog.set_level(logging.WARNING, logger="rag.catalog")
+
+    threads = [threading.Thread(target=rag_catalog._save_disk) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(set(sources)) == len(threads)
+    assert not [r for r in caplog.records if "catalog write failed" in r.getMessage()]
+    assert [p.name for p in tmp_path.iterdir()] == ["catalog.json"]
+    raw = json.loads(path.read_text(encoding="utf-8"))
+    assert raw[info.path]["n_rows"] == info.n_rows
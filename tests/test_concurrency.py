@@ -0,0 +1,40 @@
+# tests/test_concurrency.py
+# sweep-line 并发引擎（user-018）与逐时刻暴力计数对拍。
+
+import numpy as np
+import pandas as pd
+
+from rag_concurrency import concurrency_series, peak_concurrency
+
+def _brute(starts, ends, t):
+    ok = starts.notna() & ends.notna()
+    s, e = starts[ok], ends[ok]
+    return int(((s <= t) & (t < e)).sum())          # [start, end)：首尾相接不算重叠
+
+def test_series_matches_brute_force(df):
+    s = concurrency_series(df["Actual_Start"], df["Actual_End"])
+    assert s.index.is_monotonic_increasing and s.index.is_unique
+    for t, c in s.items():
+        assert c == _brute(df["Actual_Start"], df["Actual_End"], t)
+
+def test_back_to_back_and_nat():
+    t = pd.to_datetime(["2024-01-01 00:00", "2024-01-01 01:00", "2024-01-01 01:00", None])
+    starts = pd.Series([t[0], t[1], t[0], t[0]])
+    ends = pd.Series([t[1], pd.Timestamp("2024-01-01 02:00"), t[1], t[3]])
+    s = concurrency_series(starts, ends)
+    assert s.tolist() == [2, 1, 0]
+
+def test_grouped_peak_matches_brute_force(df):
+    res = peak_concurrency(df, group_col="Machine_ID").set_index("Machine_ID")
+    for m, sub in df.groupby("Machine_ID", observed=True):
+        times = pd.concat([sub["Actual_Start"], sub["Actual_End"]]).dropna().sort_values().unique()
+        counts = [_brute(sub["Actual_Start"], sub["Actual_End"], t) for t in times]
+        peak = max(counts)
+        assert res.loc[m, "peak_concurrency"] == peak
+        assert res.loc[m, "peak_time"] == times[int(np.argmax(counts))]
+
+def test_overall_peak(df):
+    res = peak_concurrency(df)
+    s = concurrency_series(df["Actual_Start"], df["Actual_End"])
+    assert res["peak_concurrency"].iloc[0] == s.max()
+    assert res["peak_time"].iloc[0] == s.idxmax()
@@ -0,0 +1,47 @@
+# tests/test_deferred_rollback.py
+# 惰性链中途失败：回退到的 base 帧必须与失败前完全一致（派生列不能漏进去）。
+
+import pandas as pd
+
+import RAG_tool_functions as tf
+from rag_nodes_react.execute import execute_node
+
+RATIO = {"function": "add_derived_column",
+         "args": {"name": "ratio", "formula": "Energy_Consumption / Processing_Time"}}
+
+def _drive(state, queue):
+    state.update(action_queue=[dict(a, args=dict(a["args"])) for a in queue], route="execute")
+    while state.get("route") not in ("finish", "error"):
+        state = execute_node(state)
+    return state
+
+def test_failed_step_after_derive_rolls_back_clean_base():
+    state = _drive({}, [{"function": "select_rows",
+                         "args": {"column": "Processing_Time", "condition": "> 60"}}])
+    assert state["route"] == "finish"
+    base = state["execution_output"]
+    before = base.copy()
+
+    state = _drive(state, [RATIO, {"function": "calculate_average",
+                                   "args": {"column": "No_Such_Column"}}])
+    assert state["route"] == "error"
+    assert "calculate_average" in state["observation"]
+    rolled = state["execution_output"]
+    assert rolled is base
+    assert "ratio" not in rolled.columns
+    pd.testing.assert_frame_equal(rolled, before)
+
+    state = _drive(state, [RATIO, {"function": "calculate_max", "args": {"column": "ratio"}}])
+    assert state["route"] == "finish"
+    assert state["execution_output"] == (before["Energy_Consumption"]
+                                         / before["Processing_Time"]).max()
+
+def test_add_derived_column_leaves_input_untouched(df):
+    cols = list(df.columns)
+    out = tf.add_derived_column(df, RATIO["args"])
+    assert list(df.columns) == cols
+    assert "ratio" in out.columns
+    out2 = tf.add_derived_column(df, {"name": "wait", "colA": "Actual_Start",
+                                      "colB": "Scheduled_Start", "unit": "minutes"})
+    assert list(df.columns) == cols
+    assert "wait" in out2.columns
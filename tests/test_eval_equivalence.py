@@ -0,0 +1,58 @@
+# tests/test_eval_equivalence.py
+# 向量化评估（user-006）与旧版逐算法 sklearn 实现逐项对拍。
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.metrics import (average_precision_score, precision_recall_curve,
+                             precision_recall_fscore_support)
+
+import rag_eval
+
+def _old_pseudo_labels(S, top_q=0.02):
+    votes = np.zeros(S.shape, dtype=int)
+    for j in range(S.shape[1]):
+        votes[:, j] = (S[:, j] >= np.quantile(S[:, j], 1 - top_q)).astype(int)
+    return (votes.sum(1) >= (S.shape[1] + 1) // 2).astype(int)
+
+def _old_evaluate(scores, y):
+    prec, rec, f1, _ = precision_recall_fscore_support(
+        y, (scores >= np.quantile(scores, 0.98)).astype(int), average="binary", zero_division=0)
+    return prec, rec, f1, average_precision_score(y, scores)
+
+def _scores(seed, n=3000, k=4, decimals=None):
+    S = np.random.default_rng(seed).normal(size=(n, k))
+    S[:, 1] += S[:, 0]                          # 让算法之间有相关性，伪标签不全空
+    return S.round(decimals) if decimals is not None else S
+
+@pytest.mark.parametrize("seed,decimals", [(0, None), (1, 1), (2, 0)])   # 含大量同分
+def test_evaluate_matrix_matches_sklearn(seed, decimals):
+    S = _scores(seed, decimals=decimals)
+    m = rag_eval.evaluate_matrix(S, with_curves=True)
+    y = _old_pseudo_labels(S)
+    np.testing.assert_array_equal(m["y_ens"], y)
+
+    for j in range(S.shape[1]):
+        prec, rec, f1, ap = _old_evaluate(S[:, j], y)
+        assert m["precision"][j] == pytest.approx(prec)
+        assert m["recall"][j] == pytest.approx(rec)
+        assert m["f1"][j] == pytest.approx(f1)
+        assert m["pr_auc"][j] == pytest.approx(ap)
+
+        p_ref, r_ref, _ = precision_recall_curve(y, S[:, j])
+        p, r = m["curves"][j]
+        np.testing.assert_allclose(p, p_ref)
+        np.testing.assert_allclose(r, r_ref)
+
+def test_pr_pass_with_external_labels():
+    S = _scores(3, decimals=1)
+    Y = (np.random.default_rng(4).random(S.shape) < 0.1).astype(int)
+    ap, _ = rag_eval.pr_pass(S, Y)
+    for j in range(S.shape[1]):
+        assert ap[j] == pytest.approx(average_precision_score(Y[:, j], S[:, j]))
+
+def test_pseudo_labels_frame_wrapper():
+    S = _scores(5)
+    df = pd.DataFrame(S, columns=list("abcd"))
+    df.insert(0, "time_stamp", range(len(df)))
+    np.testing.assert_array_equal(rag_eval.pseudo_labels(df), _old_pseudo_labels(S))
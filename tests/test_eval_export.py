@@ -0,0 +1,50 @@
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import rag_eval
+
+
+def test_export_runs_on_tracked_daemon_thread(monkeypatch):
+    release = threading.Event()
+    seen = []
+
+    def fake_export(*args):
+        release.wait(5)
+        seen.append(args[0])
+
+    monkeypatch.setattr(rag_eval, "export_excel", fake_export)
+    t = rag_eval.export_excel_async("x.xlsx", None, [], None, pd.DataFrame(), None)
+    assert t.daemon
+    assert t in rag_eval._EXPORTS
+
+    start = time.monotonic()
+    rag_eval.join_exports(timeout=0.05)          # 卡住的导出不会拖住退出
+    assert time.monotonic() - start < 1
+    assert t.is_alive()
+
+    release.set()
+    rag_eval.join_exports(timeout=5)
+    assert seen == ["x.xlsx"]
+    assert t not in rag_eval._EXPORTS
+
+
+def test_concurrent_evaluations_are_independent():
+    rng = np.random.default_rng(0)
+    mats = [rng.random((500, 3)) for _ in range(4)]
+    expected = [rag_eval.run_evaluation(S, save_fig=False) for S in mats]
+
+    out = [None] * len(mats)
+
+    def work(i):
+        out[i] = rag_eval.run_evaluation(mats[i], save_fig=False)
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(len(mats))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for got, exp in zip(out, expected):
+        pd.testing.assert_frame_equal(got, exp)
@@ -0,0 +1,78 @@
+# tests/test_llm.py
+# 网关对着本地桩跑：成功、503 重试、重试用尽、超时、并发上限。
+
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("httpx")
+
+from rag_llm import LLMError, LLMGateway, serve_stub
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(**kw):
+        srv = serve_stub(0, **kw)
+        servers.append(srv)
+        return f"http://127.0.0.1:{srv.server_address[1]}/v1"
+
+    yield start
+    for srv in servers:
+        srv.shutdown()
+        srv.server_close()
+
+@pytest.fixture
+def gateway():
+    gws = []
+
+    def make(base_url, **kw):
+        kw.setdefault("backoff", 0.0)
+        gw = LLMGateway(base_url=base_url, api_key="test", **kw)
+        gws.append(gw)
+        return gw
+
+    yield make
+    for gw in gws:
+        gw.close()
+
+MSG = [{"role": "user", "content": "hi"}]
+
+def test_success(stub, gateway):
+    gw = gateway(stub(reply='{"finish": "ok"}'), retries=0)
+    assert gw.chat(MSG) == '{"finish": "ok"}'
+    assert gw.stats()["requests"] == 1
+    assert gw.stats()["retries"] == 0
+
+def test_retries_503_then_succeeds(stub, gateway):
+    gw = gateway(stub(reply="done", fail_first=2), retries=3)
+    assert gw.chat(MSG) == "done"
+    s = gw.stats()
+    assert (s["requests"], s["retries"], s["failures"]) == (1, 2, 0)
+
+def test_retries_exhausted_raises(stub, gateway):
+    gw = gateway(stub(fail_first=10), retries=1)
+    with pytest.raises(LLMError, match="after 2 attempts"):
+        gw.chat(MSG)
+    s = gw.stats()
+    assert (s["requests"], s["retries"], s["failures"], s["in_flight"]) == (0, 1, 1, 0)
+
+def test_timeout_raises(stub, gateway):
+    gw = gateway(stub(delay=1.0), retries=0, timeout=0.1)
+    with pytest.raises(LLMError, match="Timeout"):
+        gw.chat(MSG)
+
+def test_concurrency_is_capped(stub, gateway):
+    gw = gateway(stub(reply="x", delay=0.2), retries=0, concurrency=2)
+
+    async def burst():
+        return await asyncio.gather(*(gw.achat(MSG) for _ in range(6)))
+
+    t0 = time.perf_counter()
+    out = asyncio.run(burst())
+    elapsed = time.perf_counter() - t0
+    assert out == ["x"] * 6
+    assert elapsed >= 0.55                 # 6 个请求、同时最多 2 个 → 至少三轮
+    assert gw.stats()["requests"] == 6
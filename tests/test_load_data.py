@@ -0,0 +1,27 @@
+# tests/test_load_data.py
+# load_data 的缓存 / 旁路文件 / dtype 压缩（user-011/012/013）不改变任何取值。
+
+import pandas as pd
+
+import RAG_tool_functions as tf
+from rag_catalog import TIME_COLS
+from conftest import CSV
+
+def _plain():
+    return pd.read_csv(CSV, parse_dates=TIME_COLS)
+
+def test_values_match_plain_read_csv(df):
+    ref = _plain()
+    assert list(df.columns) == list(ref.columns)
+    for c in ref.columns:
+        got = df[c]
+        if isinstance(got.dtype, pd.CategoricalDtype):
+            got = got.astype(object)
+        pd.testing.assert_series_equal(got, ref[c], check_dtype=False)
+
+def test_callers_cannot_mutate_cache(df):
+    df["Processing_Time"] = 0
+    df["extra"] = 1
+    fresh = tf.load_data(CSV)
+    assert "extra" not in fresh.columns
+    assert (fresh["Processing_Time"] != 0).any()
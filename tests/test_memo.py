@@ -0,0 +1,31 @@
+# tests/test_memo.py
+# 工具记忆化（user-022）：命中与不命中结果一致，调用方改返回值不会污染缓存。
+
+import pandas as pd
+
+import rag_memo
+from RAG_tools import TOOL_REGISTRY
+from rag_deferred import defer
+
+PT60 = {"column": "Processing_Time", "condition": "> 60"}
+
+def _plan():
+    return defer(None, "select_rows", dict(PT60))
+
+def test_hit_equals_fresh_computation(df):
+    rag_memo.clear()
+    avg = TOOL_REGISTRY["calculate_average"]
+    first = avg.call(_plan(), {"column": "Energy_Consumption"})
+    again = avg.call(_plan(), {"column": "Energy_Consumption"})
+    assert rag_memo.stats()["hits"] >= 1
+    ref = df[df["Processing_Time"] > 60]["Energy_Consumption"].mean()
+    assert first == again == ref
+
+def test_mutating_cached_frame_does_not_leak(df):
+    rag_memo.clear()
+    top = TOOL_REGISTRY["top_n"]
+    args = {"column": "Energy_Consumption", "n": 5}
+    first = top.call(df, dict(args))
+    first["Energy_Consumption"] = -1.0
+    again = top.call(df, dict(args))
+    pd.testing.assert_frame_equal(again, df.nlargest(5, "Energy_Consumption", keep="first"))
@@ -0,0 +1,34 @@
+import os
+
+import rag_model_store as ms
+
+
+def test_refit_evicts_previous_mtime(tmp_path):
+    store = ms.ModelStore(tmp_path)
+    store.save_scaler("s", {"v": 1})
+    assert store.load_scaler("s") == {"v": 1}
+
+    path = tmp_path / "s" / "scaler.joblib"
+    store.save_scaler("s", {"v": 2})
+    st = path.stat()
+    os.utime(path, (st.st_atime, st.st_mtime + 10))     # 保证 mtime 变化
+
+    assert store.load_scaler("s") == {"v": 2}
+    assert [k for k in store._cache if k[0] == str(path)] == [(str(path), path.stat().st_mtime)]
+
+
+def test_cache_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(ms, "_CACHE_SLOTS", 3)
+    store = ms.ModelStore(tmp_path)
+    for i in range(6):
+        store.save_scaler(f"s{i}", i)
+        assert store.load_scaler(f"s{i}") == i
+    assert len(store._cache) == 3
+    assert {k[0] for k in store._cache} == {str(tmp_path / f"s{i}" / "scaler.joblib") for i in (3, 4, 5)}
+
+
+def test_no_leftover_temp_files(tmp_path):
+    store = ms.ModelStore(tmp_path)
+    store.save_scaler("s", [1, 2, 3])
+    store.write_meta("s", 10, ["a"])
+    assert sorted(p.name for p in (tmp_path / "s").iterdir()) == ["meta.json", "scaler.joblib"]
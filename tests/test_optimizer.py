@@ -0,0 +1,79 @@
+# tests/test_optimizer.py
+# 计划优化器只做等价改写：同一计划优化前后经 execute_node 跑出的结果必须一致。
+
+import math
+import pandas as pd
+import pytest
+
+from rag_nodes_react.optimizer import optimize_plan
+from rag_nodes_react.execute import execute_node
+
+def _run(queue):
+    state = {"action_queue": [dict(a, args=dict(a["args"])) for a in queue]}
+    while state.get("route") not in ("finish", "error"):
+        state = execute_node(state)
+    assert state["route"] == "finish", state.get("observation")
+    return state["execution_output"]
+
+def _same(a, b):
+    if isinstance(a, pd.DataFrame):
+        pd.testing.assert_frame_equal(a, b)
+    elif isinstance(a, float) and math.isnan(a):
+        assert math.isnan(b)
+    else:
+        assert a == pytest.approx(b)
+
+PT60 = {"function": "select_rows", "args": {"column": "Processing_Time", "condition": "> 60"}}
+
+PLANS = {
+    "correlation_column1_column2": [
+        PT60,
+        {"function": "calculate_correlation",
+         "args": {"column1": "Energy_Consumption", "column2": "Processing_Time"}},
+    ],
+    "percentile_group_by": [
+        PT60,
+        {"function": "calculate_percentile",
+         "args": {"column": "Energy_Consumption", "percentile": 90, "group_by": "Machine_ID"}},
+    ],
+    "fused_filters_average": [
+        PT60,
+        {"function": "select_rows", "args": {"column": "Operation_Type", "condition": "== 'Grinding'"}},
+        {"function": "calculate_average", "args": {"column": "Energy_Consumption"}},
+    ],
+    "filter_pushed_before_derive": [
+        {"function": "add_derived_column",
+         "args": {"name": "ratio", "formula": "Energy_Consumption / Processing_Time"}},
+        PT60,
+        {"function": "calculate_max", "args": {"column": "ratio"}},
+    ],
+    "sort_dropped_before_top_n": [
+        {"function": "sort_rows", "args": {"column": "Energy_Consumption", "order": "desc"}},
+        {"function": "top_n", "args": {"column": "Energy_Consumption", "n": 7, "order": "desc"}},
+    ],
+    "count_after_filter": [PT60, {"function": "count_rows", "args": {}}],
+}
+
+@pytest.mark.parametrize("name", sorted(PLANS))
+def test_optimized_plan_matches_unoptimized(name):
+    queue = PLANS[name]
+    optimized, notes = optimize_plan(queue)
+    assert notes, "plan should have been rewritten"
+    _same(_run(optimized), _run(queue))
+
+def test_projection_keeps_correlation_columns():
+    plan, _ = optimize_plan(PLANS["correlation_column1_column2"])
+    assert plan[0]["function"] == "select_columns"
+    assert {"Energy_Consumption", "Processing_Time"} <= set(plan[0]["args"]["columns"])
+
+def test_unknown_arg_key_disables_projection():
+    queue = [PT60, {"function": "calculate_average",
+                    "args": {"column": "Energy_Consumption", "weights": "Machine_Availability"}}]
+    plan, notes = optimize_plan(queue)
+    assert all(a["function"] != "select_columns" for a in plan)
+    assert not any(n.startswith("project") for n in notes)
+
+def test_unregistered_tool_not_scalar():
+    from RAG_tools import TOOL_REGISTRY
+    from rag_nodes_react.optimizer import SCALAR_TOOLS
+    assert SCALAR_TOOLS <= set(TOOL_REGISTRY)
@@ -0,0 +1,62 @@
+# tests/test_select_rows_equivalence.py
+# 谓词引擎（user-014）与旧 select_rows 的语义逐条对拍：参照 mask 按旧实现的规则手写。
+# 旧实现的 AND / OR 走 merge / concat，会丢 index、打乱行序；新实现保留原 index —— 这里比行集合。
+
+import pandas as pd
+import pytest
+
+import RAG_tool_functions as tf
+
+def _td(df, a, b):
+    return (pd.to_datetime(df[a]) - pd.to_datetime(df[b])).dt.total_seconds()
+
+def _clock(df, col):
+    return pd.to_datetime(df[col], errors="coerce").dt.time
+
+CASES = [
+    ({"column": "Processing_Time", "condition": "> 60"},
+     lambda d: d["Processing_Time"] > 60),
+    ({"condition": "Energy_Consumption <= 8.5"},
+     lambda d: d["Energy_Consumption"] <= 8.5),
+    ({"column": "Machine_ID", "condition": "== 'M03'"},
+     lambda d: d["Machine_ID"] == "M03"),
+    ({"column": "Optimization_Category", "condition": "!= \"Low Efficiency\""},
+     lambda d: d["Optimization_Category"] != "Low Efficiency"),
+    ({"column": "Job_Status", "condition": "== Failed"},
+     lambda d: d["Job_Status"] == "Failed"),
+    ({"column": "Processing_Time", "condition": ">= Machine_Availability - 20"},
+     lambda d: d.eval("Processing_Time >= Machine_Availability - 20")),
+    ({"column": "Actual_End", "condition": "> Scheduled_End"},
+     lambda d: d["Actual_End"] > d["Scheduled_End"]),
+    ({"column": "Actual_Start", "condition": ">= 10:30"},
+     lambda d: _clock(d, "Actual_Start") >= pd.Timestamp("10:30").time()),
+    ({"column": "Scheduled_Start", "condition": "< 2023-03-19"},
+     lambda d: d["Scheduled_Start"] < pd.Timestamp("2023-03-19 00:00")),
+    ({"condition": "Actual_End - Actual_Start > 1 hours"},
+     lambda d: _td(d, "Actual_End", "Actual_Start") > 3600),
+    ({"column": "Actual_End - Scheduled_End", "condition": "<= 10 minutes"},
+     lambda d: _td(d, "Actual_End", "Scheduled_End") <= 600),
+    ({"column": "Processing_Time", "condition": "> 60 AND < 80"},
+     lambda d: (d["Processing_Time"] > 60) & (d["Processing_Time"] < 80)),
+    ({"column": "Processing_Time", "condition": "< 30 OR > 110"},
+     lambda d: (d["Processing_Time"] < 30) | (d["Processing_Time"] > 110)),
+    ({"column": "Machine_ID", "condition": "== 'M01' AND Energy_Consumption > 10"},
+     lambda d: (d["Machine_ID"] == "M01") & (d["Energy_Consumption"] > 10)),
+]
+
+@pytest.mark.parametrize("args,ref", CASES, ids=[a["condition"] for a, _ in CASES])
+def test_select_rows_matches_legacy_semantics(df, args, ref):
+    got = tf.select_rows(df, dict(args))
+    want = df[ref(df).fillna(False).astype(bool)]
+    assert len(want) > 0                        # 条件要真的筛到东西，否则对拍没意义
+    assert got.index.tolist() == want.index.tolist()
+    pd.testing.assert_frame_equal(got, want)
+
+def test_fused_conditions_equal_sequential_filters(df):
+    conds = [{"column": "Processing_Time", "condition": "> 60"},
+             {"column": "Operation_Type", "condition": "== 'Grinding'"}]
+    fused = tf.select_rows(df, {"conditions": conds})
+    seq = df
+    for c in conds:
+        seq = tf.select_rows(seq, dict(c))
+    pd.testing.assert_frame_equal(fused, seq)
@@ -0,0 +1,27 @@
+import threading
+
+import pandas as pd
+import pytest
+
+import rag_sidecar
+
+pytest.importorskip("pyarrow")
+
+
+def test_concurrent_writes_leave_readable_sidecar(tmp_path, monkeypatch):
+    monkeypatch.setattr(rag_sidecar, "SIDECAR_DIR", tmp_path)
+    src = tmp_path / "src.csv"
+    src.write_text("a\n1\n")
+    df = pd.DataFrame({"a": range(1000), "b": pd.Categorical(["x", "y"] * 500)})
+
+    threads = [threading.Thread(target=rag_sidecar.write_sidecar, args=(src, "fp", df))
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    side = rag_sidecar.sidecar_path(src)
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(["src.csv", side.name])
+    pd.testing.assert_frame_equal(rag_sidecar.read_sidecar(src, "fp"), df)
+    assert rag_sidecar.read_sidecar(src, "other") is None
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+import rag_timecols as tc
+
+
+def _frame(n=10):
+    start = pd.Timestamp("2024-01-01")
+    return pd.DataFrame({
+        "a": [start + pd.Timedelta(seconds=i * i) for i in range(n)],
+        "b": [start] * n,
+    })
+
+
+def test_strided_view_does_not_hit_contiguous_cache():
+    tc.clear_cache()
+    df = _frame()
+    head, every_other = df.iloc[:5], df.iloc[::2]
+
+    first = tc.delta_seconds(head, "a", "b")
+    second = tc.delta_seconds(every_other, "a", "b")
+
+    assert first.tolist() == [float(i * i) for i in range(5)]
+    assert second.tolist() == [float(i * i) for i in range(0, 10, 2)]
+
+
+def test_string_column_views_parse_separately():
+    tc.clear_cache()
+    s = pd.Series(np.array(["2024-01-0%d" % d for d in range(1, 10)], dtype=object))
+    head, every_other = s.iloc[:5], s.iloc[::2]
+
+    assert tc.as_datetime(head).dt.day.tolist() == [1, 2, 3, 4, 5]
+    assert tc.as_datetime(every_other).dt.day.tolist() == [1, 3, 5, 7, 9]
+
+
+def test_repeat_call_is_memoized():
+    tc.clear_cache()
+    df = _frame()
+    tc.delta_seconds(df, "a", "b")
+    n = len(tc._CACHE)
+    again = tc.delta_seconds(df, "a", "b")
+    assert len(tc._CACHE) == n
+    assert again.iloc[3] == 9.0
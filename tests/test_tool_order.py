@@ -0,0 +1,28 @@
+import pandas as pd
+
+import RAG_tool_functions as tf
+
+
+def _reference_rolling(df, col, g, w):
+    parts = []
+    for _, sub in df.groupby(g, sort=True, observed=True):
+        parts.append(pd.to_numeric(sub[col], errors="coerce").rolling(w, min_periods=1).mean())
+    return pd.concat(parts)
+
+
+def test_group_rolling_average_keeps_row_order(df):
+    res = tf.rolling_average(df, {"column": "Processing_Time", "group_by": "Machine_ID",
+                                  "window": 3})
+    ref = _reference_rolling(df, "Processing_Time", "Machine_ID", 3)
+    got = res.set_index("level_1")["rolling_avg_Processing_Time"]
+    assert got.index.tolist() == ref.index.tolist()
+    pd.testing.assert_series_equal(got, ref, check_names=False, check_index_type=False)
+
+
+def test_group_top_n_ties_keep_first_rows(df):
+    col = "Machine_ID"
+    res = tf.group_top_n(df, {"group_column": col, "sort_column": "Operation_Type", "n": 2})
+    obj = df.astype({col: object, "Operation_Type": object})
+    ref = (obj.sort_values("Operation_Type", ascending=False, kind="stable")
+              .groupby(col, as_index=False).head(2))
+    assert res.index.tolist() == ref.index.tolist()